@@ -1,5 +1,10 @@
 from spikeextractors.extractors.bindatrecordingextractor import BinDatRecordingExtractor
+from spikeextractors.recordingextractor import RecordingExtractor
+import numpy as np
 import tempfile
+import hashlib
+import threading
+import weakref
 from pathlib import Path
 import os, shutil
 
@@ -7,30 +12,321 @@ import os, shutil
 class CacheRecordingExtractor(BinDatRecordingExtractor):
 
     extractor_name = 'CacheRecordingExtractor'
+    _fingerprint_skipped_attributes = ['_fill_memmap', '_fill_lock', '_warm_thread', '_filled_chunks', '_owns_file']
 
-    def __init__(self, recording, chunk_size=None, output_folder=None):
+    def __init__(self, recording, chunk_size=None, output_folder=None, n_jobs=1, cache_folder=None,
+                 cache_max_mb=None, lazy=False, warm=False):
+        '''Caches the traces of a recording extractor in a binary .dat file.
+
+        By default the file is temporary and it is removed when the extractor is deleted. If cache_folder is
+        given, the file is persistent and it is named after a fingerprint of the recording (class, constructor
+        arguments, file paths with size and modification time, channel ids, number of frames, and dtype):
+        a recording that has already been cached in cache_folder is reopened without being rewritten.
+
+        If lazy is True, the temporary file is only preallocated at construction and each chunk of chunk_size
+        frames is copied from the recording the first time it is accessed.
+
+        The cache file holds the raw traces of the recording (see get_traces_raw), in their dtype, and the
+        channel gains and offsets of the recording are kept to scale them: get_traces returns the same traces as
+        the cached recording, with the same default for return_scaled, without reading it again.
+
+        Parameters
+        ----------
+        recording: RecordingExtractor
+            The recording extractor to be cached
+        chunk_size: None or int
+            If not None then the copy done by chunk size.
+        output_folder: str or Path
+            The folder of the temporary file (not persistent mode)
+        n_jobs: int
+            Number of processes used to write the file
+        cache_folder: str or Path
+            If not None, the folder of the persistent cache
+        cache_max_mb: float
+            If not None, the maximum size in MB of the persistent cache. When it is exceeded, the least recently
+            used cache files are removed.
+        lazy: bool
+            If True, chunks are copied on first access (default chunk_size is one second of recording)
+        warm: bool
+            If True (and lazy is True), the chunks not accessed yet are copied in a background thread
+        '''
         self._recording = recording
-        self._tmp_file = tempfile.NamedTemporaryFile(suffix=".dat", dir=output_folder).name
-        dtype = recording.get_traces(start_frame=0, end_frame=2).dtype
-        recording.write_to_binary_dat_format(save_path=self._tmp_file, dtype=dtype, chunk_size=chunk_size)
+        dtype = recording.get_traces_raw(start_frame=0, end_frame=2).dtype
+        gains, offsets = recording.get_channel_scaling()
+        self._persistent = cache_folder is not None
+        self._lazy = lazy
+        if self._lazy and self._persistent:
+            raise ValueError("'lazy' caching is only available for temporary cache files (cache_folder=None)")
+        if self._lazy:
+            self._tmp_file = tempfile.NamedTemporaryFile(suffix=".dat", dir=output_folder).name
+            num_frames = recording.get_num_frames()
+            num_channels = recording.get_num_channels()
+            if chunk_size is None:
+                chunk_size = int(recording.get_sampling_frequency())
+            self._lazy_chunk_size = max(int(chunk_size), 1)
+            # preallocate the file and keep track of the chunks that have been copied
+            with open(self._tmp_file, 'wb') as f:
+                f.truncate(num_frames * num_channels * dtype.itemsize)
+            self._filled_chunks = np.zeros(int(np.ceil(num_frames / self._lazy_chunk_size)), dtype=bool)
+            self._fill_lock = threading.Lock()
+            self._fill_memmap = _open_fill_memmap(self._tmp_file, dtype, num_frames, num_channels)
+        elif self._persistent:
+            cache_folder = Path(cache_folder)
+            cache_folder.mkdir(parents=True, exist_ok=True)
+            fingerprint = get_recording_fingerprint(recording, dtype=dtype)
+            cache_file = cache_folder / (fingerprint + '.dat')
+            if cache_file.is_file():
+                # cache hit: mark the file as recently used
+                os.utime(str(cache_file), None)
+            else:
+                tmp_file = tempfile.NamedTemporaryFile(suffix=".tmp", dir=str(cache_folder), delete=False).name
+                try:
+                    recording.write_to_binary_dat_format(save_path=tmp_file, dtype=dtype, chunk_size=chunk_size,
+                                                         n_jobs=n_jobs, return_scaled=False)
+                    os.replace(tmp_file, str(cache_file))
+                except BaseException:
+                    if os.path.isfile(tmp_file):
+                        os.remove(tmp_file)
+                    raise
+            self._tmp_file = str(cache_file)
+            if cache_max_mb is not None:
+                _evict_cache_files(cache_folder, cache_max_mb, keep=cache_file)
+        else:
+            self._tmp_file = tempfile.NamedTemporaryFile(suffix=".dat", dir=output_folder).name
+            recording.write_to_binary_dat_format(save_path=self._tmp_file, dtype=dtype, chunk_size=chunk_size,
+                                                 n_jobs=n_jobs, return_scaled=False)
         BinDatRecordingExtractor.__init__(self, self._tmp_file, numchan=recording.get_num_channels(),
                                           recording_channels=recording.get_channel_ids(),
                                           sampling_frequency=recording.get_sampling_frequency(),
                                           dtype=dtype)
+        self._gains = np.asarray(gains, dtype='float64')
+        self._offsets = np.asarray(offsets, dtype='float64')
+        self._default_return_scaled = recording._default_return_scaled
         self.copy_channel_properties(recording)
+        if self._lazy and warm:
+            self._warm_thread = threading.Thread(target=_warm_cache, args=(weakref.ref(self),), daemon=True)
+            self._warm_thread.start()
 
     def __del__(self):
+        if getattr(self, '_persistent', False) or not getattr(self, '_owns_file', True):
+            return
+        if getattr(self, '_lazy', False):
+            # release the memmaps before removing the file
+            self._fill_memmap = None
+            self._timeseries = None
         try:
             os.remove(self._tmp_file)
         except Exception:
             print("Unable to remove temporary file")
 
+    def __getstate__(self):
+        # the memmaps, lock and warm-up thread are not pickled, and the unpickled copy does not remove the file
+        state = BinDatRecordingExtractor.__getstate__(self)
+        for key in ['_fill_memmap', '_fill_lock', '_warm_thread']:
+            state.pop(key, None)
+        state['_owns_file'] = False
+        return state
+
+    def __setstate__(self, state):
+        BinDatRecordingExtractor.__setstate__(self, state)
+        if self._lazy:
+            self._fill_lock = threading.Lock()
+            self._fill_memmap = _open_fill_memmap(self._tmp_file, self._dtype, self.get_num_frames(),
+                                                  self.get_num_channels())
+
+    def get_traces(self, channel_ids=None, start_frame=None, end_frame=None, return_scaled=None, out=None,
+                   return_view=False):
+        if return_scaled is None:
+            return_scaled = self._default_return_scaled
+        self._fill_frames(start_frame, end_frame)
+        return BinDatRecordingExtractor.get_traces(self, channel_ids=channel_ids, start_frame=start_frame,
+                                                   end_frame=end_frame, return_scaled=return_scaled, out=out,
+                                                   return_view=return_view)
+
+    def get_channel_scaling(self, channel_ids=None):
+        if channel_ids is None:
+            return self._gains.copy(), self._offsets.copy()
+        channel_idxs = [self._channels.index(ch) for ch in channel_ids]
+        return self._gains[channel_idxs], self._offsets[channel_idxs]
+
+    def _get_scaling(self):
+        # the scaling of the cached recording (None if the raw traces are not scaled, to keep their dtype)
+        if np.all(self._gains == 1) and np.all(self._offsets == 0):
+            return None, None
+        return self._gains, self._offsets
+
+    def fill_cache(self):
+        '''Copies all the chunks that have not been accessed yet to the cache file (lazy mode).
+        '''
+        if self._lazy:
+            self._fill_chunks(0, self.get_num_frames())
+
+    def _fill_frames(self, start_frame, end_frame):
+        if self._lazy:
+            if start_frame is None:
+                start_frame = 0
+            if end_frame is None:
+                end_frame = self.get_num_frames()
+            self._fill_chunks(start_frame, end_frame)
+
+    def _fill_chunks(self, start_frame, end_frame):
+        first_chunk = int(max(start_frame, 0)) // self._lazy_chunk_size
+        last_chunk = int(np.ceil(min(end_frame, self.get_num_frames()) / self._lazy_chunk_size))
+        for chunk_idx in np.where(~self._filled_chunks[first_chunk:last_chunk])[0] + first_chunk:
+            self._fill_chunk(chunk_idx)
+
+    def _fill_chunk(self, chunk_idx):
+        with self._fill_lock:
+            if self._filled_chunks[chunk_idx]:
+                return
+            chunk_start = chunk_idx * self._lazy_chunk_size
+            chunk_end = min(chunk_start + self._lazy_chunk_size, self.get_num_frames())
+            traces = self._recording.get_traces_raw(start_frame=chunk_start, end_frame=chunk_end)
+            self._fill_memmap[chunk_start:chunk_end, :] = traces.T
+            self._filled_chunks[chunk_idx] = True
+
     def get_filename(self):
         return self._tmp_file
 
     def save_to_file(self, save_path):
+        self.fill_cache()
+        if self._lazy and self._fill_memmap is not None:
+            self._fill_memmap.flush()
         save_path = Path(save_path)
         if save_path.suffix != '.dat' and save_path.suffix != '.bin':
             save_path = save_path.with_suffix('.dat')
-        shutil.move(self._tmp_file, str(save_path))
-        self._tmp_file = str(save_path)
+        if self._persistent:
+            # the persistent cache file is kept in the cache folder
+            shutil.copy(self._tmp_file, str(save_path))
+        else:
+            shutil.move(self._tmp_file, str(save_path))
+            self._tmp_file = str(save_path)
+
+
+def _open_fill_memmap(file_path, dtype, num_frames, num_channels):
+    # the (frames x channels) memmap in which the chunks are copied (None for empty recordings, as empty files
+    # cannot be memory-mapped)
+    if num_frames * num_channels == 0:
+        return None
+    return np.memmap(file_path, dtype=dtype, mode='r+', shape=(num_frames, num_channels))
+
+
+def _warm_cache(cache_ref):
+    # only a weak reference is kept so that the cache can be deleted while it is warming up
+    chunk_idx = 0
+    while True:
+        cache = cache_ref()
+        if cache is None or chunk_idx >= len(cache._filled_chunks):
+            return
+        cache._fill_chunk(chunk_idx)
+        del cache
+        chunk_idx += 1
+
+
+def get_recording_fingerprint(recording, dtype=None):
+    '''Computes a fingerprint of a recording extractor from its class, its constructor arguments
+    (the attributes of the extractor and of the extractors it wraps), the size and modification time
+    of the files it refers to, its channel ids, number of frames, sampling frequency, and dtype.
+
+    Parameters
+    ----------
+    recording: RecordingExtractor
+        The recording extractor to fingerprint
+    dtype: dtype
+        The dtype of the traces. If None, the dtype of the raw traces of the recording.
+
+    Returns
+    -------
+    fingerprint: str
+        The hexadecimal fingerprint
+    '''
+    if dtype is None:
+        dtype = recording.get_traces_raw(start_frame=0, end_frame=2).dtype
+    h = hashlib.sha1()
+    _update_fingerprint(h, recording, set())
+    h.update(repr([int(ch) for ch in recording.get_channel_ids()]).encode())
+    h.update(repr((int(recording.get_num_frames()), float(recording.get_sampling_frequency()),
+                   np.dtype(dtype).str)).encode())
+    return h.hexdigest()
+
+
+def _get_fingerprint_skipped_attributes(cls):
+    # the attributes skipped by the class and its base classes
+    skipped = set()
+    for base in cls.__mro__:
+        skipped.update(base.__dict__.get('_fingerprint_skipped_attributes', []))
+    return skipped
+
+
+def _update_fingerprint(h, value, visited):
+    if isinstance(value, RecordingExtractor):
+        if id(value) in visited:
+            return
+        visited.add(id(value))
+        h.update(type(value).__module__.encode() + b'.' + type(value).__name__.encode())
+        skipped = _get_fingerprint_skipped_attributes(type(value))
+        for key in sorted(value.__dict__.keys()):
+            if key not in skipped:
+                h.update(key.encode())
+                _update_fingerprint(h, value.__dict__[key], visited)
+    elif isinstance(value, (str, Path)):
+        h.update(str(value).encode())
+        _update_fingerprint_file(h, value)
+    elif isinstance(value, np.memmap):
+        if value.filename is not None:
+            _update_fingerprint_file(h, value.filename)
+        h.update(repr((value.shape, value.dtype.str, value.offset)).encode())
+    elif isinstance(value, np.ndarray):
+        h.update(repr((value.shape, value.dtype.str)).encode())
+        if value.dtype.hasobject:
+            h.update(repr(value.tolist()).encode())
+        else:
+            h.update(np.ascontiguousarray(value).view(np.uint8).data)
+    elif value is None or isinstance(value, (bool, int, float, complex, np.generic)):
+        h.update(repr(value).encode())
+    elif isinstance(value, (list, tuple)):
+        h.update(b'[')
+        for v in value:
+            _update_fingerprint(h, v, visited)
+        h.update(b']')
+    elif isinstance(value, dict):
+        h.update(b'{')
+        for k in sorted(value.keys(), key=repr):
+            h.update(repr(k).encode())
+            _update_fingerprint(h, value[k], visited)
+        h.update(b'}')
+    else:
+        # e.g. open file handles: use their class and file name
+        h.update(type(value).__name__.encode())
+        filename = getattr(value, 'filename', None)
+        if isinstance(filename, (str, Path)):
+            h.update(str(filename).encode())
+            _update_fingerprint_file(h, filename)
+
+
+def _update_fingerprint_file(h, path):
+    try:
+        path = Path(path)
+        if path.is_file():
+            stat = path.stat()
+            h.update(repr((str(path.absolute()), stat.st_size, stat.st_mtime_ns)).encode())
+    except (OSError, ValueError):
+        pass
+
+
+def _evict_cache_files(cache_folder, cache_max_mb, keep=None):
+    cache_files = [f for f in Path(cache_folder).glob('*.dat') if f.is_file()]
+    # least recently used first
+    cache_files = sorted(cache_files, key=lambda f: f.stat().st_mtime)
+    total_size = sum(f.stat().st_size for f in cache_files)
+    for cache_file in cache_files:
+        if total_size <= cache_max_mb * 1e6:
+            break
+        if keep is not None and cache_file == Path(keep):
+            continue
+        size = cache_file.stat().st_size
+        try:
+            os.remove(str(cache_file))
+            total_size -= size
+        except OSError:
+            pass
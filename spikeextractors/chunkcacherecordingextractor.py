@@ -0,0 +1,203 @@
+from .recordingextractor import RecordingExtractor
+from .extraction_tools import _get_recording_traces, _get_index_slice
+from collections import OrderedDict
+import threading
+import numpy as np
+
+
+# Caches fixed-size time blocks of the traces of a recording in memory
+
+class ChunkCacheRecordingExtractor(RecordingExtractor):
+
+    extractor_name = 'ChunkCacheRecordingExtractor'
+    _fingerprint_skipped_attributes = ['_blocks', '_nbytes', '_hits', '_misses', '_evictions', '_lock']
+
+    def __init__(self, recording, block_size=30000, cache_mb=500, grouping_property=None):
+        '''Wraps a recording extractor and keeps the traces of the most recently used time blocks in memory.
+        Blocks are aligned to multiples of block_size frames and are evicted in least recently used order
+        when the cache exceeds cache_mb MB. The traces returned by get_traces are copied from the cached blocks
+        (unless return_view is True), so that they can be modified in place without changing the cache.
+
+        Parameters
+        ----------
+        recording: RecordingExtractor
+            The recording extractor to be cached
+        block_size: int
+            The number of frames of each cached block
+        cache_mb: float
+            The maximum size of the cache in MB
+        grouping_property: str (default None)
+            If None, each block contains all channels. If a shared channel property (e.g. 'group'), blocks
+            are cached separately for each group of channels.
+        '''
+        RecordingExtractor.__init__(self)
+        self._recording = recording
+        self._block_size = int(block_size)
+        self._cache_bytes = int(cache_mb * 1e6)
+        self._channel_ids = recording.get_channel_ids()
+        if grouping_property is None:
+            channel_groups = [None] * len(self._channel_ids)
+        else:
+            if grouping_property not in recording.get_shared_channel_property_names():
+                raise ValueError("'grouping_property' must be a property of the recording channels")
+            channel_groups = [recording.get_channel_property(ch, grouping_property) for ch in self._channel_ids]
+        self._group_channel_ids = OrderedDict()
+        self._channel_lookup = {}
+        for channel_id, group in zip(self._channel_ids, channel_groups):
+            group_channels = self._group_channel_ids.setdefault(group, [])
+            self._channel_lookup[channel_id] = (group, len(group_channels))
+            group_channels.append(channel_id)
+        self._blocks = OrderedDict()
+        self._nbytes = 0
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._lock = threading.Lock()
+        self.copy_channel_properties(recording)
+
+    def get_channel_ids(self):
+        return self._channel_ids
+
+    def get_num_frames(self):
+        return self._recording.get_num_frames()
+
+    def get_sampling_frequency(self):
+        return self._recording.get_sampling_frequency()
+
+    def frame_to_time(self, frame):
+        return self._recording.frame_to_time(frame)
+
+    def time_to_frame(self, time):
+        return self._recording.time_to_frame(time)
+
+    @property
+    def _default_return_scaled(self):
+        return self._recording._default_return_scaled
+
+    def get_traces(self, channel_ids=None, start_frame=None, end_frame=None, return_scaled=None, out=None,
+                   return_view=False):
+        '''Returns the traces of the given channels within [start_frame, end_frame) (see
+        RecordingExtractor.get_traces), copied from the cached blocks.
+
+        Parameters
+        ----------
+        channel_ids: array_like
+            A list or 1D array of channel ids from which each trace will be extracted.
+        start_frame: int
+            The starting frame of the trace to be returned (inclusive).
+        end_frame: int
+            The ending frame of the trace to be returned (exclusive).
+        return_scaled: bool or None
+            If None (default), the default traces of the cached recording are returned.
+        out: numpy.ndarray
+            If not None, the (num_channels x num_frames) array in which the traces are written (and returned)
+        return_view: bool
+            If True, the traces are returned as a read-only view of the cached block, without copy, when they
+            are within a single block and the channels are a contiguous range of a group (otherwise a copy is
+            returned)
+
+        Returns
+        ----------
+        traces: numpy.ndarray
+            A 2D array that contains all of the traces from each channel.
+        '''
+        # the scaled and raw traces are cached in separate blocks, so the default is resolved here
+        if return_scaled is None:
+            return_scaled = self._default_return_scaled
+        if start_frame is None:
+            start_frame = 0
+        if end_frame is None:
+            end_frame = self.get_num_frames()
+        if channel_ids is None:
+            channel_ids = self.get_channel_ids()
+        start_frame = max(int(start_frame), 0)
+        end_frame = int(min(end_frame, self.get_num_frames()))
+        if out is not None and out.shape != (len(channel_ids), max(end_frame - start_frame, 0)):
+            raise ValueError("'out' has shape " + str(out.shape) + " but the traces have shape " +
+                             str((len(channel_ids), max(end_frame - start_frame, 0))))
+        if end_frame <= start_frame:
+            traces = _get_recording_traces(self._recording, return_scaled, channel_ids=channel_ids,
+                                           start_frame=start_frame, end_frame=end_frame)
+            return traces if out is None else out
+        if len(channel_ids) == 0:
+            return np.empty((0, end_frame - start_frame)) if out is None else out
+        groups = OrderedDict()
+        for i, channel_id in enumerate(channel_ids):
+            if channel_id not in self._channel_lookup:
+                raise ValueError(str(channel_id) + " is not a valid channel_id")
+            group, row = self._channel_lookup[channel_id]
+            rows, out_rows = groups.setdefault(group, ([], []))
+            rows.append(row)
+            out_rows.append(i)
+        traces = out
+        first_block = start_frame // self._block_size
+        last_block = max((end_frame - 1) // self._block_size, first_block)
+        if return_view and out is None and len(groups) == 1 and first_block == last_block:
+            rows = _get_index_slice(groups[next(iter(groups))][0])
+            if isinstance(rows, slice):
+                block = self._get_block(next(iter(groups)), first_block, return_scaled)
+                block_start = first_block * self._block_size
+                view = block[rows, start_frame - block_start:end_frame - block_start]
+                view.flags.writeable = False
+                return view
+        for group, (rows, out_rows) in groups.items():
+            for block_idx in range(first_block, last_block + 1):
+                block = self._get_block(group, block_idx, return_scaled)
+                block_start = block_idx * self._block_size
+                sf = max(start_frame, block_start)
+                ef = min(end_frame, block_start + block.shape[1])
+                if traces is None:
+                    traces = np.empty((len(channel_ids), end_frame - start_frame), dtype=block.dtype)
+                traces[out_rows, sf - start_frame:ef - start_frame] = block[rows, sf - block_start:ef - block_start]
+        return traces
+
+    def get_traces_raw(self, channel_ids=None, start_frame=None, end_frame=None, out=None, return_view=False):
+        return self.get_traces(channel_ids=channel_ids, start_frame=start_frame, end_frame=end_frame,
+                               return_scaled=False, out=out, return_view=return_view)
+
+    def get_channel_scaling(self, channel_ids=None):
+        return self._recording.get_channel_scaling(channel_ids=channel_ids)
+
+    def get_cache_stats(self):
+        '''Returns the statistics of the cache.
+
+        Returns
+        -------
+        stats: dict
+            A dict with the number of 'hits', 'misses', and 'evictions' of blocks, the number of cached
+            blocks ('num_blocks') and the size of the cache in bytes ('nbytes').
+        '''
+        with self._lock:
+            return {'hits': self._hits, 'misses': self._misses, 'evictions': self._evictions,
+                    'num_blocks': len(self._blocks), 'nbytes': self._nbytes}
+
+    def clear_cache(self):
+        '''Removes all the blocks from the cache.
+        '''
+        with self._lock:
+            self._blocks.clear()
+            self._nbytes = 0
+
+    def _get_block(self, group, block_idx, return_scaled=True):
+        # the scaled and raw traces are cached in separate blocks
+        key = (group, block_idx, return_scaled)
+        with self._lock:
+            if key in self._blocks:
+                self._hits += 1
+                self._blocks.move_to_end(key)
+                return self._blocks[key]
+            self._misses += 1
+        block_start = block_idx * self._block_size
+        block_end = min(block_start + self._block_size, self.get_num_frames())
+        block = _get_recording_traces(self._recording, return_scaled, channel_ids=self._group_channel_ids[group],
+                                      start_frame=block_start, end_frame=block_end)
+        block = np.asarray(block)
+        with self._lock:
+            if key not in self._blocks:
+                self._blocks[key] = block
+                self._nbytes += block.nbytes
+            while self._nbytes > self._cache_bytes and len(self._blocks) > 1:
+                _, evicted = self._blocks.popitem(last=False)
+                self._nbytes -= evicted.nbytes
+                self._evictions += 1
+        return block
@@ -85,10 +85,12 @@ def load_probe_file(recording, probe_file, channel_map=None, channel_groups=None
                 for key_prop, prop_val in cgroup.items():
                     if key_prop == 'channels':
                         ordered_channels = np.concatenate((ordered_channels, prop_val))
-            if not np.all([chan in recording.get_channel_ids() for chan in ordered_channels]) and verbose:
+            recording_channel_ids = set(recording.get_channel_ids())
+            if not np.all([chan in recording_channel_ids for chan in ordered_channels]) and verbose:
                 print('Some channel in PRB file are not in original recording')
-            present_ordered_channels = [chan for chan in ordered_channels if chan in recording.get_channel_ids()]
+            present_ordered_channels = [chan for chan in ordered_channels if chan in recording_channel_ids]
             subrecording = SubRecordingExtractor(recording, channel_ids=present_ordered_channels)
+            subrecording_channel_ids = set(subrecording.get_channel_ids())
             for cgroup_id in groups:
                 cgroup = probe_dict['channel_groups'][cgroup_id]
                 if 'channels' not in cgroup.keys() and len(groups) > 1:
@@ -103,14 +105,14 @@ def load_probe_file(recording, probe_file, channel_map=None, channel_groups=None
                 for key_prop, prop_val in cgroup.items():
                     if key_prop == 'channels':
                         for i_ch, prop in enumerate(prop_val):
-                            if prop in subrecording.get_channel_ids():
+                            if prop in subrecording_channel_ids:
                                 subrecording.set_channel_property(prop, 'group', int(cgroup_id))
                     elif key_prop == 'geometry' or key_prop == 'location':
                         if isinstance(prop_val, dict):
                             if len(prop_val.keys()) != channels_in_group and verbose:
                                 print('geometry in PRB does not have the same length as channel in group')
                             for (i_ch, prop) in prop_val.items():
-                                if i_ch in subrecording.get_channel_ids():
+                                if i_ch in subrecording_channel_ids:
                                     subrecording.set_channel_property(i_ch, 'location', prop)
                         elif isinstance(prop_val, (list, np.ndarray)) and len(prop_val) == channels_in_group:
                             if 'channels' not in cgroup.keys():
@@ -119,16 +121,16 @@ def load_probe_file(recording, probe_file, channel_map=None, channel_groups=None
                             if len(prop_val) != channels_in_group and verbose:
                                 print('geometry in PRB does not have the same length as channel in group')
                             for (i_ch, prop) in zip(channels_id_in_group, prop_val):
-                                if i_ch in subrecording.get_channel_ids():
+                                if i_ch in subrecording_channel_ids:
                                     subrecording.set_channel_property(i_ch, 'location', prop)
                     else:
                         if isinstance(prop_val, dict) and len(prop_val.keys()) == channels_in_group:
                             for (i_ch, prop) in prop_val.items():
-                                if i_ch in subrecording.get_channel_ids():
+                                if i_ch in subrecording_channel_ids:
                                     subrecording.set_channel_property(i_ch, key_prop, prop)
                         elif isinstance(prop_val, (list, np.ndarray)) and len(prop_val) == channels_in_group:
                             for (i_ch, prop) in zip(channels_id_in_group, prop_val):
-                                if i_ch in subrecording.get_channel_ids():
+                                if i_ch in subrecording_channel_ids:
                                     subrecording.set_channel_property(i_ch, key_prop, prop)
                 # create dummy locations
                 if 'geometry' not in cgroup.keys() and 'location' not in cgroup.keys():
@@ -139,7 +141,8 @@ def load_probe_file(recording, probe_file, channel_map=None, channel_groups=None
 
     elif probe_file.suffix == '.csv':
         if channel_map is not None:
-            assert np.all([chan in channel_map for chan in recording.get_channel_ids()]), \
+            channel_map_ids = set(channel_map)
+            assert np.all([chan in channel_map_ids for chan in recording.get_channel_ids()]), \
                 "all channel_ids in 'channel_map' must be in the original recording channel ids"
             subrecording = SubRecordingExtractor(recording, channel_ids=channel_map)
         else:
@@ -153,13 +156,9 @@ def load_probe_file(recording, probe_file, channel_map=None, channel_groups=None
                 loaded_pos.append(pos)
             assert len(subrecording.get_channel_ids()) == row_count, "The .csv file must contain as many " \
                                                                      "rows as the number of channels in the recordings"
-            for i_ch, pos in zip(subrecording.get_channel_ids(), loaded_pos):
-                if i_ch in subrecording.get_channel_ids():
-                    subrecording.set_channel_property(i_ch, 'location', list(np.array(pos).astype(float)))
+            subrecording.set_channel_properties('location', [list(np.array(pos).astype(float)) for pos in loaded_pos])
             if channel_groups is not None and len(channel_groups) == len(subrecording.get_channel_ids()):
-                for i_ch, chg in zip(subrecording.get_channel_ids(), channel_groups):
-                    if i_ch in subrecording.get_channel_ids():
-                        subrecording.set_channel_property(i_ch, 'group', chg)
+                subrecording.set_channel_properties('group', list(channel_groups))
     else:
         raise NotImplementedError("Only .csv and .prb probe files can be loaded.")
 
@@ -196,8 +195,7 @@ def save_to_probe_file(recording, probe_file, grouping_property=None, radius=Non
         # write csv probe file
         with probe_file.open('w') as f:
             if 'location' in recording.get_shared_channel_property_names():
-                for chan in recording.get_channel_ids():
-                    loc = recording.get_channel_property(chan, 'location')
+                for loc in recording.get_channel_properties('location'):
                     if len(loc) == 2:
                         f.write(str(loc[0]))
                         f.write(',')
@@ -242,6 +240,9 @@ def read_binary(file, numchan, dtype, time_axis=0, offset=0):
     numchan = int(numchan)
     with Path(file).open() as f:
         nsamples = (os.fstat(f.fileno()).st_size - offset) // (numchan * np.dtype(dtype).itemsize)
+        if nsamples * numchan == 0:
+            # empty files cannot be memory-mapped
+            return np.empty((numchan, 0), dtype=dtype)
         if time_axis == 0:
             samples = np.memmap(f, np.dtype(dtype), mode='r', offset=offset,
                                 shape=(nsamples, numchan))
@@ -252,7 +253,8 @@ def read_binary(file, numchan, dtype, time_axis=0, offset=0):
     return samples
 
 
-def write_to_binary_dat_format(recording, save_path, time_axis=0, dtype=None, chunk_size=None):
+def write_to_binary_dat_format(recording, save_path, time_axis=0, dtype=None, chunk_size=None, chunk_mb=500,
+                               n_jobs=1, offset=0, return_scaled=None):
     '''Saves the traces of a recording extractor in binary .dat format.
 
     Parameters
@@ -269,38 +271,264 @@ def write_to_binary_dat_format(recording, save_path, time_axis=0, dtype=None, ch
     chunk_size: None or int
         If not None then the copy done by chunk size.
         This avoid to much memory consumption for big files.
+    chunk_mb: None or float
+        If chunk_size is None, the chunk size is computed so that each chunk is at most chunk_mb MB (default 500).
+        If both chunk_size and chunk_mb are None, the traces are copied at once.
+    n_jobs: int
+        Number of processes used to write the file (default 1). If -1, all the available cores are used.
+        With n_jobs > 1 the output file is preallocated and each process writes disjoint frame ranges in place.
+        The recording extractor must be picklable, as each process reopens it from its pickled state: if it
+        is not (e.g. extractors holding open HDF5 files), a warning is raised and the file is written with
+        n_jobs=1.
+    offset: int
+        Number of bytes kept at the beginning of the file (e.g. a header already written), after which the
+        traces are written (default 0).
+    return_scaled: bool or None
+        If True, the scaled traces are written, if False the raw traces (see RecordingExtractor.get_traces_raw).
+        If None (default), the traces returned by default by get_traces are written.
     '''
     save_path = Path(save_path)
     if save_path.suffix == '':
         # when suffix is already raw/bin/dat do not change it.
         save_path = save_path.parent / (save_path.name + '.dat')
 
-    if chunk_size is None:
-        traces = recording.get_traces()
-        if dtype is not None:
-            traces = traces.astype(dtype)
-        if time_axis == 0:
-            traces = traces.T
-        with save_path.open('wb') as f:
-            traces.tofile(f)
+    if n_jobs == -1:
+        n_jobs = os.cpu_count()
+    if n_jobs is not None and n_jobs > 1:
+        recording_pickle = _pickle_recording(recording)
+        if recording_pickle is not None:
+            _write_to_binary_dat_format_parallel(recording, recording_pickle, save_path, time_axis=time_axis,
+                                                 dtype=dtype, chunk_size=chunk_size, chunk_mb=chunk_mb,
+                                                 n_jobs=n_jobs, offset=offset, return_scaled=return_scaled)
+            return save_path
+
+    chunks = recording.iter_chunks(chunk_size=chunk_size, chunk_mb=chunk_mb, dtype=dtype, return_scaled=return_scaled)
+    if time_axis == 0:
+        with _open_binary_file(save_path, offset) as f:
+            for traces, _, _ in chunks:
+                traces.T.tofile(f)
+            f.truncate()
     else:
-        assert time_axis == 0, 'chunked writing work only with time_axis 0'
-        n_sample = recording.get_num_frames()
-        n_chunk = n_sample // chunk_size
-        if n_sample % chunk_size > 0:
-            n_chunk += 1
-        with save_path.open('wb') as f:
-            for i in range(n_chunk):
-                traces = recording.get_traces(start_frame=i*chunk_size,
-                                              end_frame=min((i+1)*chunk_size, n_sample))
-                if dtype is not None:
-                    traces = traces.astype(dtype)
-                if time_axis == 0:
-                    traces = traces.T
-                f.write(traces.tobytes())
+        # with (nb_channel, nb_sample) layout each chunk is written in place in a memmap
+        if dtype is None:
+            dtype = _get_recording_traces(recording, return_scaled, start_frame=0, end_frame=1).dtype
+        shape = (recording.get_num_channels(), recording.get_num_frames())
+        with _open_binary_file(save_path, offset) as f:
+            f.truncate(offset + int(np.prod(shape)) * np.dtype(dtype).itemsize)
+        if np.prod(shape) == 0:
+            return save_path
+        out = np.memmap(str(save_path), dtype=dtype, mode='r+', offset=offset, shape=shape)
+        for traces, start_frame, end_frame in chunks:
+            out[:, start_frame:end_frame] = traces
+        out.flush()
+        del out
     return save_path
 
 
+def _open_binary_file(save_path, offset):
+    # opens the file for writing after its first offset bytes, which are kept
+    if offset > 0:
+        f = Path(save_path).open('r+b')
+        f.seek(offset)
+        return f
+    return Path(save_path).open('wb')
+
+
+def _pickle_recording(recording):
+    # returns the pickled recording, or None (with a warning) if it cannot be pickled
+    import pickle
+    import warnings
+    try:
+        return pickle.dumps(recording)
+    except Exception as e:
+        warnings.warn("The recording extractor (" + type(recording).__name__ + ") cannot be pickled to be sent "
+                      "to the worker processes (" + repr(e) + "): writing with n_jobs=1")
+        return None
+
+
+def _write_to_binary_dat_format_parallel(recording, recording_pickle, save_path, time_axis, dtype, chunk_size,
+                                         chunk_mb, n_jobs, offset=0, return_scaled=None):
+    from concurrent.futures import ProcessPoolExecutor
+
+    num_channels = recording.get_num_channels()
+    num_frames = recording.get_num_frames()
+    if dtype is None:
+        dtype = _get_recording_traces(recording, return_scaled, start_frame=0, end_frame=1).dtype
+    dtype = np.dtype(dtype)
+    if chunk_size is None:
+        if chunk_mb is not None:
+            chunk_size = int(chunk_mb * 1e6 / (dtype.itemsize * max(num_channels, 1)))
+        else:
+            chunk_size = int(np.ceil(num_frames / n_jobs))
+    chunk_size = max(int(chunk_size), 1)
+    if time_axis == 0:
+        shape = (num_frames, num_channels)
+    else:
+        shape = (num_channels, num_frames)
+
+    # preallocate the output file with its final size
+    with _open_binary_file(save_path, offset) as f:
+        f.truncate(offset + int(np.prod(shape)) * dtype.itemsize)
+    if np.prod(shape) == 0:
+        return
+
+    chunk_bounds = [(start_frame, min(start_frame + chunk_size, num_frames))
+                    for start_frame in range(0, num_frames, chunk_size)]
+    initargs = (recording_pickle, str(save_path), dtype.str, shape, time_axis, offset, return_scaled)
+    with ProcessPoolExecutor(max_workers=n_jobs, initializer=_init_dat_writer_worker, initargs=initargs) as executor:
+        for _ in executor.map(_write_dat_chunk, chunk_bounds):
+            pass
+
+
+_dat_writer_worker = {}
+
+
+def _init_dat_writer_worker(recording_pickle, save_path, dtype, shape, time_axis, offset, return_scaled):
+    import pickle
+    _dat_writer_worker['recording'] = pickle.loads(recording_pickle)
+    _dat_writer_worker['out'] = np.memmap(save_path, dtype=dtype, mode='r+', offset=offset, shape=shape)
+    _dat_writer_worker['time_axis'] = time_axis
+    _dat_writer_worker['return_scaled'] = return_scaled
+
+
+def _write_dat_chunk(chunk_bounds):
+    start_frame, end_frame = chunk_bounds
+    recording = _dat_writer_worker['recording']
+    out = _dat_writer_worker['out']
+    traces = _get_recording_traces(recording, _dat_writer_worker['return_scaled'], start_frame=start_frame,
+                                   end_frame=end_frame)
+    if _dat_writer_worker['time_axis'] == 0:
+        out[start_frame:end_frame, :] = traces.T
+    else:
+        out[:, start_frame:end_frame] = traces
+    out.flush()
+
+
+def frames_to_times(frames, timestamps):
+    '''Converts frames to times with the timestamps (the time of each frame). The times of non-integer
+    frames are linearly interpolated, and the times of frames outside of the timestamps are extrapolated
+    from the first or last two timestamps.
+
+    Parameters
+    ----------
+    frames: float or array_like
+        The frame (or frames) to be converted
+    timestamps: numpy.ndarray
+        The time of each frame
+
+    Returns
+    -------
+    times: float or numpy.ndarray
+        The corresponding time (or times)
+    '''
+    scalar = np.isscalar(frames)
+    frames = np.asarray(frames, dtype='float64')
+    if len(timestamps) < 2:
+        raise ValueError("at least two timestamps are needed to convert frames to times")
+    idxs = np.clip(np.floor(frames).astype('int64'), 0, len(timestamps) - 2)
+    t0 = np.asarray(timestamps[idxs], dtype='float64')
+    t1 = np.asarray(timestamps[idxs + 1], dtype='float64')
+    times = t0 + (frames - idxs) * (t1 - t0)
+    return float(times) if scalar else times
+
+
+def times_to_frames(times, timestamps):
+    '''Converts times to frames with the timestamps (the time of each frame), by binary search. The frames
+    of times between two timestamps are linearly interpolated, and the frames of times outside of the
+    timestamps are extrapolated from the first or last two timestamps.
+
+    Parameters
+    ----------
+    times: float or array_like
+        The time (or times) to be converted
+    timestamps: numpy.ndarray
+        The non-decreasing time of each frame
+
+    Returns
+    -------
+    frames: float or numpy.ndarray
+        The corresponding frame (or frames)
+    '''
+    scalar = np.isscalar(times)
+    times = np.asarray(times, dtype='float64')
+    if len(timestamps) < 2:
+        raise ValueError("at least two timestamps are needed to convert times to frames")
+    idxs = np.clip(np.searchsorted(timestamps, times, side='right') - 1, 0, len(timestamps) - 2)
+    t0 = np.asarray(timestamps[idxs], dtype='float64')
+    t1 = np.asarray(timestamps[idxs + 1], dtype='float64')
+    with np.errstate(divide='ignore', invalid='ignore'):
+        frames = idxs + np.where(t1 > t0, (times - t0) / (t1 - t0), 0)
+    return float(frames) if scalar else frames
+
+
+def _get_index_slice(indices):
+    # returns the indices as a slice if they are evenly spaced and increasing (so that indexing gives a view),
+    # otherwise as an array
+    indices = np.asarray(indices, dtype='int64')
+    if len(indices) == 0:
+        return slice(0, 0)
+    if len(indices) == 1:
+        return slice(int(indices[0]), int(indices[0]) + 1)
+    step = int(indices[1] - indices[0])
+    if step > 0 and np.all(np.diff(indices) == step):
+        return slice(int(indices[0]), int(indices[-1]) + 1, step)
+    return indices
+
+
+def _get_array_traces(timeseries, channel_idxs, start_frame, end_frame, out=None, return_view=False,
+                      gain=None, offset=None):
+    # reads traces from a (channels x frames) array or memmap with a single copy (into out, if given).
+    # Contiguous channel ranges are read as slices. If gain or offset (scalars or arrays with one value per
+    # channel of the timeseries) are given, the traces are scaled in place to raw * gain + offset, in float32
+    # (or in the float dtype of the timeseries).
+    if channel_idxs is None:
+        channels = slice(None)
+    else:
+        channels = _get_index_slice(channel_idxs)
+    traces = timeseries[:, start_frame:end_frame][channels]
+    scaled = gain is not None or offset is not None
+    if out is None:
+        if not scaled:
+            if return_view and isinstance(channels, slice):
+                return traces
+            return np.array(traces)
+        dtype = timeseries.dtype if timeseries.dtype.kind == 'f' else np.dtype('float32')
+        out = np.empty(traces.shape, dtype=dtype)
+    elif out.shape != traces.shape:
+        raise ValueError("'out' has shape " + str(out.shape) + " but the traces have shape " + str(traces.shape))
+    out[...] = traces
+    if gain is not None:
+        if np.ndim(gain) > 0:
+            gain = np.asarray(gain)[channels][:, np.newaxis]
+        out *= gain
+    if offset is not None:
+        if np.ndim(offset) > 0:
+            offset = np.asarray(offset)[channels][:, np.newaxis]
+        out += offset
+    return out
+
+
+def _get_recording_traces(recording, return_scaled, **kwargs):
+    # reads the traces of a recording: scaled (True), raw (False), or the default traces of get_traces (None)
+    if return_scaled is None:
+        return recording.get_traces(**kwargs)
+    if return_scaled:
+        return recording.get_traces(return_scaled=True, **kwargs)
+    return recording.get_traces_raw(**kwargs)
+
+
+def _map_in_threads(function, items, n_jobs):
+    # applies function to each item, with a pool of n_jobs threads if n_jobs > 1 (all the cores if -1)
+    items = list(items)
+    if n_jobs == -1:
+        n_jobs = os.cpu_count()
+    if n_jobs is None or n_jobs <= 1 or len(items) <= 1:
+        return [function(item) for item in items]
+    from concurrent.futures import ThreadPoolExecutor
+    with ThreadPoolExecutor(max_workers=min(n_jobs, len(items))) as executor:
+        return list(executor.map(function, items))
+
+
 def get_sub_extractors_by_property(extractor, property_name, return_property_list=False):
     '''Returns a list of SubRecordingExtractors from this RecordingExtractor based on the given
     property_name (e.g. group)
@@ -330,8 +558,7 @@ def get_sub_extractors_by_property(extractor, property_name, return_property_lis
         else:
             sub_list = []
             recording = extractor
-            properties = np.array([recording.get_channel_property(chan, property_name)
-                                   for chan in recording.get_channel_ids()])
+            properties = recording.get_channel_properties(property_name)
             prop_list = np.unique(properties)
             for prop in prop_list:
                 prop_idx = np.where(prop == properties)
@@ -347,8 +574,7 @@ def get_sub_extractors_by_property(extractor, property_name, return_property_lis
         else:
             sub_list = []
             sorting = extractor
-            properties = np.array([sorting.get_unit_property(unit, property_name)
-                                   for unit in sorting.get_unit_ids()])
+            properties = np.array(sorting.get_units_property(property_name=property_name))
             prop_list = np.unique(properties)
             for prop in prop_list:
                 prop_idx = np.where(prop == properties)
@@ -393,8 +619,7 @@ def _export_prb_file(recording, file_name, grouping_property=None, graph=True, g
 
     if geometry:
         if 'location' in recording.get_shared_channel_property_names():
-            positions = np.array([recording.get_channel_property(chan, 'location')
-                                  for chan in recording.get_channel_ids()])
+            positions = recording.get_channel_properties('location')
         else:
             if verbose:
                 print("'location' property is not available and it will not be saved.")
@@ -405,8 +630,7 @@ def _export_prb_file(recording, file_name, grouping_property=None, graph=True, g
 
     if grouping_property is not None:
         if grouping_property in recording.get_shared_channel_property_names():
-            grouping_property_groups = np.array([recording.get_channel_property(chan, grouping_property)
-                                                 for chan in recording.get_channel_ids()])
+            grouping_property_groups = recording.get_channel_properties(grouping_property)
             channel_groups = np.unique([grouping_property_groups])
         else:
             if verbose:
@@ -1,5 +1,5 @@
 from spikeextractors import RecordingExtractor
-from spikeextractors.extraction_tools import read_binary, write_to_binary_dat_format
+from spikeextractors.extraction_tools import read_binary, write_to_binary_dat_format, _get_array_traces
 import os
 import numpy as np
 from pathlib import Path
@@ -30,6 +30,8 @@ class BinDatRecordingExtractor(RecordingExtractor):
         self._datfile = Path(file_path)
         self._time_axis = time_axis
         self._dtype = str(dtype)
+        self._numchan = numchan
+        self._offset = offset
         self._timeseries = read_binary(self._datfile, numchan, dtype, time_axis, offset)
         self._sampling_frequency = float(sampling_frequency)
         self._gain = gain
@@ -46,6 +48,16 @@ class BinDatRecordingExtractor(RecordingExtractor):
             for m in range(self._timeseries.shape[0]):
                 self.set_channel_property(m, 'location', self._geom[m, :])
 
+    def __getstate__(self):
+        # the memory-mapped data is not pickled, the file is mapped again when unpickled
+        state = self.__dict__.copy()
+        del state['_timeseries']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._timeseries = read_binary(self._datfile, self._numchan, self._dtype, self._time_axis, self._offset)
+
     def get_channel_ids(self):
         return self._channels
 
@@ -55,26 +67,78 @@ class BinDatRecordingExtractor(RecordingExtractor):
     def get_sampling_frequency(self):
         return self._sampling_frequency
 
-    def get_traces(self, channel_ids=None, start_frame=None, end_frame=None):
+    def get_traces(self, channel_ids=None, start_frame=None, end_frame=None, return_scaled=True, out=None,
+                   return_view=False):
+        '''Returns the traces of the given channels within [start_frame, end_frame) (see
+        RecordingExtractor.get_traces). The traces are read from the memory-mapped file with a single copy:
+        contiguous channel ranges are read as slices and the scaling is applied in place.
+
+        Parameters
+        ----------
+        channel_ids: array_like
+            A list or 1D array of channel ids from which each trace will be extracted.
+        start_frame: int
+            The starting frame of the trace to be returned (inclusive).
+        end_frame: int
+            The ending frame of the trace to be returned (exclusive).
+        return_scaled: bool
+            If True (default), the traces are scaled with the gain (and centered, for unsigned dtypes) in
+            float32. If False, the traces are returned in the dtype of the file (see get_traces_raw).
+        out: numpy.ndarray
+            If not None, the (num_channels x num_frames) array in which the traces are written (and returned)
+        return_view: bool
+            If True, the traces are returned as a read-only view of the file, without copy, when the channels
+            are a contiguous range and no scaling is applied (otherwise a copy is returned)
+
+        Returns
+        ----------
+        traces: numpy.ndarray
+            A 2D array that contains all of the traces from each channel.
+        '''
         if start_frame is None:
             start_frame = 0
         if end_frame is None:
             end_frame = self.get_num_frames()
         if channel_ids is None:
-            channel_ids = list(range(self._timeseries.shape[0]))
+            channel_idxs = None
         else:
-            channel_ids = [self._channels.index(ch) for ch in channel_ids]
-        recordings = self._timeseries[:, start_frame:end_frame][channel_ids, :]
+            channel_idxs = [self._channels.index(ch) for ch in channel_ids]
+        gain = None
+        offset = None
+        if return_scaled:
+            gain, offset = self._get_scaling()
+        return _get_array_traces(self._timeseries, channel_idxs, start_frame, end_frame, out=out,
+                                 return_view=return_view, gain=gain, offset=offset)
+
+    def get_traces_raw(self, channel_ids=None, start_frame=None, end_frame=None, out=None, return_view=True):
+        '''Returns the traces in the dtype of the file. By default, a read-only view of the file is returned
+        when the channels are a contiguous range (see get_traces).
+        '''
+        return self.get_traces(channel_ids=channel_ids, start_frame=start_frame, end_frame=end_frame,
+                               return_scaled=False, out=out, return_view=return_view)
+
+    def get_channel_scaling(self, channel_ids=None):
+        if channel_ids is None:
+            channel_ids = self.get_channel_ids()
+        gain, offset = self._get_scaling()
+        gains = np.full(len(channel_ids), 1.0 if gain is None else float(gain))
+        offsets = np.full(len(channel_ids), 0.0 if offset is None else float(offset))
+        return gains, offsets
+
+    def _get_scaling(self):
+        # the (gain, offset) of the traces, or None if they are not scaled
+        gain = self._gain
+        offset = None
         if self._dtype.startswith('uint'):
             exp_idx = self._dtype.find('int') + 3
             exp = int(self._dtype[exp_idx:])
-            recordings = recordings.astype('float32') - 2**(exp - 1) - 1
-        if self._gain is not None:
-            recordings = recordings * self._gain
-        return recordings
+            offset = -(2**(exp - 1) + 1)
+            if gain is not None:
+                offset *= gain
+        return gain, offset
 
     @staticmethod
-    def write_recording(recording, save_path, time_axis=0, dtype=None, chunk_size=None):
+    def write_recording(recording, save_path, time_axis=0, dtype=None, chunk_size=None, chunk_mb=500, n_jobs=1):
         '''Saves the traces of a recording extractor in binary .dat format.
 
         Parameters
@@ -91,5 +155,10 @@ class BinDatRecordingExtractor(RecordingExtractor):
         chunk_size: None or int
             If not None then the copy done by chunk size.
             This avoid to much memory consumption for big files.
+        chunk_mb: None or float
+            If chunk_size is None, the chunk size is computed so that each chunk is at most chunk_mb MB (default 500).
+        n_jobs: int
+            Number of processes used to write the file (default 1). If -1, all the available cores are used.
         '''
-        write_to_binary_dat_format(recording, save_path, time_axis=time_axis, dtype=dtype, chunk_size=chunk_size)
+        write_to_binary_dat_format(recording, save_path, time_axis=time_axis, dtype=dtype, chunk_size=chunk_size,
+                                   chunk_mb=chunk_mb, n_jobs=n_jobs)
@@ -1,7 +1,10 @@
 from spikeextractors import RecordingExtractor
+from spikeextractors.extraction_tools import _get_index_slice
 
 import numpy as np
 import ctypes
+import threading
+from collections import OrderedDict
 
 
 try:
@@ -21,21 +24,58 @@ class BiocamRecordingExtractor(RecordingExtractor):
         {'name': 'file_path', 'type': 'file', 'title': "Path to file (.h5 or .hdf5)"},
         {'name': 'mea_pitch', 'type': 'int', 'value': 42, 'default': 42, 'title': "The pitch of the MEA"},
     ]
+    _fingerprint_skipped_attributes = ['_rf', '_blocks', '_nbytes', '_lock']
     installation_mesg = "To use the BiocamRecordingExtractor install h5py: \n\n pip install h5py\n\n"  # error message when not installed
 
-    def __init__(self, file_path, verbose=False, mea_pitch=42):
+    def __init__(self, file_path, verbose=False, mea_pitch=42, block_size=1000, cache_mb=100):
+        '''
+        Parameters
+        ----------
+        file_path: str or Path
+            Path to the .brw file
+        verbose: bool
+            If True, the recording info is printed
+        mea_pitch: int
+            The pitch of the MEA
+        block_size: int
+            The number of frames of the blocks cached to read subsets of channels. In the 101/102 file formats,
+            the frames of all the channels are interleaved, so subsets of channels are read from cached blocks of
+            all the channels (in the 100 file format only the requested channels are read).
+        cache_mb: float
+            The maximum size in MB of the cached blocks
+        '''
         assert HAVE_BIOCAM, "To use the BiocamRecordingExtractor install h5py: \n\n pip install h5py\n\n"
         self._mea_pitch = mea_pitch
         self._recording_file = file_path
         self._rf, self._nFrames, self._samplingRate, self._nRecCh, self._chIndices, \
         self._file_format, self._signalInv, self._positions, self._read_function = openBiocamFile(
             self._recording_file, self._mea_pitch, verbose)
+        self._block_size = int(block_size)
+        self._cache_bytes = int(cache_mb * 1e6)
+        self._blocks = OrderedDict()
+        self._nbytes = 0
+        self._lock = threading.Lock()
         RecordingExtractor.__init__(self)
         for m in range(self._nRecCh):
             self.set_channel_property(m, 'location', self._positions[m])
 
+    def __getstate__(self):
+        # the open file, the lock and the cached blocks are not pickled, the file is opened again when unpickled
+        state = self.__dict__.copy()
+        for key in ['_rf', '_lock', '_blocks', '_nbytes']:
+            del state[key]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._rf = h5py.File(self._recording_file, 'r')
+        self._blocks = OrderedDict()
+        self._nbytes = 0
+        self._lock = threading.Lock()
+
     def __del__(self):
-        self._rf.close()
+        if hasattr(self, '_rf'):
+            self._rf.close()
 
     def get_channel_ids(self):
         return list(range(self._nRecCh))
@@ -46,19 +86,100 @@ class BiocamRecordingExtractor(RecordingExtractor):
     def get_sampling_frequency(self):
         return self._samplingRate
 
-    def get_traces(self, channel_ids=None, start_frame=None, end_frame=None):
+    def get_traces(self, channel_ids=None, start_frame=None, end_frame=None, return_scaled=True):
         if start_frame is None:
             start_frame = 0
         if end_frame is None:
             end_frame = self.get_num_frames()
+        nch = self.get_num_channels()
         if channel_ids is None:
-            channel_ids = range(self.get_num_channels())
-        data = self._read_function(
-            self._rf, start_frame, end_frame, self.get_num_channels())
-        return data[:, channel_ids].T
+            channel_idxs = None
+        else:
+            channel_idxs = np.array(channel_ids, dtype='int64')
+            if np.any(channel_idxs < 0) or np.any(channel_idxs >= nch):
+                raise ValueError("channel_ids must be in [0, " + str(nch) + ")")
+            if np.array_equal(channel_idxs, np.arange(nch)):
+                channel_idxs = None
+        if channel_idxs is None:
+            data = self._read_function(self._rf, start_frame, end_frame, nch)
+            return data.T
+        if self._file_format == 100:
+            # the (frames x channels) dataset is read as a hyperslab of sorted channels, reordered afterwards
+            sorted_idxs, inverse = np.unique(channel_idxs, return_inverse=True)
+            channels = _get_index_slice(sorted_idxs)
+            if not isinstance(channels, slice):
+                channels = sorted_idxs.tolist()
+            data = self._read_function(self._rf, start_frame, end_frame, nch, channels=channels)
+            if len(sorted_idxs) != len(channel_idxs) or np.any(inverse != np.arange(len(inverse))):
+                data = data[:, inverse]
+            return data.T
+        return self._get_traces_from_blocks(channel_idxs, start_frame, end_frame)
+
+    def clear_cache(self):
+        '''Removes all the cached blocks.
+        '''
+        with self._lock:
+            self._blocks.clear()
+            self._nbytes = 0
+
+    def _get_traces_from_blocks(self, channel_idxs, start_frame, end_frame):
+        # the channels are selected from the cached (frames x channels) blocks of all the channels
+        start_frame = int(min(start_frame, self.get_num_frames()))
+        end_frame = int(max(min(end_frame, self.get_num_frames()), start_frame))
+        if start_frame == end_frame:
+            return np.empty((len(channel_idxs), 0), dtype=self._rf['3BData/Raw'].dtype)
+        traces = None
+        first_block = start_frame // self._block_size
+        last_block = max((end_frame - 1) // self._block_size, first_block)
+        for block_idx in range(first_block, last_block + 1):
+            block = self._get_block(block_idx)
+            block_start = block_idx * self._block_size
+            sf = max(start_frame, block_start)
+            ef = min(end_frame, block_start + block.shape[0])
+            if traces is None:
+                traces = np.empty((len(channel_idxs), end_frame - start_frame), dtype=block.dtype)
+            traces[:, sf - start_frame:ef - start_frame] = block[sf - block_start:ef - block_start, channel_idxs].T
+        return traces
+
+    def _get_block(self, block_idx):
+        with self._lock:
+            if block_idx in self._blocks:
+                self._blocks.move_to_end(block_idx)
+                return self._blocks[block_idx]
+        block_start = block_idx * self._block_size
+        block_end = min(block_start + self._block_size, self.get_num_frames())
+        block = self._read_function(self._rf, block_start, block_end, self.get_num_channels())
+        with self._lock:
+            if block_idx not in self._blocks:
+                self._blocks[block_idx] = block
+                self._nbytes += block.nbytes
+            while self._nbytes > self._cache_bytes and len(self._blocks) > 1:
+                _, evicted = self._blocks.popitem(last=False)
+                self._nbytes -= evicted.nbytes
+        return block
 
     @staticmethod
-    def write_recording(recording, save_path):
+    def write_recording(recording, save_path, dtype=None, chunk_size=None, chunk_mb=500, compression=None):
+        '''Writes a recording in the Biocam .brw (101) format. The traces are copied chunk by chunk in a chunked
+        (and optionally compressed) HDF5 dataset.
+
+        Parameters
+        ----------
+        recording: RecordingExtractor
+            The recording extractor to be saved
+        save_path: str or Path
+            The path of the .brw file
+        dtype: dtype
+            The dtype of the saved traces (default: the dtype of the traces of the recording, or float32 if
+            the recording has no frames)
+        chunk_size: None or int
+            The number of frames of each chunk copied from the recording
+        chunk_mb: None or float
+            If chunk_size is None, the chunk size is computed so that each chunk is at most chunk_mb MB
+            (default 500). If both chunk_size and chunk_mb are None, the traces are copied at once.
+        compression: str
+            The HDF5 compression filter of the dataset (e.g. 'gzip' or 'lzf'), or None (default)
+        '''
         # Convert to uV:
         # AnalogValue = MVOffset + DigitalValue * ADCCountsToMV
         # Where ADCCountsToMV is defined as:
@@ -72,13 +193,21 @@ class BiocamRecordingExtractor(RecordingExtractor):
         assert HAVE_BIOCAM, "To use the BiocamRecordingExtractor install h5py: \n\n pip install h5py\n\n"
         M = recording.get_num_channels()
         N = recording.get_num_frames()
+        if dtype is None:
+            # a recording without frames has no traces to take the dtype from
+            dtype = recording.get_traces(start_frame=0, end_frame=1).dtype if N > 0 else 'float32'
+        dtype = np.dtype(dtype)
         rf = h5py.File(save_path, 'w')
         g = rf.create_group('3BData')
-        dr = rf.create_dataset('3BData/Raw', (M*N,), dtype=int)
-        dt = 50000
-        for i in range(N//dt):
-            dr[M*i*dt:M*(i+1)*dt] = recording.get_traces(slice(0, M), i*dt, (i+1)*dt).T.flatten()
-        dr[M*(N//dt)*dt:] = recording.get_traces(slice(0, M), (N//dt)*dt, N).T.flatten()
+        # the frames are interleaved in a 1D dataset, stored in HDF5 chunks of whole frames of about 1 MB
+        chunks = None
+        if M * N > 0:
+            chunks = (M * int(min(max(1e6 // (M * dtype.itemsize), 1), N)),)
+        dr = rf.create_dataset('3BData/Raw', (M*N,), dtype=dtype, chunks=chunks,
+                               compression=compression if M * N > 0 else None)
+        for traces, start_frame, end_frame in recording.iter_chunks(chunk_size=chunk_size, chunk_mb=chunk_mb,
+                                                                   dtype=dtype):
+            dr[M*start_frame:M*end_frame] = traces.T.ravel()
         g.attrs['Version'] = 101
         rf.create_dataset('3BRecInfo/3BRecVars/MinVolt', data=[0])
         rf.create_dataset('3BRecInfo/3BRecVars/MaxVolt', data=[1])
@@ -112,9 +241,13 @@ def openBiocamFile(filename,  mea_pitch, verbose=False):
     # Get the actual number of channels used in the recording
     file_format = rf['3BData'].attrs.get('Version')
     if file_format == 100:
-        nRecCh = len(rf['3BData/Raw'][0])
+        nRecCh = rf['3BData/Raw'].shape[1]
     elif (file_format == 101) or (file_format == 102):
-        nRecCh = int(1. * rf['3BData/Raw'].shape[0] / nFrames)
+        if nFrames > 0:
+            nRecCh = int(1. * rf['3BData/Raw'].shape[0] / nFrames)
+        else:
+            # without frames, the channels are counted in the channel list
+            nRecCh = rf['3BRecInfo/3BMeaStreams/Raw/Chs'].size
     else:
         raise Exception('Unknown data file format.')
 
@@ -138,7 +271,7 @@ def openBiocamFile(filename,  mea_pitch, verbose=False):
         read_function = readHDF5t_100
     elif (file_format == 100)&(signalInv == -1):
         read_function = readHDF5t_100_i
-    if ((file_format == 101)|(file_format == 102))&(signalInv == 1):
+    elif ((file_format == 101)|(file_format == 102))&(signalInv == 1):
         read_function = readHDF5t_101
     elif ((file_format == 101)|(file_format == 102))&(signalInv == -1):
         read_function = readHDF5t_101_i
@@ -147,19 +280,19 @@ def openBiocamFile(filename,  mea_pitch, verbose=False):
     return (rf, nFrames, samplingRate, nRecCh, chIndices, file_format, signalInv, rawIndices, read_function)
 
 
-def readHDF5t_100(rf, t0, t1, nch):
+def readHDF5t_100(rf, t0, t1, nch, channels=None):
     if t0 <= t1:
-        return rf['3BData/Raw'][t0:t1]
+        if channels is None:
+            return rf['3BData/Raw'][t0:t1]
+        return rf['3BData/Raw'][t0:t1, channels]
     else:  # Reversed read
         raise Exception('Reading backwards? Not sure about this.')
         return rf['3BData/Raw'][t1:t0]
 
-def readHDF5t_100_i(rf, t0, t1, nch):
-    if t0 <= t1:
-        return 4096-rf['3BData/Raw'][t0:t1]
-    else:  # Reversed read
-        raise Exception('Reading backwards? Not sure about this.')
-        return 4096-rf['3BData/Raw'][t1:t0]
+def readHDF5t_100_i(rf, t0, t1, nch, channels=None):
+    data = readHDF5t_100(rf, t0, t1, nch, channels=channels)
+    # the signal is inverted in place
+    return np.subtract(4096, data, out=data)
 
 def readHDF5t_101(rf, t0, t1, nch):
     if t0 <= t1:
@@ -169,8 +302,6 @@ def readHDF5t_101(rf, t0, t1, nch):
         return rf['3BData/Raw'][nch * t1:nch * t0].reshape((t1-t0, nch), order='C')
 
 def readHDF5t_101_i(rf, t0, t1, nch):
-    if t0 <= t1:
-        return 4096-rf['3BData/Raw'][nch * t0:nch * t1].reshape((t1-t0, nch), order='C')
-    else:  # Reversed read
-        raise Exception('Reading backwards? Not sure about this.')
-        return 4096-rf['3BData/Raw'][nch * t1:nch * t0].reshape((t1-t0, nch), order='C')
+    data = readHDF5t_101(rf, t0, t1, nch)
+    # the signal is inverted in place
+    return np.subtract(4096, data, out=data)
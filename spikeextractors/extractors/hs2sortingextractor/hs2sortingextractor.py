@@ -1,4 +1,5 @@
 from spikeextractors import SortingExtractor
+from spikeextractors.spikevector import SpikeVector
 import numpy as np
 
 try:
@@ -16,6 +17,7 @@ class HS2SortingExtractor(SortingExtractor):
     ]
     installed = HAVE_HS2SX  # check at class level if installed or not
     is_writable = True
+    _sorted_spike_trains = True
     mode = 'file'
     installation_mesg = "To use the HS2SortingExtractor install h5py: \n\n pip install h5py\n\n"  # error message when not installed
 
@@ -33,6 +35,7 @@ class HS2SortingExtractor(SortingExtractor):
         self._cluster_id = self._rf['cluster_id'][()]
         self._unit_ids = set(self._cluster_id)
         self._times = self._rf['times'][()]
+        self._spike_vector = SpikeVector(self._times, self._cluster_id)
 
         if(load_unit_info):
             self.load_unit_info()
@@ -42,53 +45,38 @@ class HS2SortingExtractor(SortingExtractor):
             self._unit_locs = self._rf['centres'][()]  # cache for faster access
             if self._unit_locs.shape[0] < 5:  # check if old, transposed format
                 self._unit_locs = self._unit_locs.T
-            for unit_id in self._unit_ids:
-                self._unit_properties[unit_id] = {}
-                self._unit_properties[unit_id]['unit_location'] = self._unit_locs[unit_id]
-        inds = []  # get these only once
-        for unit_id in self._unit_ids:
-            inds.append(np.where(self._cluster_id==unit_id)[0])
+            self.set_units_property(unit_ids=self.get_unit_ids(), property_name='unit_location',
+                                    values=[self._unit_locs[unit_id] for unit_id in self.get_unit_ids()])
+        inds = [self.get_unit_indices(unit_id) for unit_id in self._unit_ids]
+        # the features of all units are stored at once, concatenated in the order of the units
+        unit_ids = list(self._unit_ids)
+        rows = self._get_unit_rows(unit_ids, self._unit_features)
+        num_spikes = [len(idx) for idx in inds]
+        all_inds = np.concatenate(inds) if len(inds) > 0 else np.array([], dtype=int)
         if 'data' in self._rf.keys():
             d = self._rf['data'][()]
-            for i, unit_id in enumerate(self._unit_ids):
-                self._unit_features[unit_id] = {}
-                self._unit_features[unit_id]['spike_location'] = d[:, inds[i]].T
-        else:
-            for i, unit_id in enumerate(self._unit_ids):
-                self._unit_features[unit_id] = {}
+            self._unit_features.set_concatenated_values('spike_location', rows, d[:, all_inds].T, num_spikes)
         if 'ch' in self._rf.keys():
             d = self._rf['ch'][()]
-            for i, unit_id in enumerate(self._unit_ids):
-                self._unit_features[unit_id]['max_channel'] = d[inds[i]]
+            self._unit_features.set_concatenated_values('max_channel', rows, d[all_inds], num_spikes)
 
     def get_unit_indices(self, x):
-        return np.where(self._cluster_id == x)[0]
+        return self._spike_vector.get_unit_indices(x)
 
     def get_unit_ids(self):
         return list(self._unit_ids)
 
     def get_unit_spike_train(self, unit_id, start_frame=None, end_frame=None):
-        if start_frame is None:
-            start_frame = 0
-        if end_frame is None:
-            end_frame = np.Inf
-        times = self._times[self.get_unit_indices(unit_id)]
-        inds = np.where((start_frame <= times) & (times < end_frame))
-        return times[inds]
+        return self._spike_vector.get_unit_spike_train(unit_id, start_frame=start_frame, end_frame=end_frame).copy()
+
+    def get_all_spikes(self, unit_ids=None, start_frame=None, end_frame=None):
+        return self._spike_vector.get_all_spikes(unit_ids=unit_ids, start_frame=start_frame, end_frame=end_frame)
 
     @staticmethod
     def write_sorting(sorting, save_path):
         assert HAVE_HS2SX, "To use the HS2SortingExtractor install h5py: \n\n pip install h5py\n\n"
-        unit_ids = sorting.get_unit_ids()
-        times_list = []
-        labels_list = []
-        for i in range(len(unit_ids)):
-            unit = unit_ids[i]
-            times = sorting.get_unit_spike_train(unit_id=unit)
-            times_list.append(times)
-            labels_list.append(np.ones(times.shape, dtype=int) * unit)
-        all_times = np.concatenate(times_list)
-        all_labels = np.concatenate(labels_list)
+        all_times, all_labels = sorting.get_all_spikes()
+        all_labels = all_labels.astype(int)
         rf = h5py.File(save_path, mode='w')
         # for now only create the entries required by any RecordingExtractor
         if sorting.get_sampling_frequency() is not None:
@@ -1,6 +1,7 @@
 from spikeextractors import SortingExtractor
 from spikeextractors.extractors.bindatrecordingextractor import BinDatRecordingExtractor
 from spikeextractors.extraction_tools import read_python
+from spikeextractors.spikevector import get_spike_window
 import numpy as np
 from pathlib import Path
 
@@ -47,6 +48,7 @@ class KlustaSortingExtractor(SortingExtractor):
     installed = HAVE_KLSX  # check at class level if installed or not
     installation_mesg = "To use the KlustaSortingExtractor install h5py: \n\n pip install h5py\n\n"  # error message when not installed
     is_writable = True
+    _sorted_spike_trains = True
     mode = 'file_or_folder'
     def __init__(self, file_or_folder_path):
         assert HAVE_KLSX, "To use the KlustaSortingExtractor install h5py: \n\n pip install h5py\n\n"
@@ -92,7 +94,7 @@ class KlustaSortingExtractor(SortingExtractor):
                 clusters = np.array(channel_groups[cgroup]['spikes']['clusters']['main'])
                 idx = np.nonzero(clusters == int(cluster_id))
                 st = np.array(channel_groups[cgroup]['spikes']['time_samples'])[idx]
-                self._spiketrains.append(st)
+                self._spiketrains.append(np.sort(st))
                 klusta_units.append(int(cluster_id))
                 unique_units.append(unit)
                 unit += 1
@@ -109,13 +111,9 @@ class KlustaSortingExtractor(SortingExtractor):
         return list(self._unit_ids)
 
     def get_unit_spike_train(self, unit_id, start_frame=None, end_frame=None):
-        if start_frame is None:
-            start_frame = 0
-        if end_frame is None:
-            end_frame = np.Inf
         times = self._spiketrains[self.get_unit_ids().index(unit_id)]
-        inds = np.where((start_frame <= times) & (times < end_frame))
-        return times[inds]
+        start, end = get_spike_window(times, start_frame, end_frame)
+        return times[start:end]
 
     @staticmethod
     def write_sorting(sorting, save_path):
@@ -139,8 +137,6 @@ class KlustaSortingExtractor(SortingExtractor):
 
         for cgroup in cgroups:
             channel_group = channel_groups.create_group(str(cgroup))
-            time_samples = np.array([])
-            cluster_main = np.array([])
             if 'group' in sorting.get_shared_unit_property_names():
                 idxs = [unit for unit in sorting.get_unit_ids() if
                         sorting.get_unit_property(unit, 'group') == cgroup]
@@ -149,14 +145,9 @@ class KlustaSortingExtractor(SortingExtractor):
             clust = channel_group.create_group('clusters')
             clust.create_dataset('main', data=idxs)
             clust.create_dataset('original', data=idxs)
-            for id in idxs:
-                st = sorting.get_unit_spike_train(id)
-                cl = [id] * len(sorting.get_unit_spike_train(id))
-                time_samples = np.concatenate((time_samples, np.array(st)))
-                cluster_main = np.concatenate((cluster_main, np.array(cl)))
-            sorting_idxs = np.argsort(time_samples)
-            time_samples = time_samples[sorting_idxs].astype(int)
-            cluster_main = cluster_main[sorting_idxs].astype(int)
+            time_samples, cluster_main = sorting.get_all_spikes(unit_ids=idxs)
+            time_samples = time_samples.astype(int)
+            cluster_main = cluster_main.astype(int)
             spikes = channel_group.create_group('spikes')
             spikes.create_dataset('time_samples', data=time_samples)
             clusters = spikes.create_group('clusters')
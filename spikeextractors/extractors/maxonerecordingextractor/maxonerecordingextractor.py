@@ -1,4 +1,5 @@
 from spikeextractors import RecordingExtractor
+import numpy as np
 
 try:
     import h5py
@@ -17,6 +18,7 @@ class MaxOneRecordingExtractor(RecordingExtractor):
     extractor_gui_params = [
         {'name': 'file_path', 'type': 'file', 'title': "Path to file"},
     ]
+    _fingerprint_skipped_attributes = ['_filehandle', '_mapping']
     installation_mesg = ""  # error message when not installed
 
     def __init__(self, file_path):
@@ -36,6 +38,7 @@ class MaxOneRecordingExtractor(RecordingExtractor):
         self._num_channels = len(self._channel_ids)
         self._fs = 20000
         self._num_frames = self._filehandle.get('sig').shape[1]
+        self._gain = float(np.squeeze(self._filehandle['settings']['lsb'][()])) * 1e6
 
         for i_ch, ch in enumerate(self.get_channel_ids()):
             self.set_channel_property(ch, 'location', [self._mapping['x'][i_ch], self._mapping['y'][i_ch]])
@@ -49,11 +52,24 @@ class MaxOneRecordingExtractor(RecordingExtractor):
     def get_sampling_frequency(self):
         return self._fs
 
-    def get_traces(self, channel_ids=None, start_frame=None, end_frame=None):
+    def get_traces(self, channel_ids=None, start_frame=None, end_frame=None, return_scaled=True):
         if start_frame is None:
             start_frame = 0
         if end_frame is None:
             end_frame = self.get_num_frames()
         if channel_ids is None:
             channel_ids = self.get_channel_ids()
-        return self._filehandle['sig'][channel_ids, start_frame:end_frame] * self._filehandle['settings']['lsb'] * 1e6
+        traces = self._filehandle['sig'][channel_ids, start_frame:end_frame]
+        if return_scaled:
+            traces = traces.astype('float32')
+            traces *= self._gain
+        return traces
+
+    def get_traces_raw(self, channel_ids=None, start_frame=None, end_frame=None):
+        return self.get_traces(channel_ids=channel_ids, start_frame=start_frame, end_frame=end_frame,
+                               return_scaled=False)
+
+    def get_channel_scaling(self, channel_ids=None):
+        if channel_ids is None:
+            channel_ids = self.get_channel_ids()
+        return np.full(len(channel_ids), self._gain), np.zeros(len(channel_ids))
@@ -1,4 +1,5 @@
 from spikeextractors import RecordingExtractor
+from spikeextractors.extraction_tools import _get_index_slice
 import numpy as np
 
 try:
@@ -19,6 +20,7 @@ class MCSH5RecordingExtractor(RecordingExtractor):
         {'name': 'file_path', 'type': 'file', 'title': "Path to file (.h5 or .hdf5)"},
         {'name': 'stream_id', 'type': 'int', 'title': 'ID of stream that will be loaded'},
     ]
+    _fingerprint_skipped_attributes = ['_rf', '_channel_data']
     installation_mesg = "To use the MCSH5RecordingExtractor install h5py: \n\n pip install h5py\n\n"  # error message when not installed
 
     def __init__(self, file_path, stream_id=0, verbose=False):
@@ -30,8 +32,20 @@ class MCSH5RecordingExtractor(RecordingExtractor):
         
         RecordingExtractor.__init__(self)
 
+    def __getstate__(self):
+        # the open file is not pickled, it is opened again when unpickled
+        state = self.__dict__.copy()
+        del state['_rf'], state['_channel_data']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._rf = h5py.File(self._recording_file, 'r')
+        self._channel_data = self._rf['/Data/Recording_0/AnalogStream/Stream_' + str(self._stream_id) + '/ChannelData']
+
     def __del__(self):
-        self._rf.close()
+        if hasattr(self, '_rf'):
+            self._rf.close()
 
     def get_channel_ids(self):
         return list(self._channel_ids)
@@ -50,8 +64,11 @@ class MCSH5RecordingExtractor(RecordingExtractor):
             self._rf.close()
 
         self._rf, self._nFrames, self._samplingRate, self._nRecCh, \
-        self._channel_ids, self._electrodeLabels, self._exponent, self._convFact \
+        self._channel_ids, self._electrodeLabels, self._exponent, self._convFact, frame_timestamps \
             = openMCSH5File(self._recording_file, stream_id, self._verbose)
+        self._channel_data = self._rf['/Data/Recording_0/AnalogStream/Stream_' + str(stream_id) + '/ChannelData']
+        self._channel_index = {channel_id: i for i, channel_id in enumerate(self._channel_ids.tolist())}
+        self.set_timestamps(frame_timestamps)
 
     def get_stream_id(self):
         assert hasattr(self, '_stream_id'), "Stream ID has not been set yet."
@@ -65,28 +82,45 @@ class MCSH5RecordingExtractor(RecordingExtractor):
             analog_stream_names = list(rf.require_group('/Data/Recording_0/AnalogStream').keys())
             return list(range(len(analog_stream_names)))
 
-    def get_traces(self, channel_ids=None, start_frame=None, end_frame=None):
+    def get_traces(self, channel_ids=None, start_frame=None, end_frame=None, return_scaled=True):
         if start_frame is None:
             start_frame = 0
         if end_frame is None:
             end_frame = self.get_num_frames()
+        if isinstance(channel_ids, (int, np.integer)):
+            return self.get_traces(channel_ids=[channel_ids], start_frame=start_frame, end_frame=end_frame,
+                                   return_scaled=return_scaled)[0]
         if channel_ids is None:
-            channel_idxs = self._channel_ids
+            traces = self._channel_data[:, start_frame:end_frame]
         else:
-            if isinstance(channel_ids, (int, np.integer)):
-                assert channel_ids in self._channel_ids, 'channel_id {} not found'.format(channel_ids)
-                channel_idxs = np.where(self._channel_ids == channel_ids)[0][0]
-            else:
-                channel_idxs = []
-                for m in channel_ids:
-                    assert m in self._channel_ids, 'channel_id {} not found'.format(m)
-                    channel_idxs.append(np.where(self._channel_ids == m)[0][0])
-
-        stream = self._rf.require_group('/Data/Recording_0/AnalogStream/Stream_' + str(self._stream_id))
-        data_v = np.array(stream.get('ChannelData'), dtype=np.int) * self._convFact.astype(float) * \
-                 (10.0 ** self._exponent)
+            channel_idxs = []
+            for m in channel_ids:
+                assert m in self._channel_index, 'channel_id {} not found'.format(m)
+                channel_idxs.append(self._channel_index[m])
+            # h5py reads a hyperslab of increasing channel indices, which are reordered afterwards
+            sorted_idxs, inverse = np.unique(np.array(channel_idxs, dtype='int64'), return_inverse=True)
+            channels = _get_index_slice(sorted_idxs)
+            if not isinstance(channels, slice):
+                channels = sorted_idxs.tolist()
+            traces = self._channel_data[channels, start_frame:end_frame]
+            if len(sorted_idxs) != len(channel_idxs) or np.any(inverse != np.arange(len(inverse))):
+                traces = traces[inverse]
+        if return_scaled:
+            # the conversion is only applied to the slab that has been read
+            traces = traces * self._get_gain()
+        return traces
+
+    def get_traces_raw(self, channel_ids=None, start_frame=None, end_frame=None):
+        return self.get_traces(channel_ids=channel_ids, start_frame=start_frame, end_frame=end_frame,
+                               return_scaled=False)
+
+    def get_channel_scaling(self, channel_ids=None):
+        if channel_ids is None:
+            channel_ids = self.get_channel_ids()
+        return np.full(len(channel_ids), self._get_gain()), np.zeros(len(channel_ids))
 
-        return data_v[channel_idxs, start_frame:end_frame]
+    def _get_gain(self):
+        return float(self._convFact) * (10.0 ** self._exponent)
 
     @staticmethod
     def write_recording(recording, save_path):
@@ -105,7 +139,8 @@ def openMCSH5File(filename, stream_id, verbose=False):
     assert stream_name in analog_stream_names, "Specified stream does not exist."
 
     stream = rf.require_group('/Data/Recording_0/AnalogStream/' + stream_name)
-    data = np.array(stream.get('ChannelData'), dtype=np.int)
+    # only the header of the data is read
+    data = stream.get('ChannelData')
     timestamps = np.array(stream.get('ChannelDataTimeStamps'))
     info = np.array(stream.get('InfoChannel'))
 
@@ -122,8 +157,21 @@ def openMCSH5File(filename, stream_id, verbose=False):
     assert timestamps[0][0] < timestamps[0][2], 'Please check the validity of \'ChannelDataTimeStamps\' in the stream.'
     TimeVals = np.arange(timestamps[0][0], timestamps[0][2] + 1, 1) * Tick
 
+    # with several acquisition blocks the frames are not uniformly sampled, and the exact time of each frame
+    # is computed from the time stamp (in us) and the first/last frame index of each block. As with a single
+    # block, the times are relative to the first frame.
+    frame_timestamps = None
+    if len(timestamps) > 1:
+        first_time_stamp = timestamps[np.argmin(timestamps[:, 1])][0]
+        frame_timestamps = np.full(nFrames, np.nan)
+        for time_stamp, first_index, last_index in timestamps:
+            frame_timestamps[first_index:last_index + 1] = \
+                (time_stamp - first_time_stamp + np.arange(last_index - first_index + 1) * info['Tick'][0]) / 1e6
+        if np.any(np.isnan(frame_timestamps)):
+            rf.close()
+            raise ValueError("The blocks of 'ChannelDataTimeStamps' do not cover all the frames of the stream.")
+
     assert Unit == b'V', 'Unexpected units found, expected volts, found {}'.format(Unit.decode('UTF-8'))
-    data_V = data * convFact.astype(float) * (10.0 ** (exponent))
 
     timestep_avg = np.mean(TimeVals[1:] - TimeVals[0:-1])
     timestep_std = np.std(TimeVals[1:] - TimeVals[0:-1])
@@ -142,7 +190,10 @@ def openMCSH5File(filename, stream_id, verbose=False):
         for key in rf.attrs.keys():
             print('# {}: {}'.format(key, rf.attrs[key]))
         print('#')
-        print('# Signal range: {:.2f} to {:.2f} µV'.format(np.amin(data_V) * 1e6, np.amax(data_V) * 1e6))
+        signal_min, signal_max = _get_sampled_signal_range(data)
+        print('# Signal range (sampled): {:.2f} to {:.2f} µV'.format(
+            signal_min * convFact.astype(float) * (10.0 ** exponent) * 1e6,
+            signal_max * convFact.astype(float) * (10.0 ** exponent) * 1e6))
         print('# Number of channels: {}'.format(nRecCh))
         print('# Number of frames: {}'.format(nFrames))
         print('# Time step: {:.2f} µs ± {:.5f} % (range {} to {})'.format(timestep_avg * 1e6,
@@ -152,4 +203,15 @@ def openMCSH5File(filename, stream_id, verbose=False):
         print('#')
         print('# MCSH5RecordingExtractor currently only reads /Data/Recording_0/AnalogStream/Stream_0')
 
-    return rf, nFrames, samplingRate, nRecCh, channel_ids, electrodeLabels, exponent, convFact
+    return rf, nFrames, samplingRate, nRecCh, channel_ids, electrodeLabels, exponent, convFact, frame_timestamps
+
+
+def _get_sampled_signal_range(data, num_blocks=10, block_size=1000):
+    # the range of the raw data is estimated on num_blocks evenly spaced blocks of block_size frames
+    num_frames = data.shape[1]
+    if num_frames == 0:
+        return 0, 0
+    block_size = min(block_size, num_frames)
+    starts = np.unique(np.linspace(0, num_frames - block_size, num_blocks).astype('int64'))
+    blocks = [data[:, start:start + block_size] for start in starts]
+    return min(np.amin(block) for block in blocks), max(np.amax(block) for block in blocks)
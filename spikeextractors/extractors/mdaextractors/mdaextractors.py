@@ -1,10 +1,13 @@
 from spikeextractors import RecordingExtractor
 from spikeextractors import SortingExtractor
+from spikeextractors.spikevector import SpikeVector
+from spikeextractors.recordingextractor import _get_snippet_len
+from spikeextractors.extraction_tools import write_to_binary_dat_format, _get_array_traces, _get_index_slice
 
 import json
 import numpy as np
 from pathlib import Path
-from .mdaio import DiskReadMda, readmda, writemda32, writemda64
+from .mdaio import readmda_memmap, writemda_header, writemda64
 import os
 
 
@@ -29,13 +32,13 @@ class MdaRecordingExtractor(RecordingExtractor):
         geom0 = os.path.join(dataset_directory, 'geom.csv')
         self._geom_fname = geom0
         self._geom = np.genfromtxt(self._geom_fname, delimiter=',')
-        X = DiskReadMda(self._timeseries_path)
-        if self._geom.shape[0] != X.N1():
-            raise Exception(
-                'Incompatible dimensions between geom.csv and timeseries file {} <> {}'.format(self._geom.shape[0],
-                                                                                               X.N1()))
-        self._num_channels = X.N1()
-        self._num_timepoints = X.N2()
+        # the header is parsed once and the (channels x frames) data is memory-mapped in column-major order
+        self._timeseries = readmda_memmap(self._timeseries_path)
+        if self._geom.shape[0] != self._timeseries.shape[0]:
+            raise Exception('Incompatible dimensions between geom.csv and timeseries file {} <> {}'.format(
+                self._geom.shape[0], self._timeseries.shape[0]))
+        self._num_channels = self._timeseries.shape[0]
+        self._num_timepoints = self._timeseries.shape[1]
         RecordingExtractor.__init__(self)
         for m in range(self._num_channels):
             self.set_channel_property(m, 'location', self._geom[m, :])
@@ -49,20 +52,89 @@ class MdaRecordingExtractor(RecordingExtractor):
     def get_sampling_frequency(self):
         return self._sampling_frequency
 
-    def get_traces(self, channel_ids=None, start_frame=None, end_frame=None):
+    def get_traces(self, channel_ids=None, start_frame=None, end_frame=None, return_scaled=True, out=None,
+                   return_view=False):
+        '''Returns the traces of the given channels within [start_frame, end_frame) (see
+        RecordingExtractor.get_traces), read from the memory-mapped file. Only the requested channels are
+        copied (into out, if given). If return_view is True and the channels are a contiguous range, a
+        read-only view of the file is returned without copy.
+        '''
         if start_frame is None:
             start_frame = 0
         if end_frame is None:
             end_frame = self.get_num_frames()
+        return _get_array_traces(self._timeseries, channel_ids, start_frame, end_frame, out=out,
+                                 return_view=return_view)
+
+    def get_snippets(self, *, reference_frames, snippet_len, channel_ids=None, chunk_size=30000):
+        # the frames of the snippets are gathered directly from the memory-mapped file, where the channels
+        # of each frame are contiguous (see RecordingExtractor.get_snippets)
+        snippet_len_before, snippet_len_after = _get_snippet_len(snippet_len)
         if channel_ids is None:
-            channel_ids = self.get_channel_ids()
-        X = DiskReadMda(self._timeseries_path)
-        recordings = X.readChunk(i1=0, i2=start_frame, N1=X.N1(), N2=end_frame - start_frame)
-        recordings = recordings[channel_ids, :]
-        return recordings
+            channels = slice(None)
+            num_channels = self._num_channels
+        else:
+            channels = _get_index_slice(channel_ids)
+            num_channels = len(channel_ids)
+            if not isinstance(channels, slice):
+                channels = channels[:, np.newaxis]
+        reference_frames = np.asarray(reference_frames).astype('int64')
+        num_snippets = len(reference_frames)
+        snippet_len_total = snippet_len_before + snippet_len_after
+        snippets = np.zeros((num_snippets, num_channels, snippet_len_total))
+        if num_snippets == 0 or snippet_len_total <= 0:
+            return snippets
+        num_frames = self.get_num_frames()
+        offsets = np.arange(snippet_len_total) - snippet_len_before
+        # snippets are gathered in batches of about chunk_size frames
+        batch_size = max(int(chunk_size) // snippet_len_total, 1)
+        for first in range(0, num_snippets, batch_size):
+            frames = reference_frames[first:first + batch_size]
+            frame_idxs = frames[:, np.newaxis] + offsets
+            # snippets with a reference frame out of the recording and out-of-bounds frames are left to zeros
+            in_bounds = (frame_idxs >= 0) & (frame_idxs < num_frames) & \
+                        ((frames >= 0) & (frames < num_frames))[:, np.newaxis]
+            frame_idxs = np.clip(frame_idxs, 0, num_frames - 1)
+            traces = self._timeseries[channels, frame_idxs.ravel()].reshape((num_channels,) + frame_idxs.shape)
+            snippets[first:first + batch_size] = np.where(in_bounds[:, np.newaxis, :],
+                                                          np.transpose(traces, (1, 0, 2)), 0)
+        return snippets
+
+    def __getstate__(self):
+        # the memory-mapped data is not pickled, the file is mapped again when unpickled
+        state = self.__dict__.copy()
+        del state['_timeseries']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._timeseries = readmda_memmap(self._timeseries_path)
 
     @staticmethod
-    def write_recording(recording, save_path, params=dict()):
+    def write_recording(recording, save_path, params=dict(), dtype='float32', chunk_size=None, chunk_mb=500,
+                        n_jobs=1):
+        '''Writes a recording in a folder in MountainSort format (raw.mda, params.json, and geom.csv). The header
+        of raw.mda is written first and the traces are then copied chunk by chunk, so that at most one chunk
+        of traces is loaded in memory.
+
+        Parameters
+        ----------
+        recording: RecordingExtractor
+            The recording extractor to be saved
+        save_path: str or Path
+            The folder in which the recording is saved
+        params: dict
+            Additional parameters saved in params.json
+        dtype: dtype
+            The dtype of the traces in raw.mda (default float32)
+        chunk_size: None or int
+            The number of frames of each chunk
+        chunk_mb: None or float
+            If chunk_size is None, the chunk size is computed so that each chunk is at most chunk_mb MB
+            (default 500). If both chunk_size and chunk_mb are None, the traces are copied at once.
+        n_jobs: int
+            Number of processes used to write raw.mda (default 1, see write_to_binary_dat_format)
+        '''
         save_path = Path(save_path)
         if not save_path.exists():
             if not save_path.is_dir():
@@ -72,7 +144,6 @@ class MdaRecordingExtractor(RecordingExtractor):
 
         channel_ids = recording.get_channel_ids()
         M = len(channel_ids)
-        raw = recording.get_traces()
         location0 = recording.get_channel_property(channel_ids[0], 'location')
         nd = len(location0)
         geom = np.zeros((M, nd))
@@ -81,7 +152,11 @@ class MdaRecordingExtractor(RecordingExtractor):
             geom[ii, :] = list(location_ii)
         if not os.path.isdir(save_path):
             os.mkdir(save_path)
-        writemda32(raw, save_file_path)
+        # the payload of a (channels x frames) .mda file has the layout of a binary file with time_axis=0
+        dtype = np.dtype(dtype).name
+        header_size = writemda_header(save_file_path, (M, recording.get_num_frames()), dtype)
+        write_to_binary_dat_format(recording, save_file_path, time_axis=0, dtype=dtype, chunk_size=chunk_size,
+                                   chunk_mb=chunk_mb, n_jobs=n_jobs, offset=header_size)
         params["samplerate"] = recording.get_sampling_frequency()
         with (parent_dir / 'params.json').open('w') as f:
             json.dump(params, f)
@@ -96,6 +171,7 @@ class MdaSortingExtractor(SortingExtractor):
     ]
     installed = True  # check at class level if installed or not
     is_writable = True
+    _sorted_spike_trains = True
     mode = 'file'
     installation_mesg = ""  # error message when not installed
 
@@ -103,54 +179,47 @@ class MdaSortingExtractor(SortingExtractor):
 
         SortingExtractor.__init__(self)
         self._firings_path = file_path
-        self._firings = readmda(self._firings_path)
+        # the firings are memory-mapped: only the times and labels are read, once, to build the spike index
+        self._firings = readmda_memmap(str(self._firings_path))
         self._max_channels = self._firings[0, :]
         self._times = self._firings[1, :]
         self._labels = self._firings[2, :]
-        self._unit_ids = np.unique(self._labels).astype(int)
         self._sampling_frequency = sampling_frequency
-        for unit_id in self._unit_ids:
-            inds = np.where(self._labels == unit_id)
-            max_channels = self._max_channels[inds].astype(int)
-            self.set_unit_property(unit_id, 'max_channel', max_channels[0])
+        self._spike_vector = SpikeVector(np.rint(self._times).astype(int), self._labels.astype(int))
+        self._unit_ids = self._spike_vector.unit_ids
+        # the max channel of each unit is the one of its first spike in the file
+        offsets = self._spike_vector.offsets
+        if len(self._unit_ids) > 0:
+            first_spike_inds = np.minimum.reduceat(self._spike_vector.order, offsets[:-1])
+            self.set_units_property(unit_ids=self.get_unit_ids(), property_name='max_channel',
+                                    values=list(self._max_channels[first_spike_inds].astype(int)))
 
     def get_unit_ids(self):
         return list(self._unit_ids)
 
     def get_unit_spike_train(self, unit_id, start_frame=None, end_frame=None):
-        if start_frame is None:
-            start_frame = 0
-        if end_frame is None:
-            end_frame = np.Inf
-        inds = np.where((self._labels == unit_id) & (start_frame <= self._times) & (self._times < end_frame))
-        return np.rint(self._times[inds]).astype(int)
+        return self._spike_vector.get_unit_spike_train(unit_id, start_frame=start_frame, end_frame=end_frame).copy()
+
+    def get_all_spikes(self, unit_ids=None, start_frame=None, end_frame=None):
+        return self._spike_vector.get_all_spikes(unit_ids=unit_ids, start_frame=start_frame, end_frame=end_frame)
 
     @staticmethod
     def write_sorting(sorting, save_path, write_primary_channels=False):
         unit_ids = sorting.get_unit_ids()
-        times_list = []
-        labels_list = []
-        primary_channels_list = []
-        for unit_id in unit_ids:
-            times = sorting.get_unit_spike_train(unit_id=unit_id)
-            times_list.append(times)
-            labels_list.append(np.ones(times.shape) * unit_id)
-            if write_primary_channels:
-                if 'max_channel' in sorting.get_unit_property_names(unit_id):
-                    primary_channels_list.append([sorting.get_unit_property(unit_id, 'max_channel')]*times.shape[0])
-                else:
+        all_times, all_labels = sorting.get_all_spikes(unit_ids=unit_ids)
+        if write_primary_channels:
+            for unit_id in unit_ids:
+                if 'max_channel' not in sorting.get_unit_property_names(unit_id):
                     raise ValueError(
                         "Unable to write primary channels because 'max_channel' spike feature not set in unit " + str(
                             unit_id))
-            else:
-                primary_channels_list.append(np.zeros(times.shape))
-        all_times = _concatenate(times_list)
-        all_labels = _concatenate(labels_list)
-        all_primary_channels = _concatenate(primary_channels_list)
-        sort_inds = np.argsort(all_times)
-        all_times = all_times[sort_inds]
-        all_labels = all_labels[sort_inds]
-        all_primary_channels = all_primary_channels[sort_inds]
+            max_channels = np.array(sorting.get_units_property(unit_ids=unit_ids, property_name='max_channel'))
+            # position of the unit of each spike in unit_ids
+            unit_ids = np.array(unit_ids)
+            sorter = np.argsort(unit_ids)
+            all_primary_channels = max_channels[sorter[np.searchsorted(unit_ids, all_labels, sorter=sorter)]]
+        else:
+            all_primary_channels = np.zeros(all_times.shape)
         L = len(all_times)
         firings = np.zeros((3, L))
         firings[0, :] = all_primary_channels
@@ -160,12 +229,6 @@ class MdaSortingExtractor(SortingExtractor):
         writemda64(firings, save_path)
 
 
-def _concatenate(list):
-    if len(list) == 0:
-        return np.array([])
-    return np.concatenate(list)
-
-
 def read_dataset_params(dsdir):
     fname1 = os.path.join(dsdir, 'params.json')
     if not os.path.exists(fname1):
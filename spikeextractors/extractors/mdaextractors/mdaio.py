@@ -274,6 +274,27 @@ def _write_header(path,H,rewrite=False):
         f.close()
         return False
 
+def readmda_memmap(path):
+    """Returns the array of a .mda file as a read-only np.memmap (column-major order), without reading the data"""
+    if (file_extension(path)=='.npy'):
+        return np.load(path,mmap_mode='r')
+    if is_url(path):
+        raise Exception('Cannot memory-map a remote mda file: '+path)
+    H=_read_header(path)
+    if (H is None):
+        raise Exception('Problem reading header of: {}'.format(path))
+    return np.memmap(path,dtype=H.dt,mode='r',offset=H.header_size,shape=tuple(int(d) for d in H.dims),order='F')
+
+def writemda_header(path,dims,dt):
+    """Writes the header of a .mda file with the given dims and dtype (truncating the file), and returns the
+    header size in bytes, after which the payload is written in column-major order"""
+    if _dt_code_from_dt(dt) is None:
+        raise Exception('Unexpected data type: {}'.format(dt))
+    H=MdaHeader(dt,[int(d) for d in dims])
+    if not _write_header(path,H):
+        raise Exception('Problem writing header of: {}'.format(path))
+    return H.header_size
+
 def readmda(path):
     if (file_extension(path)=='.npy'):
         return readnpy(path);
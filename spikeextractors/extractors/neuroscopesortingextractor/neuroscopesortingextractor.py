@@ -1,4 +1,5 @@
 from spikeextractors import SortingExtractor
+from spikeextractors.spikevector import SpikeVector
 import numpy as np
 
 class NeuroscopeSortingExtractor(SortingExtractor):
@@ -25,6 +26,7 @@ class NeuroscopeSortingExtractor(SortingExtractor):
     ]
     installed = True  # check at class level if installed or not
     is_writable = True
+    _sorted_spike_trains = True
     mode = 'custom'
 
     def __init__(self, resfile, clufile):
@@ -34,25 +36,20 @@ class NeuroscopeSortingExtractor(SortingExtractor):
         if len(res) > 0:
             n_clu = clu[0]
             clu = np.delete(clu, 0)
-            self._spiketrains = []
             self._unit_ids = list(x + 1 for x in range(n_clu))
-            for s_id in self._unit_ids:
-                self._spiketrains.append(res[(clu == s_id).nonzero()])
+            self._spike_vector = SpikeVector(res, clu, unit_ids=self._unit_ids)
         else:
-            self._spiketrains = []
             self._unit_ids = []
+            self._spike_vector = SpikeVector(res, clu[:0])
 
     def get_unit_ids(self):
         return list(self._unit_ids)
 
     def get_unit_spike_train(self, unit_id, start_frame=None, end_frame=None):
-        if start_frame is None:
-            start_frame = 0
-        if end_frame is None:
-            end_frame = np.Inf
-        times = self._spiketrains[self.get_unit_ids().index(unit_id)]
-        inds = np.where((start_frame <= times) & (times < end_frame))
-        return times[inds]
+        return self._spike_vector.get_unit_spike_train(unit_id, start_frame=start_frame, end_frame=end_frame).copy()
+
+    def get_all_spikes(self, unit_ids=None, start_frame=None, end_frame=None):
+        return self._spike_vector.get_all_spikes(unit_ids=unit_ids, start_frame=start_frame, end_frame=end_frame)
 
     @staticmethod
     def write_sorting(sorting, save_path):
@@ -60,12 +57,11 @@ class NeuroscopeSortingExtractor(SortingExtractor):
         save_clu = "{}.clu".format(save_path)
         unit_ids = sorting.get_unit_ids()
         if len(unit_ids) > 0:
-            spiketrains = [sorting.get_unit_spike_train(u) for u in unit_ids]
-            res = np.concatenate(spiketrains).ravel()
-            clu = np.concatenate([np.repeat(i+2,len(st)) for i,st in enumerate(spiketrains)]).ravel()
-            res_sort = np.argsort(res)
-            res = res[res_sort]
-            clu = clu[res_sort]
+            res, labels = sorting.get_all_spikes(unit_ids=unit_ids)
+            # units are numbered from 2 in the order of unit_ids
+            unit_ids = np.array(unit_ids)
+            sorter = np.argsort(unit_ids)
+            clu = sorter[np.searchsorted(unit_ids, labels, sorter=sorter)] + 2
         else:
             res = []
             clu = []
@@ -58,7 +58,7 @@ class NIXIORecordingExtractor(RecordingExtractor):
         sampling_frequency = 1./timedim.sampling_interval
         return sampling_frequency
 
-    def get_traces(self, channel_ids=None, start_frame=None, end_frame=None):
+    def get_traces(self, channel_ids=None, start_frame=None, end_frame=None, return_scaled=True):
         if channel_ids:
             channels = np.array([self._traces[cid] for cid in channel_ids])
         else:
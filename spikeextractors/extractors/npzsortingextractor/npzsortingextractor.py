@@ -1,4 +1,5 @@
 from spikeextractors import SortingExtractor
+from spikeextractors.spikevector import SpikeVector
 from pathlib import Path
 
 import numpy as np
@@ -22,6 +23,7 @@ class NpzSortingExtractor(SortingExtractor):
     installed = True # depend only on numpy
     installation_mesg = "Always installed"
     is_writable = True
+    _sorted_spike_trains = True
     mode = 'file'
 
     def __init__(self, file_path):
@@ -33,6 +35,7 @@ class NpzSortingExtractor(SortingExtractor):
         self.unit_ids = npz['unit_ids']
         self.spike_indexes = npz['spike_indexes']
         self.spike_labels = npz['spike_labels']
+        self._spike_vector = SpikeVector(self.spike_indexes.astype('int64', copy=False), self.spike_labels)
 
         if 'sampling_frequency' in npz:
             self._sampling_frequency = float(npz['sampling_frequency'][0])
@@ -43,38 +46,19 @@ class NpzSortingExtractor(SortingExtractor):
         return list(self.unit_ids)
 
     def get_unit_spike_train(self, unit_id, start_frame=None, end_frame=None):
-        spike_times = self.spike_indexes[self.spike_labels == unit_id]
-        if start_frame is not None:
-            spike_times = spike_times[spike_times >= start_frame]
-        if end_frame is not None:
-            spike_times = spike_times[spike_times < end_frame]
-        return spike_times.astype('int64')
+        return self._spike_vector.get_unit_spike_train(unit_id, start_frame=start_frame, end_frame=end_frame).copy()
+
+    def get_all_spikes(self, unit_ids=None, start_frame=None, end_frame=None):
+        return self._spike_vector.get_all_spikes(unit_ids=unit_ids, start_frame=start_frame, end_frame=end_frame)
 
     @staticmethod
     def write_sorting(sorting, save_path):
         d = {}
         units_ids = np.array(sorting.get_unit_ids())
         d['unit_ids'] = units_ids
-        spike_indexes = []
-        spike_labels = []
-        for unit_id in units_ids:
-            sp_ind = sorting.get_unit_spike_train(unit_id)
-            spike_indexes.append(sp_ind)
-            spike_labels.append(np.ones(sp_ind.size, dtype='int64')*unit_id)
-
-        # order times
-        if len(spike_indexes) > 0:
-            spike_indexes = np.concatenate(spike_indexes)
-            spike_labels = np.concatenate(spike_labels)
-            order = np.argsort(spike_indexes)
-            spike_indexes = spike_indexes[order]
-            spike_labels = spike_labels[order]
-        else:
-            spike_indexes = np.array([], dtype='int64')
-            spike_labels = np.array([], dtype='int64')
-
+        spike_indexes, spike_labels = sorting.get_all_spikes(unit_ids=units_ids)
         d['spike_indexes'] = spike_indexes
-        d['spike_labels'] = spike_labels
+        d['spike_labels'] = spike_labels.astype('int64')
 
         if sorting.get_sampling_frequency() is not None:
             d['sampling_frequency'] = np.array([sorting.get_sampling_frequency()], dtype='float64')
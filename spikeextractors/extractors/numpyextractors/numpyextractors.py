@@ -1,5 +1,7 @@
 from spikeextractors import RecordingExtractor
 from spikeextractors import SortingExtractor
+from spikeextractors.spikevector import get_spike_window
+from spikeextractors.extraction_tools import _get_array_traces
 from pathlib import Path
 import numpy as np
 
@@ -36,20 +38,31 @@ class NumpyRecordingExtractor(RecordingExtractor):
     def get_sampling_frequency(self):
         return self._sampling_frequency
 
-    def get_traces(self, channel_ids=None, start_frame=None, end_frame=None):
+    def get_traces(self, channel_ids=None, start_frame=None, end_frame=None, return_scaled=True, out=None,
+                   return_view=False):
+        '''Returns the traces of the given channels within [start_frame, end_frame) (see
+        RecordingExtractor.get_traces), copied into out if given. If return_view is True and the channels are a
+        contiguous range, a view of the timeseries is returned without copy.
+        '''
         if start_frame is None:
             start_frame = 0
         if end_frame is None:
             end_frame = self.get_num_frames()
-        if channel_ids is None:
-            channel_ids = self.get_channel_ids()
-        recordings = self._timeseries[:, start_frame:end_frame][channel_ids, :]
-        return recordings
+        return _get_array_traces(self._timeseries, channel_ids, start_frame, end_frame, out=out,
+                                 return_view=return_view)
 
     @staticmethod
-    def write_recording(recording, save_path):
+    def write_recording(recording, save_path, chunk_size=None, chunk_mb=500):
         save_path = Path(save_path)
-        np.save(save_path, recording.get_traces())
+        if save_path.suffix != '.npy':
+            save_path = save_path.parent / (save_path.name + '.npy')
+        dtype = recording.get_traces(start_frame=0, end_frame=1).dtype
+        shape = (recording.get_num_channels(), recording.get_num_frames())
+        timeseries = np.lib.format.open_memmap(str(save_path), mode='w+', dtype=dtype, shape=shape)
+        for traces, start_frame, end_frame in recording.iter_chunks(chunk_size=chunk_size, chunk_mb=chunk_mb):
+            timeseries[:, start_frame:end_frame] = traces
+        timeseries.flush()
+        del timeseries
 
 
 class NumpySortingExtractor(SortingExtractor):
@@ -110,16 +123,27 @@ class NumpySortingExtractor(SortingExtractor):
         times: np.array
             An array of spike times (in frames).
         '''
-        self._units[unit_id] = dict(times=times)
+        times = np.asarray(times)
+        is_sorted = len(times) < 2 or bool(np.all(times[1:] >= times[:-1]))
+        self._units[unit_id] = dict(times=times, is_sorted=is_sorted)
 
     def get_unit_ids(self):
         return list(self._units.keys())
 
+    def _get_unit_num_spikes(self, unit_id):
+        # the spike trains can be replaced by add_unit
+        if self._units[unit_id]['is_sorted']:
+            return len(self._units[unit_id]['times'])
+        return len(self.get_unit_spike_train(unit_id))
+
     def get_unit_spike_train(self, unit_id, start_frame=None, end_frame=None):
+        times = self._units[unit_id]['times']
+        if self._units[unit_id]['is_sorted']:
+            start, end = get_spike_window(times, start_frame, end_frame)
+            return np.rint(times[start:end]).astype(int)
         if start_frame is None:
             start_frame = 0
         if end_frame is None:
             end_frame = np.Inf
-        times = self._units[unit_id]['times']
         inds = np.where((start_frame <= times) & (times < end_frame))[0]
         return np.rint(times[inds]).astype(int)
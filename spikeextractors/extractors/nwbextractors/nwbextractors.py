@@ -1,4 +1,5 @@
 import spikeextractors as se
+from spikeextractors.extraction_tools import _get_recording_traces
 
 import os
 import numpy as np
@@ -28,8 +29,19 @@ class CopyRecordingExtractor(se.RecordingExtractor):
     def get_sampling_frequency(self):
         return self._other.get_sampling_frequency()
 
-    def get_traces(self, channel_ids=None, start_frame=None, end_frame=None):
-        return self._other.get_traces(channel_ids=channel_ids, start_frame=start_frame, end_frame=end_frame)
+    @property
+    def _default_return_scaled(self):
+        return self._other._default_return_scaled
+
+    def get_traces(self, channel_ids=None, start_frame=None, end_frame=None, return_scaled=None):
+        return _get_recording_traces(self._other, return_scaled, channel_ids=channel_ids, start_frame=start_frame,
+                                     end_frame=end_frame)
+
+    def get_traces_raw(self, channel_ids=None, start_frame=None, end_frame=None):
+        return self._other.get_traces_raw(channel_ids=channel_ids, start_frame=start_frame, end_frame=end_frame)
+
+    def get_channel_scaling(self, channel_ids=None):
+        return self._other.get_channel_scaling(channel_ids=channel_ids)
 
 
 class NwbRecordingExtractor(CopyRecordingExtractor):
@@ -66,13 +78,18 @@ class NwbRecordingExtractor(CopyRecordingExtractor):
             geom = np.zeros((M, 3))
             for m in range(M):
                 geom[m, :] = [ts.electrodes[m][1], ts.electrodes[m][2], ts.electrodes[m][3]]
-            if hasattr(ts, 'timestamps') and ts.timestamps:
-                sampling_frequency = 1 / (ts.timestamps[1] - ts.timestamps[0])  # there's probably a better way
+            timestamps = None
+            if getattr(ts, 'timestamps', None) is not None and len(ts.timestamps) > 1:
+                # the timestamps are kept for the exact frame/time conversions, and the sampling frequency
+                # is their average rate
+                timestamps = np.array(ts.timestamps, dtype='float64')
+                sampling_frequency = (len(timestamps) - 1) / (timestamps[-1] - timestamps[0])
             else:
                 sampling_frequency = ts.rate
             data = np.copy(np.transpose(ts.data))
             NRX = se.NumpyRecordingExtractor(timeseries=data, sampling_frequency=sampling_frequency, geom=geom)
             CopyRecordingExtractor.__init__(self, NRX)
+            self.set_timestamps(timestamps)
 
     @staticmethod
     def write_recording(recording, save_path, acquisition_name='ElectricalSeries', **nwbfile_kwargs):
@@ -133,12 +150,15 @@ class NwbRecordingExtractor(CopyRecordingExtractor):
         rate = recording.get_sampling_frequency()
         ephys_data = recording.get_traces().T
 
+        if recording.get_timestamps() is not None:
+            time_kwargs = dict(timestamps=np.asarray(recording.get_timestamps()))
+        else:
+            time_kwargs = dict(starting_time=recording.frame_to_time(0), rate=rate)
         ephys_ts = ElectricalSeries(
             name=acquisition_name,
             data=ephys_data,
             electrodes=electrode_table_region,
-            starting_time=recording.frame_to_time(0),
-            rate=rate,
+            **time_kwargs,
             resolution=1e-6,
             comments='Generated from SpikeInterface::NwbRecordingExtractor',
             description='acquisition_description'
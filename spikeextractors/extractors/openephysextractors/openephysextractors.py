@@ -41,18 +41,33 @@ class OpenEphysRecordingExtractor(RecordingExtractor):
     def get_sampling_frequency(self):
         return float(self._recording.sample_rate.rescale('Hz').magnitude)
 
-    def get_traces(self, channel_ids=None, start_frame=None, end_frame=None):
+    def get_traces(self, channel_ids=None, start_frame=None, end_frame=None, return_scaled=True):
+        '''Returns the traces (see RecordingExtractor.get_traces). If the extractor was created with dtype='int16',
+        the traces are not scaled (and get_channel_scaling returns unit gains).
+        '''
         if start_frame is None:
             start_frame = 0
         if end_frame is None:
             end_frame = self.get_num_frames()
+        if channel_ids is None:
+            channel_ids = self.get_channel_ids()
+        traces = self._recording.analog_signals[0].signal[channel_ids, start_frame:end_frame]
+        if return_scaled and self._dtype != 'int16':
+            traces = traces * self._recording.analog_signals[0].gain
+        return traces
+
+    def get_traces_raw(self, channel_ids=None, start_frame=None, end_frame=None):
+        return self.get_traces(channel_ids=channel_ids, start_frame=start_frame, end_frame=end_frame,
+                               return_scaled=False)
+
+    def get_channel_scaling(self, channel_ids=None):
         if channel_ids is None:
             channel_ids = self.get_channel_ids()
         if self._dtype == 'int16':
-            return self._recording.analog_signals[0].signal[channel_ids, start_frame:end_frame]
-        elif self._dtype == 'float':
-            return self._recording.analog_signals[0].signal[channel_ids, start_frame:end_frame] * \
-                   self._recording.analog_signals[0].gain
+            gain = 1.0
+        else:
+            gain = float(self._recording.analog_signals[0].gain)
+        return np.full(len(channel_ids), gain), np.zeros(len(channel_ids))
 
 
 class OpenEphysSortingExtractor(SortingExtractor):
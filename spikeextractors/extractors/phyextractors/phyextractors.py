@@ -1,6 +1,7 @@
 from spikeextractors import SortingExtractor, RecordingExtractor
 from spikeextractors.extractors.bindatrecordingextractor import BinDatRecordingExtractor
 from spikeextractors.extraction_tools import read_python, write_python
+from spikeextractors.spikevector import SpikeVector
 import numpy as np
 from pathlib import Path
 import csv
@@ -60,6 +61,7 @@ class PhySortingExtractor(SortingExtractor):
     ]
     installed = True  # check at class level if installed or not
     is_writable = True
+    _sorted_spike_trains = True
     mode = 'folder'
     installation_mesg = ""  # error message when not installed
 
@@ -148,14 +150,15 @@ class PhySortingExtractor(SortingExtractor):
 
         original_units = self._unit_ids
         self._unit_ids = included_units
-        # set features
-        self._spiketrains = []
-        for clust in self._unit_ids:
-            idx = np.where(spike_clusters == clust)[0]
-            self._spiketrains.append(spike_times[idx])
-            self.set_unit_spike_features(clust, 'amplitudes', amplitudes[idx])
+        # the spike trains are built with a single sort, and the features follow the order of the spikes
+        self._spike_vector = SpikeVector(spike_times.ravel(), spike_clusters.ravel(), unit_ids=self._unit_ids)
+        if len(self._unit_ids) > 0:
+            spike_indices = self._spike_vector.order
+            self.set_units_spike_features(unit_ids=self._unit_ids, feature_name='amplitudes',
+                                          values=amplitudes[spike_indices])
             if pc_features is not None:
-                self.set_unit_spike_features(clust, 'pc_features', pc_features[idx])
+                self.set_units_spike_features(unit_ids=self._unit_ids, feature_name='pc_features',
+                                              values=pc_features[spike_indices])
 
         if load_waveforms:
             datfile = [x for x in phy_folder.iterdir() if x.suffix == '.dat' or x.suffix == '.bin']
@@ -203,36 +206,30 @@ class PhySortingExtractor(SortingExtractor):
         return list(self._unit_ids)
 
     def get_unit_spike_train(self, unit_id, start_frame=None, end_frame=None):
-        if start_frame is None:
-            start_frame = 0
-        if end_frame is None:
-            end_frame = np.Inf
-        times = self._spiketrains[self.get_unit_ids().index(unit_id)]
-        inds = np.where((start_frame <= times) & (times < end_frame))
-        return times[inds]
+        return self._spike_vector.get_unit_spike_train(unit_id, start_frame=start_frame, end_frame=end_frame).copy()
+
+    def get_all_spikes(self, unit_ids=None, start_frame=None, end_frame=None):
+        return self._spike_vector.get_all_spikes(unit_ids=unit_ids, start_frame=start_frame, end_frame=end_frame)
 
     @staticmethod
     def write_sorting(sorting, save_path):
         save_path = Path(save_path)
-        spike_times = np.array([])
-        spike_clusters = np.array([])
+        unit_ids = sorting.get_unit_ids()
+        spike_trains = sorting.get_spike_trains(unit_ids=unit_ids)
+        if len(spike_trains) > 0:
+            spike_times = np.concatenate([np.asarray(st).ravel() for st in spike_trains]).astype(float)
+        else:
+            spike_times = np.array([])
+        spike_clusters = np.repeat(np.array(unit_ids, dtype=float), [len(st) for st in spike_trains])
         amplitudes = np.array([])
         pc_features = np.array([])
-
-        for id in sorting.get_unit_ids():
-            st = sorting.get_unit_spike_train(id)
-            cl = [id] * len(sorting.get_unit_spike_train(id))
-            spike_times = np.concatenate((spike_times, np.array(st)))
-            spike_clusters = np.concatenate((spike_clusters, np.array(cl)))
-            if 'amplitudes' in sorting.get_shared_unit_spike_feature_names():
-                amp = sorting.get_unit_spike_features(id, 'amplitudes')
-                amplitudes = np.concatenate((amplitudes, np.array(amp)))
-            if 'pc_features' in sorting.get_shared_unit_spike_feature_names():
-                pc_feat = sorting.get_unit_spike_features(id, 'pc_features')
-                if len(pc_features) == 0:
-                    pc_features = pc_feat
-                else:
-                    pc_features = np.vstack((pc_features, np.array(pc_feat)))
+        shared_feature_names = sorting.get_shared_unit_spike_feature_names() if len(unit_ids) > 0 else []
+        if 'amplitudes' in shared_feature_names:
+            amplitudes = np.asarray(sorting.get_units_spike_features(unit_ids=unit_ids, feature_name='amplitudes',
+                                                                     concatenate=True)).ravel()
+        if 'pc_features' in shared_feature_names:
+            pc_features = sorting.get_units_spike_features(unit_ids=unit_ids, feature_name='pc_features',
+                                                           concatenate=True)
 
         sorting_idxs = np.argsort(spike_times)
         spike_times = spike_times[sorting_idxs]
@@ -1,4 +1,5 @@
 from spikeextractors import RecordingExtractor
+from spikeextractors.extraction_tools import write_to_binary_dat_format, _get_array_traces
 from .readSGLX import readMeta, SampRate, makeMemMapRaw, GainCorrectIM, GainCorrectNI
 import numpy as np
 from pathlib import Path
@@ -17,6 +18,8 @@ class SpikeGLXRecordingExtractor(RecordingExtractor):
         {'name': 'y_pitch', 'type': 'int', 'value':20, 'default':20, 'title': "y_pitch for Neuropixels probe (default 20)"},
     ]
     installation_mesg = ""  # error message when not installed
+    # the int16 data is returned by default (the gains are set as the 'gain' channel property)
+    _default_return_scaled = False
 
     def __init__(self, file_path, x_pitch=21, y_pitch=20):
         RecordingExtractor.__init__(self)
@@ -61,10 +64,22 @@ class SpikeGLXRecordingExtractor(RecordingExtractor):
         elif meta['typeThis'] =='nidq':
             gains = GainCorrectNI(self._timeseries, self._channels, meta)
 
-        # set gains - convert from int16 to uVolt
-        self.set_channel_gains(self._channels, gains*1e6)
+        # set gains - convert from int16 to uVolt. They are applied by get_traces with return_scaled=True
+        self._gains = gains * 1e6
+        self.set_channel_gains(self._channels, self._gains)
 
 
+    def __getstate__(self):
+        # the memory-mapped data is not pickled, the file is mapped again when unpickled
+        state = self.__dict__.copy()
+        del state['_timeseries']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        rawData = makeMemMapRaw(self._npxfile, readMeta(self._npxfile))
+        self._timeseries = rawData[0:len(self._channels), :]
+
     def get_channel_ids(self):
         return self._channels
 
@@ -74,29 +89,45 @@ class SpikeGLXRecordingExtractor(RecordingExtractor):
     def get_sampling_frequency(self):
         return self._sampling_frequency
 
-    def get_traces(self, channel_ids=None, start_frame=None, end_frame=None):
+    def get_traces(self, channel_ids=None, start_frame=None, end_frame=None, return_scaled=False, out=None,
+                   return_view=False):
+        '''Returns the traces of the given channels within [start_frame, end_frame) (see
+        RecordingExtractor.get_traces). By default the int16 data of the file is returned, as by
+        get_traces_raw; with return_scaled=True the traces are multiplied by the channel gains, in uV.
+        '''
         if start_frame is None:
             start_frame = 0
         if end_frame is None:
             end_frame = self.get_num_frames()
         if channel_ids is None:
-            channel_ids = list(range(self._timeseries.shape[0]))
+            channel_idxs = None
         else:
-            channel_ids = [self._channels.index(ch) for ch in channel_ids]
-        recordings = self._timeseries[channel_ids, start_frame:end_frame]
-        return recordings
+            channel_idxs = [self._channels.index(ch) for ch in channel_ids]
+        gains = self._gains if return_scaled else None
+        return _get_array_traces(self._timeseries, channel_idxs, start_frame, end_frame, out=out,
+                                 return_view=return_view, gain=gains)
+
+    def get_traces_raw(self, channel_ids=None, start_frame=None, end_frame=None, out=None, return_view=True):
+        return self.get_traces(channel_ids=channel_ids, start_frame=start_frame, end_frame=end_frame,
+                               return_scaled=False, out=out, return_view=return_view)
+
+    def get_channel_scaling(self, channel_ids=None):
+        if channel_ids is None:
+            channel_ids = self.get_channel_ids()
+        gains = np.array([self._gains[self._channels.index(ch)] for ch in channel_ids], dtype='float64')
+        return gains, np.zeros(len(channel_ids))
 
     @staticmethod
-    def write_recording(recording, save_path, dtype=None, transpose=False):
+    def write_recording(recording, save_path, dtype=None, transpose=False, chunk_size=None, chunk_mb=500):
         save_path = Path(save_path)
         if dtype is None:
             dtype = np.float32
         if not transpose:
-            with save_path.open('wb') as f:
-                np.transpose(np.array(recording.get_traces(), dtype=dtype)).tofile(f)
-        elif transpose:
-            with save_path.open('wb') as f:
-                np.array(recording.get_traces(), dtype=dtype).tofile(f)
+            time_axis = 0
+        else:
+            time_axis = 1
+        write_to_binary_dat_format(recording, save_path, time_axis=time_axis, dtype=dtype, chunk_size=chunk_size,
+                                   chunk_mb=chunk_mb)
 
 
 def _parse_spikeglx_metafile(metafile, x_pitch, y_pitch):
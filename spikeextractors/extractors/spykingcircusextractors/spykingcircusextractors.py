@@ -1,5 +1,6 @@
 from spikeextractors import SortingExtractor
 from spikeextractors.extractors.numpyextractors import NumpyRecordingExtractor
+from spikeextractors.spikevector import get_spike_window
 import numpy as np
 from pathlib import Path
 
@@ -59,6 +60,7 @@ class SpykingCircusSortingExtractor(SortingExtractor):
     exporter_name = 'SpykingCircusSortingExporter'
     installed = HAVE_SCSX  # check at class level if installed or not
     is_writable = True
+    _sorted_spike_trains = True
     mode = 'folder'
     exporter_gui_params = [
         {'name': 'save_path', 'type': 'file_or_folder', 'title': "Path to file or folder (file must end with is either"
@@ -114,20 +116,16 @@ class SpykingCircusSortingExtractor(SortingExtractor):
         self._spiketrains = []
         self._unit_ids = []
         for temp in f_results['spiketimes'].keys():
-            self._spiketrains.append(np.array(f_results['spiketimes'][temp]).astype('int64'))
+            self._spiketrains.append(np.sort(np.array(f_results['spiketimes'][temp]).astype('int64')))
             self._unit_ids.append(int(temp.split('_')[-1]))
 
     def get_unit_ids(self):
         return list(self._unit_ids)
 
     def get_unit_spike_train(self, unit_id, start_frame=None, end_frame=None):
-        if start_frame is None:
-            start_frame = 0
-        if end_frame is None:
-            end_frame = np.Inf
         times = self._spiketrains[self.get_unit_ids().index(unit_id)]
-        inds = np.where((start_frame <= times) & (times < end_frame))
-        return times[inds]
+        start, end = get_spike_window(times, start_frame, end_frame)
+        return times[start:end]
 
     @staticmethod
     def write_sorting(sorting, save_path):
@@ -145,8 +143,9 @@ class SpykingCircusSortingExtractor(SortingExtractor):
         F = h5py.File(save_path, 'w')
         spiketimes = F.create_group('spiketimes')
 
-        for id in sorting.get_unit_ids():
-            spiketimes.create_dataset('tmp_' + str(id), data=sorting.get_unit_spike_train(id))
+        unit_ids = sorting.get_unit_ids()
+        for id, spike_train in zip(unit_ids, sorting.get_spike_trains(unit_ids=unit_ids)):
+            spiketimes.create_dataset('tmp_' + str(id), data=spike_train)
 
 
 def _load_sample_rate(params_file):
@@ -1,4 +1,5 @@
 from spikeextractors import SortingExtractor
+from spikeextractors.spikevector import SpikeVector
 from pathlib import Path
 
 try:
@@ -13,6 +14,7 @@ class TridesclousSortingExtractor(SortingExtractor):
     extractor_name = 'TridesclousSortingExtractor'
     installed = HAVE_TDC  # check at class level if installed or not
     is_writable = False
+    _sorted_spike_trains = True
     mode = 'folder'
     installation_mesg = "must install tridesclous" # error message when not installed
 
@@ -32,17 +34,18 @@ class TridesclousSortingExtractor(SortingExtractor):
         
         self._sampling_frequency = self.dataio.sample_rate
 
+        spikes = self.dataio.get_spikes(seg_num=0, chan_grp=self.chan_grp, i_start=None, i_stop=None)
+        # copy avoid reference to the unerlying memmap
+        self._spike_vector = SpikeVector(spikes['index'].copy(), spikes['cluster_label'].copy(),
+                                         unit_ids=self.get_unit_ids())
+
     def get_unit_ids(self):
         labels = self.catalogue['clusters']['cluster_label']
         labels = labels[labels>=0]
         return list(labels)
 
     def get_unit_spike_train(self, unit_id, start_frame=None, end_frame=None):
-        spikes = self.dataio.get_spikes(seg_num=0, chan_grp=self.chan_grp, i_start=None, i_stop=None)
-        spikes = spikes[spikes['cluster_label'] == unit_id]
-        spike_times = spikes['index']
-        if start_frame is not None:
-            spike_times = spike_times[spike_times >= start_frame]
-        if end_frame is not None:
-            spike_times = spike_times[spike_times < end_frame]
-        return spike_times.copy()  #copy avoid reference to the unerlying memmap
+        return self._spike_vector.get_unit_spike_train(unit_id, start_frame=start_frame, end_frame=end_frame).copy()
+
+    def get_all_spikes(self, unit_ids=None, start_frame=None, end_frame=None):
+        return self._spike_vector.get_all_spikes(unit_ids=unit_ids, start_frame=start_frame, end_frame=end_frame)
@@ -1,11 +1,14 @@
 from .recordingextractor import RecordingExtractor
+from .propertytable import _stack_values
+from .extraction_tools import _map_in_threads, _get_recording_traces
 import numpy as np
 
 # Concatenates the given recordings by channel
 
 class MultiRecordingChannelExtractor(RecordingExtractor):
-    def __init__(self, recordings, groups=None):
+    def __init__(self, recordings, groups=None, n_jobs=1):
         self._recordings = recordings
+        self._n_jobs = n_jobs
         self._all_channel_ids = []
         self._channel_map = {}
 
@@ -42,23 +45,61 @@ class MultiRecordingChannelExtractor(RecordingExtractor):
             else:
                 raise ValueError("recordings and groups must have same length")
 
-    def get_traces(self, channel_ids=None, start_frame=None, end_frame=None):
+    @property
+    def _default_return_scaled(self):
+        return all(recording._default_return_scaled for recording in self._recordings)
+
+    def get_traces(self, channel_ids=None, start_frame=None, end_frame=None, return_scaled=None):
+        # the recordings are read the same way so that their traces can be stacked
+        if return_scaled is None:
+            return_scaled = self._default_return_scaled
         if start_frame is None:
             start_frame = 0
         if end_frame is None:
             end_frame = self.get_num_frames()
-        traces = []
+        # one read per recording, with the rows of its channels in the output
         if channel_ids is not None:
-            for channel_id in channel_ids:
-                recording = self._recordings[self._channel_map[channel_id]['recording']]
-                channel_id_recording = self._channel_map[channel_id]['channel_id']
-                traces_recording = recording.get_traces(channel_ids=[channel_id_recording], start_frame=start_frame, end_frame=end_frame)
-                traces.append(traces_recording)
+            groups = self._group_by_recording(channel_ids)
         else:
-            for recording in self._recordings:
-                traces_all_recording = recording.get_traces(channel_ids=channel_ids, start_frame=start_frame, end_frame=end_frame)
-                traces.append(traces_all_recording)
-        return np.concatenate(traces, axis=0)
+            groups = {}
+            offset = 0
+            for r_i, recording in enumerate(self._recordings):
+                num_channels = recording.get_num_channels()
+                groups[r_i] = (None, slice(offset, offset + num_channels))
+                offset += num_channels
+        if len(groups) == 0:
+            return np.empty((0, end_frame - start_frame))
+
+        def get_recording_traces(r_i):
+            return _get_recording_traces(self._recordings[r_i], return_scaled, channel_ids=groups[r_i][0],
+                                         start_frame=start_frame, end_frame=end_frame)
+
+        traces_recordings = _map_in_threads(get_recording_traces, groups.keys(), self._n_jobs)
+        if len(traces_recordings) == 1:
+            positions = groups[list(groups.keys())[0]][1]
+            if isinstance(positions, slice) or positions == list(range(len(positions))):
+                return traces_recordings[0]
+        num_channels = len(channel_ids) if channel_ids is not None else self.get_num_channels()
+        num_frames = traces_recordings[0].shape[1]
+        traces = np.empty((num_channels, num_frames),
+                          dtype=np.result_type(*[traces.dtype for traces in traces_recordings]))
+        for (_, positions), traces_recording in zip(groups.values(), traces_recordings):
+            traces[positions] = traces_recording
+        return traces
+
+    def get_traces_raw(self, channel_ids=None, start_frame=None, end_frame=None):
+        return self.get_traces(channel_ids=channel_ids, start_frame=start_frame, end_frame=end_frame,
+                               return_scaled=False)
+
+    def get_channel_scaling(self, channel_ids=None):
+        if channel_ids is None:
+            channel_ids = self.get_channel_ids()
+        gains = np.ones(len(channel_ids))
+        offsets = np.zeros(len(channel_ids))
+        for r_i, (channel_ids_recording, positions) in self._group_by_recording(channel_ids).items():
+            gains[positions], offsets[positions] = \
+                self._recordings[r_i].get_channel_scaling(channel_ids=channel_ids_recording)
+        return gains, offsets
 
     def get_channel_ids(self):
         return self._all_channel_ids
@@ -84,8 +125,55 @@ class MultiRecordingChannelExtractor(RecordingExtractor):
         channel_id_recording = self._channel_map[channel_id]['channel_id']
         property_names = recording.get_channel_property_names(channel_id_recording)
         return property_names
-    
-def concatenate_recordings_by_channel(recordings, groups=None):
+
+    def set_channel_properties(self, property_name, values, channel_ids=None):
+        if channel_ids is None:
+            channel_ids = self.get_channel_ids()
+        if len(channel_ids) != len(values):
+            raise ValueError("channel_ids and values must have same length")
+        for r_i, (channel_ids_recording, positions) in self._group_by_recording(channel_ids).items():
+            self._recordings[r_i].set_channel_properties(property_name, [values[i] for i in positions],
+                                                         channel_ids=channel_ids_recording)
+
+    def get_channel_properties(self, property_name, channel_ids=None):
+        if channel_ids is None:
+            channel_ids = self.get_channel_ids()
+        values = [None] * len(channel_ids)
+        for r_i, (channel_ids_recording, positions) in self._group_by_recording(channel_ids).items():
+            values_recording = self._recordings[r_i].get_channel_properties(property_name,
+                                                                            channel_ids=channel_ids_recording)
+            for i, value in zip(positions, values_recording):
+                values[i] = value
+        return _stack_values(values)
+
+    def get_shared_channel_property_names(self, channel_ids=None):
+        if channel_ids is None:
+            channel_ids = self.get_channel_ids()
+        property_names = None
+        for r_i, (channel_ids_recording, _) in self._group_by_recording(channel_ids).items():
+            names = self._recordings[r_i].get_shared_channel_property_names(channel_ids=channel_ids_recording)
+            property_names = set(names) if property_names is None else property_names & set(names)
+        return sorted(property_names) if property_names is not None else []
+
+    def clear_channel_property(self, channel_id, property_name):
+        recording = self._recordings[self._channel_map[channel_id]['recording']]
+        channel_id_recording = self._channel_map[channel_id]['channel_id']
+        recording.clear_channel_property(channel_id_recording, property_name)
+
+    def _group_by_recording(self, channel_ids):
+        # maps each recording to its channel ids and to their positions in channel_ids
+        groups = {}
+        for i, channel_id in enumerate(channel_ids):
+            if channel_id not in self._channel_map:
+                raise ValueError(str(channel_id) + " is not a valid channel_id")
+            channel_info = self._channel_map[channel_id]
+            channel_ids_recording, positions = groups.setdefault(channel_info['recording'], ([], []))
+            channel_ids_recording.append(channel_info['channel_id'])
+            positions.append(i)
+        return groups
+
+
+def concatenate_recordings_by_channel(recordings, groups=None, n_jobs=1):
     '''
     Concatenates recordings together by channel. The order of the recordings
     determines the order of the channels in the concatenated recording.
@@ -97,6 +185,9 @@ def concatenate_recordings_by_channel(recordings, groups=None):
     groups: list
         A list of ints corresponding to the group identity of each recording's
         channel ids.
+    n_jobs: int
+        Number of threads used to read the traces of the recordings (default 1). If -1, all the
+        available cores are used.
     Returns
     -------
     recording: MultiRecordingChannelExtractor
@@ -106,4 +197,5 @@ def concatenate_recordings_by_channel(recordings, groups=None):
     return MultiRecordingChannelExtractor(
         recordings=recordings,
         groups=groups,
+        n_jobs=n_jobs,
     )
@@ -1,4 +1,5 @@
-from .recordingextractor import RecordingExtractor
+from .recordingextractor import RecordingExtractor, _get_snippet_len
+from .extraction_tools import _get_recording_traces
 import numpy as np
 
 # Concatenates the given recordings by time
@@ -34,34 +35,41 @@ class MultiRecordingTimeExtractor(RecordingExtractor):
             if (self._sampling_frequency != sampling_frequency):
                 raise ValueError("Inconsistent sampling frequency between extractor 0 and extractor " + str(i + 1))
 
-        self._start_frames = []
-        self._start_times = []
-        ff = 0
+        start_frames = [0]
+        start_times = []
         tt = 0
         for recording in self._recordings:
-            self._start_frames.append(ff)
-            ff = ff + recording.get_num_frames()
+            start_frames.append(start_frames[-1] + recording.get_num_frames())
             tt = tt + recording.frame_to_time(0)
-            self._start_times.append(tt)
+            start_times.append(tt)
             tt = tt + recording.frame_to_time(recording.get_num_frames()) - recording.frame_to_time(0)
-        self._start_frames.append(ff)
-        self._start_times.append(tt)
-        self._num_frames = ff
+        start_times.append(tt)
+        # cumulative frames and times of the sections (len(recordings) + 1 values)
+        self._start_frames = np.array(start_frames, dtype='int64')
+        self._start_times = np.array(start_times, dtype='float64')
+        self._num_frames = int(self._start_frames[-1])
 
         # Set the channel properties based on the first recording extractor
         self.copy_channel_properties(self._first_recording)
 
     def _find_section_for_frame(self, frame):
-        inds = np.where(np.array(self._start_frames[:-1]) <= frame)[0]
-        ind = inds[-1]
+        ind = int(self._find_sections(self._start_frames, frame))
         return self._recordings[ind], ind, frame - self._start_frames[ind]
 
     def _find_section_for_time(self, time):
-        inds = np.where(np.array(self._start_times[:-1]) <= time)[0]
-        ind = inds[-1]
+        ind = int(self._find_sections(self._start_times, time))
         return self._recordings[ind], ind, time - self._start_times[ind]
 
-    def get_traces(self, channel_ids=None, start_frame=None, end_frame=None):
+    def _find_sections(self, starts, values):
+        # the section of each value (the last section starting at or before it)
+        inds = np.searchsorted(starts[:-1], values, side='right') - 1
+        return np.clip(inds, 0, len(self._recordings) - 1)
+
+    @property
+    def _default_return_scaled(self):
+        return self._first_recording._default_return_scaled
+
+    def get_traces(self, channel_ids=None, start_frame=None, end_frame=None, return_scaled=None):
         if start_frame is None:
             start_frame = 0
         if end_frame is None:
@@ -69,20 +77,60 @@ class MultiRecordingTimeExtractor(RecordingExtractor):
         recording1, i_sec1, i_start_frame = self._find_section_for_frame(start_frame)
         _, i_sec2, i_end_frame = self._find_section_for_frame(end_frame)
         if i_sec1 == i_sec2:
-            return recording1.get_traces(channel_ids=channel_ids, start_frame=i_start_frame, end_frame=i_end_frame)
-        traces = []
-        traces.append(
-            self._recordings[i_sec1].get_traces(channel_ids=channel_ids, start_frame=i_start_frame,
-                                         end_frame=self._recordings[i_sec1].get_num_frames())
-        )
-        for i_sec in range(i_sec1 + 1, i_sec2):
-            traces.append(
-                self._recordings[i_sec].get_traces(channel_ids=channel_ids)
-            )
-        traces.append(
-            self._recordings[i_sec2].get_traces(channel_ids=channel_ids, start_frame=0, end_frame=i_end_frame)
-        )
-        return np.concatenate(traces, axis=1)
+            return _get_recording_traces(recording1, return_scaled, channel_ids=channel_ids, start_frame=i_start_frame,
+                                         end_frame=i_end_frame)
+        # the traces of each section are written in place in the output
+        traces = None
+        for i_sec in range(i_sec1, i_sec2 + 1):
+            sf = i_start_frame if i_sec == i_sec1 else 0
+            ef = i_end_frame if i_sec == i_sec2 else self._recordings[i_sec].get_num_frames()
+            traces_section = _get_recording_traces(self._recordings[i_sec], return_scaled, channel_ids=channel_ids,
+                                                   start_frame=sf, end_frame=ef)
+            if traces is None:
+                traces = np.empty((traces_section.shape[0], end_frame - start_frame), dtype=traces_section.dtype)
+            elif not np.can_cast(traces_section.dtype, traces.dtype):
+                traces = traces.astype(np.result_type(traces.dtype, traces_section.dtype))
+            offset = self._start_frames[i_sec] + sf - start_frame
+            traces[:, offset:offset + traces_section.shape[1]] = traces_section
+        return traces
+
+    def get_traces_raw(self, channel_ids=None, start_frame=None, end_frame=None):
+        return self.get_traces(channel_ids=channel_ids, start_frame=start_frame, end_frame=end_frame,
+                               return_scaled=False)
+
+    def get_channel_scaling(self, channel_ids=None):
+        # the raw traces of the sections are concatenated, so they must share the same scaling
+        gains, offsets = self._first_recording.get_channel_scaling(channel_ids=channel_ids)
+        for i, recording in enumerate(self._recordings[1:]):
+            gains_recording, offsets_recording = recording.get_channel_scaling(channel_ids=channel_ids)
+            if not (np.array_equal(gains, gains_recording) and np.array_equal(offsets, offsets_recording)):
+                raise ValueError("Inconsistent channel scaling between extractor 0 and extractor " + str(i + 1))
+        return gains, offsets
+
+    def get_snippets(self, *, reference_frames, snippet_len, channel_ids=None, chunk_size=30000):
+        snippet_len_before, snippet_len_after = _get_snippet_len(snippet_len)
+        reference_frames = np.asarray(reference_frames)
+        inds = self._find_sections(self._start_frames, reference_frames)
+        # the snippets within a section (or crossing the edges of the whole recording) are extracted by the section
+        first_section = inds == 0
+        last_section = inds == len(self._recordings) - 1
+        in_section = ((reference_frames - snippet_len_before >= self._start_frames[inds]) | first_section) & \
+                     ((reference_frames + snippet_len_after <= self._start_frames[inds + 1]) | last_section)
+        in_recording = (0 <= reference_frames) & (reference_frames < self._num_frames)
+        crossing = np.where(in_recording & ~in_section)[0]
+        snippets = RecordingExtractor.get_snippets(self, reference_frames=reference_frames[crossing],
+                                                   snippet_len=(snippet_len_before, snippet_len_after),
+                                                   channel_ids=channel_ids, chunk_size=chunk_size)
+        if len(crossing) == len(reference_frames):
+            return snippets
+        all_snippets = np.zeros((len(reference_frames),) + snippets.shape[1:], dtype=snippets.dtype)
+        all_snippets[crossing] = snippets
+        for ind in np.unique(inds[in_recording & in_section]).tolist():
+            idxs = np.where(in_recording & in_section & (inds == ind))[0]
+            all_snippets[idxs] = self._recordings[ind].get_snippets(
+                reference_frames=reference_frames[idxs] - self._start_frames[ind],
+                snippet_len=(snippet_len_before, snippet_len_after), channel_ids=channel_ids, chunk_size=chunk_size)
+        return all_snippets
 
     def get_channel_ids(self):
         return self._channel_ids
@@ -94,12 +142,31 @@ class MultiRecordingTimeExtractor(RecordingExtractor):
         return self._sampling_frequency
 
     def frame_to_time(self, frame):
-        recording, i_epoch, rel_frame = self._find_section_for_frame(frame)
-        return recording.frame_to_time(rel_frame) + self._start_times[i_epoch]
+        if np.isscalar(frame):
+            recording, i_epoch, rel_frame = self._find_section_for_frame(frame)
+            return recording.frame_to_time(rel_frame) + self._start_times[i_epoch]
+        frames = np.asarray(frame)
+        inds = self._find_sections(self._start_frames, frames)
+        times = np.empty(frames.shape, dtype='float64')
+        for ind in np.unique(inds).tolist():
+            mask = inds == ind
+            times[mask] = self._recordings[ind].frame_to_time(frames[mask] - self._start_frames[ind]) + \
+                self._start_times[ind]
+        return times
 
     def time_to_frame(self, time):
-        recording, i_epoch, rel_time = self._find_section_for_time(time)
-        return recording.time_to_frame(rel_time) + self._start_frames[i_epoch]
+        if np.isscalar(time):
+            recording, i_epoch, rel_time = self._find_section_for_time(time)
+            return recording.time_to_frame(rel_time) + self._start_frames[i_epoch]
+        times = np.asarray(time)
+        inds = self._find_sections(self._start_times, times)
+        frames = np.empty(times.shape, dtype='float64')
+        for ind in np.unique(inds).tolist():
+            mask = inds == ind
+            frames[mask] = self._recordings[ind].time_to_frame(times[mask] - self._start_times[ind]) + \
+                self._start_frames[ind]
+        return frames
+
 
 def concatenate_recordings_by_time(recordings, epoch_names=None):
     '''
@@ -1,5 +1,7 @@
 from .sortingextractor import SortingExtractor
 from .recordingextractor import RecordingExtractor
+from .spikevector import merge_spike_streams
+from .extraction_tools import _map_in_threads
 import numpy as np
 
 
@@ -9,31 +11,105 @@ class MultiSortingExtractor(SortingExtractor):
     def __init__(self, sortings):
         SortingExtractor.__init__(self)
         self._sortings = sortings
-        self._all_unit_ids = []
-        self._unit_map = {}
-
-        u_id  = 0
+        # the unit ids are 0, ..., num_units - 1, so that unit u is stored by sorting _sorting_ids[u]
+        # with id _sorting_unit_ids[u]
+        sorting_ids = []
+        self._sorting_unit_ids = []
         for s_i, sorting in enumerate(self._sortings):
             unit_ids = sorting.get_unit_ids()
-            for unit_id in unit_ids:
-                self._all_unit_ids.append(u_id)
-                self._unit_map[u_id] = {'sorting_id': s_i, 'unit_id': unit_id}
-                u_id += 1
+            sorting_ids.extend([s_i] * len(unit_ids))
+            self._sorting_unit_ids.extend(unit_ids)
+        self._sorting_ids = np.array(sorting_ids, dtype='int64')
+        self._all_unit_ids = list(range(len(self._sorting_unit_ids)))
 
     def get_unit_ids(self):
         return list(self._all_unit_ids)
 
     def get_unit_spike_train(self, unit_id, start_frame=None, end_frame=None):
-        if start_frame is None:
-            start_frame = 0
-        if end_frame is None:
-            end_frame = np.Inf
-        if unit_id not in self.get_unit_ids():
-            raise ValueError("Non-valid unit_id")
+        sorting, unit_id_sorting = self._get_sorting_unit(unit_id)
+        return sorting.get_unit_spike_train(unit_id_sorting, start_frame=start_frame, end_frame=end_frame)
+
+    def get_spike_trains(self, unit_ids=None, start_frame=None, end_frame=None, n_jobs=1):
+        '''This function returns the spike trains of a list of units (by default all units) within
+        [start_frame, end_frame). The spike trains are fetched from each sorting with a single call, and
+        from several sortings at the same time if n_jobs > 1.
+
+        Parameters
+        ----------
+        unit_ids: array_like
+            The unit ids for which the spike trains will be returned.
+            If None (default), the spike trains of all units are returned.
+        start_frame: int
+            The frame above which a spike frame is returned  (inclusive).
+        end_frame: int
+            The frame below which a spike frame is returned  (exclusive).
+        n_jobs: int
+            Number of threads used to fetch the spike trains of the sortings (default 1).
+            If -1, all the available cores are used.
+        Returns
+        ----------
+        spike_trains: list
+            The list of spike trains (numpy.ndarray) of the units.
+        '''
+        if unit_ids is None:
+            unit_ids = self.get_unit_ids()
+        groups = self._group_by_sorting(unit_ids)
+
+        def get_sorting_spike_trains(sorting_id):
+            return self._sortings[sorting_id].get_spike_trains(unit_ids=groups[sorting_id][0],
+                                                               start_frame=start_frame, end_frame=end_frame)
+
+        spike_trains = [None] * len(unit_ids)
+        spike_trains_sortings = _map_in_threads(get_sorting_spike_trains, groups.keys(), n_jobs)
+        for sorting_id, spike_trains_sorting in zip(groups.keys(), spike_trains_sortings):
+            for i, spike_train in zip(groups[sorting_id][1], spike_trains_sorting):
+                spike_trains[i] = spike_train
+        return spike_trains
+
+    def get_all_spikes(self, unit_ids=None, start_frame=None, end_frame=None, n_jobs=1):
+        '''This function returns the spike frames and the unit ids of all the spikes of a list of units (by
+        default all units) within [start_frame, end_frame), sorted in time. The spikes are fetched from each
+        sorting with a single call, and from several sortings at the same time if n_jobs > 1.
+
+        Parameters
+        ----------
+        unit_ids: array_like
+            The unit ids for which the spikes will be returned.
+            If None (default), the spikes of all units are returned.
+        start_frame: int
+            The frame above which a spike frame is returned  (inclusive).
+        end_frame: int
+            The frame below which a spike frame is returned  (exclusive).
+        n_jobs: int
+            Number of threads used to fetch the spikes of the sortings (default 1).
+            If -1, all the available cores are used.
+        Returns
+        ----------
+        times: numpy.ndarray
+            The spike frames of all the spikes, sorted in time.
+        labels: numpy.ndarray
+            The unit id of each spike.
+        '''
+        if unit_ids is None:
+            unit_ids = self.get_unit_ids()
+        groups = self._group_by_sorting(unit_ids)
+        if len(groups) == 0:
+            return np.array([], dtype='int64'), np.array([], dtype='int64')
 
-        sorting_id = self._unit_map[unit_id]['sorting_id']
-        unit_id_sorting = self._unit_map[unit_id]['unit_id']
-        return self._sortings[sorting_id].get_unit_spike_train(unit_id_sorting)
+        def get_sorting_spikes(sorting_id):
+            unit_ids_sorting, positions = groups[sorting_id]
+            times, labels = self._sortings[sorting_id].get_all_spikes(unit_ids=unit_ids_sorting,
+                                                                      start_frame=start_frame, end_frame=end_frame)
+            return np.asarray(times).ravel(), _map_labels(labels, unit_ids_sorting, [unit_ids[i] for i in positions])
+
+        spikes = _map_in_threads(get_sorting_spikes, groups.keys(), n_jobs)
+        times = np.concatenate([times for times, _ in spikes])
+        labels = np.concatenate([labels for _, labels in spikes])
+        if len(spikes) > 1:
+            order = np.argsort(times, kind='stable')
+            times = times[order]
+            labels = labels[order]
+        return times, labels
 
     def set_sampling_frequency(self, sampling_frequency):
         for sorting in self._sortings:
@@ -43,66 +119,148 @@ class MultiSortingExtractor(SortingExtractor):
         return self._sortings[0].get_sampling_frequency()
 
     def set_unit_property(self, unit_id, property_name, value):
-        if unit_id not in self._unit_map.keys():
-            raise ValueError("Non-valid unit_id")
-        sorting_id = self._unit_map[unit_id]['sorting_id']
-        unit_id_sorting = self._unit_map[unit_id]['unit_id']
-        self._sortings[sorting_id].set_unit_property(unit_id_sorting, property_name, value)
+        sorting, unit_id_sorting = self._get_sorting_unit(unit_id)
+        sorting.set_unit_property(unit_id_sorting, property_name, value)
 
     def get_unit_property(self, unit_id, property_name):
-        if unit_id not in self._unit_map.keys():
-            raise ValueError("Non-valid unit_id")
-        sorting_id = self._unit_map[unit_id]['sorting_id']
-        unit_id_sorting = self._unit_map[unit_id]['unit_id']
-        return self._sortings[sorting_id].get_unit_property(unit_id_sorting, property_name)
+        sorting, unit_id_sorting = self._get_sorting_unit(unit_id)
+        return sorting.get_unit_property(unit_id_sorting, property_name)
 
     def get_unit_property_names(self, unit_id):
-        sorting_id = self._unit_map[unit_id]['sorting_id']
-        unit_id_sorting = self._unit_map[unit_id]['unit_id']
-        property_names = self._sortings[sorting_id].get_unit_property_names(unit_id_sorting)
-        return property_names
+        sorting, unit_id_sorting = self._get_sorting_unit(unit_id)
+        return sorting.get_unit_property_names(unit_id_sorting)
 
     def clear_unit_property(self, unit_id, property_name):
-        if unit_id not in self._unit_map.keys():
-            raise ValueError("Non-valid unit_id")
-        sorting_id = self._unit_map[unit_id]['sorting_id']
-        unit_id_sorting = self._unit_map[unit_id]['unit_id']
-        self._sortings[sorting_id].clear_unit_property(unit_id_sorting, property_name)
+        sorting, unit_id_sorting = self._get_sorting_unit(unit_id)
+        sorting.clear_unit_property(unit_id_sorting, property_name)
 
     def get_unit_spike_features(self, unit_id, feature_name, start_frame=None, end_frame=None):
-        if unit_id not in self._unit_map.keys():
-            raise ValueError("Non-valid unit_id")
-        sorting_id = self._unit_map[unit_id]['sorting_id']
-        unit_id_sorting = self._unit_map[unit_id]['unit_id']
-        return self._sortings[sorting_id].get_unit_spike_features(unit_id_sorting, feature_name, start_frame=start_frame, end_frame=end_frame)
+        sorting, unit_id_sorting = self._get_sorting_unit(unit_id)
+        return sorting.get_unit_spike_features(unit_id_sorting, feature_name, start_frame=start_frame,
+                                               end_frame=end_frame)
 
     def get_unit_spike_feature_names(self, unit_id):
-        if isinstance(unit_id, (int, np.integer)):
-            if unit_id in self.get_unit_ids():
-                if unit_id not in self._unit_map.keys():
-                    raise ValueError("Non-valid unit_id")
-                sorting_id = self._unit_map[unit_id]['sorting_id']
-                unit_id_sorting = self._unit_map[unit_id]['unit_id']
-                feature_names = sorted(self._sortings[sorting_id].get_unit_spike_feature_names(unit_id_sorting))
-                return feature_names
-            else:
-                raise ValueError("Non-valid unit_id")
-        else:
+        if not isinstance(unit_id, (int, np.integer)):
             raise ValueError("unit_id must be an int")
+        sorting, unit_id_sorting = self._get_sorting_unit(unit_id)
+        return sorted(sorting.get_unit_spike_feature_names(unit_id_sorting))
 
     def set_unit_spike_features(self, unit_id, feature_name, value):
-        if unit_id not in self._unit_map.keys():
-            raise ValueError("Non-valid unit_id")
-        sorting_id = self._unit_map[unit_id]['sorting_id']
-        unit_id_sorting = self._unit_map[unit_id]['unit_id']
-        self._sortings[sorting_id].set_unit_spike_features(unit_id_sorting, feature_name, value)
-        
+        sorting, unit_id_sorting = self._get_sorting_unit(unit_id)
+        sorting.set_unit_spike_features(unit_id_sorting, feature_name, value)
+
     def clear_unit_spike_features(self, unit_id, feature_name):
-        if unit_id not in self._unit_map.keys():
+        sorting, unit_id_sorting = self._get_sorting_unit(unit_id)
+        sorting.clear_unit_spike_features(unit_id_sorting, feature_name)
+
+    def set_units_property(self, *, unit_ids=None, property_name, values):
+        if unit_ids is None:
+            unit_ids = self.get_unit_ids()
+        if len(values) < len(unit_ids):
+            raise ValueError("unit_ids and values must have same length")
+        for sorting_id, (unit_ids_sorting, positions) in self._group_by_sorting(unit_ids).items():
+            self._sortings[sorting_id].set_units_property(unit_ids=unit_ids_sorting, property_name=property_name,
+                                                          values=[values[i] for i in positions])
+
+    def get_units_property(self, *, unit_ids=None, property_name):
+        if unit_ids is None:
+            unit_ids = self.get_unit_ids()
+        values = [None] * len(unit_ids)
+        for sorting_id, (unit_ids_sorting, positions) in self._group_by_sorting(unit_ids).items():
+            values_sorting = self._sortings[sorting_id].get_units_property(unit_ids=unit_ids_sorting,
+                                                                           property_name=property_name)
+            for i, value in zip(positions, values_sorting):
+                values[i] = value
+        return values
+
+    def get_shared_unit_property_names(self, unit_ids=None):
+        if unit_ids is None:
+            unit_ids = self.get_unit_ids()
+        property_names = None
+        for sorting_id, (unit_ids_sorting, _) in self._group_by_sorting(unit_ids).items():
+            names = self._sortings[sorting_id].get_shared_unit_property_names(unit_ids=unit_ids_sorting)
+            property_names = set(names) if property_names is None else property_names & set(names)
+        return sorted(property_names) if property_names is not None else []
+
+    def set_units_spike_features(self, *, unit_ids=None, feature_name, values):
+        if unit_ids is None:
+            unit_ids = self.get_unit_ids()
+        if isinstance(values, np.ndarray) and values.dtype != object:
+            # split the concatenated features by unit
+            num_spikes = [len(spike_train) for spike_train in self.get_spike_trains(unit_ids=unit_ids)]
+            if len(values) != np.sum(num_spikes, dtype='int64'):
+                raise ValueError("feature values should have the same length as the spike trains")
+            values = np.split(values, np.cumsum(num_spikes)[:-1])
+        if len(values) != len(unit_ids):
+            raise ValueError("unit_ids and values must have same length")
+        for sorting_id, (unit_ids_sorting, positions) in self._group_by_sorting(unit_ids).items():
+            self._sortings[sorting_id].set_units_spike_features(unit_ids=unit_ids_sorting, feature_name=feature_name,
+                                                                values=[values[i] for i in positions])
+
+    def get_units_spike_features(self, *, unit_ids=None, feature_name, concatenate=False):
+        if unit_ids is None:
+            unit_ids = self.get_unit_ids()
+        values = [None] * len(unit_ids)
+        for sorting_id, (unit_ids_sorting, positions) in self._group_by_sorting(unit_ids).items():
+            values_sorting = self._sortings[sorting_id].get_units_spike_features(unit_ids=unit_ids_sorting,
+                                                                                 feature_name=feature_name)
+            for i, value in zip(positions, values_sorting):
+                values[i] = value
+        if concatenate:
+            return np.concatenate(values) if len(values) > 0 else np.array([])
+        return values
+
+    def get_shared_unit_spike_feature_names(self, unit_ids=None):
+        if unit_ids is None:
+            unit_ids = self.get_unit_ids()
+        feature_names = None
+        for sorting_id, (unit_ids_sorting, _) in self._group_by_sorting(unit_ids).items():
+            names = self._sortings[sorting_id].get_shared_unit_spike_feature_names(unit_ids=unit_ids_sorting)
+            feature_names = set(names) if feature_names is None else feature_names & set(names)
+        return sorted(feature_names) if feature_names is not None else []
+
+    def iter_spikes(self, unit_ids=None, start_frame=None, end_frame=None, batch_size=10000):
+        if unit_ids is None:
+            unit_ids = self.get_unit_ids()
+        # the spikes of each sorting are merged by the sorting, and the sortings are merged here
+        streams = []
+        for sorting_id, (unit_ids_sorting, positions) in self._group_by_sorting(unit_ids).items():
+            stream = self._sortings[sorting_id].iter_spikes(unit_ids=unit_ids_sorting, start_frame=start_frame,
+                                                            end_frame=end_frame, batch_size=batch_size)
+            streams.append(_map_spike_labels(stream, unit_ids_sorting, [unit_ids[i] for i in positions]))
+        return merge_spike_streams(streams)
+
+    def _get_sorting_unit(self, unit_id):
+        # the sorting and the unit id in the sorting of a unit
+        if not isinstance(unit_id, (int, np.integer)) or not 0 <= unit_id < len(self._sorting_unit_ids):
             raise ValueError("Non-valid unit_id")
-        sorting_id = self._unit_map[unit_id]['sorting_id']
-        unit_id_sorting = self._unit_map[unit_id]['unit_id']
-        self._sortings[sorting_id].clear_unit_spike_features(unit_id_sorting, feature_name)        
+        return self._sortings[self._sorting_ids[unit_id]], self._sorting_unit_ids[unit_id]
+
+    def _group_by_sorting(self, unit_ids):
+        # maps each sorting to its unit ids and to their positions in unit_ids
+        for unit_id in unit_ids:
+            if not isinstance(unit_id, (int, np.integer)) or not 0 <= unit_id < len(self._sorting_unit_ids):
+                raise ValueError("Non-valid unit_id")
+        unit_ids = np.asarray(unit_ids, dtype='int64')
+        sorting_ids = self._sorting_ids[unit_ids]
+        groups = {}
+        for sorting_id in np.unique(sorting_ids).tolist():
+            positions = np.where(sorting_ids == sorting_id)[0]
+            groups[sorting_id] = ([self._sorting_unit_ids[u] for u in unit_ids[positions].tolist()],
+                                  positions.tolist())
+        return groups
+
+def _map_labels(labels, unit_ids_sorting, unit_ids):
+    # maps the unit ids of a sorting to the ones of the MultiSortingExtractor
+    unit_ids_sorting = np.array(unit_ids_sorting)
+    sorter = np.argsort(unit_ids_sorting, kind='stable')
+    return np.array(unit_ids, dtype='int64')[sorter[np.searchsorted(unit_ids_sorting, labels, sorter=sorter)]]
+
+
+def _map_spike_labels(stream, unit_ids_sorting, unit_ids):
+    for times, labels in stream:
+        yield times, _map_labels(labels, unit_ids_sorting, unit_ids)
+
 
 def concatenate_sortings(sortings):
     '''
@@ -0,0 +1,312 @@
+import numpy as np
+import warnings
+
+
+# Columnar storage of the properties and spike features of channels/units
+
+class IdTable:
+    '''Maps a set of ids (channels or units) to consecutive rows. Subclasses store their data in arrays
+    indexed by row, which are grown (by doubling their capacity) when new ids are added. The ids accepted by
+    the table are the ids of the extractor at the last sync_ids: the rows of the ids that are removed are
+    kept, but these ids are not accepted until they are added again.
+    '''
+    def __init__(self):
+        self._index = {}
+        self._ids = []
+        self._capacity = 0
+        self._valid = {}
+
+    def __len__(self):
+        return len(self._ids)
+
+    def __contains__(self, id):
+        return id in self._valid
+
+    def sync_ids(self, ids):
+        '''Sets the ids accepted by the table to the given (current) ids, adding the new ones.'''
+        ids = list(ids)
+        self.add_ids(ids)
+        self._valid = {id: self._index[id] for id in ids}
+
+    def add_ids(self, ids):
+        '''Adds rows for the ids that are not already in the table.'''
+        for id in ids:
+            if id not in self._index:
+                self._index[id] = len(self._ids)
+                self._ids.append(id)
+        if len(self._ids) > self._capacity:
+            capacity = max(len(self._ids), 2 * self._capacity)
+            self._grow(capacity)
+            self._capacity = capacity
+
+    def _grow(self, capacity):
+        pass
+
+    def row(self, id):
+        return self._valid[id]
+
+    def rows(self, ids):
+        valid = self._valid
+        return np.array([valid[id] for id in ids], dtype='int64')
+
+    def get_ids(self, rows=None):
+        if rows is None:
+            return list(self._ids)
+        return [self._ids[r] for r in rows]
+
+
+class PropertyTable(IdTable):
+    '''Stores properties of a set of ids (channels or units) in columns, with one numpy array per
+    property and a dict from id to row. Values are stored as given, so that they are returned
+    unchanged by get_value, while get_values returns them stacked in a (typed, if possible) numpy array.
+    '''
+    def __init__(self):
+        IdTable.__init__(self)
+        self._columns = {}
+        self._is_set = {}
+        self._arrays = {}
+
+    def _grow(self, capacity):
+        for name in self._columns.keys():
+            column = np.empty(capacity, dtype=object)
+            column[:self._capacity] = self._columns[name]
+            is_set = np.zeros(capacity, dtype=bool)
+            is_set[:self._capacity] = self._is_set[name]
+            self._columns[name] = column
+            self._is_set[name] = is_set
+            self._arrays.pop(name, None)
+
+    def get_names(self, row=None):
+        '''Returns the sorted names of the properties set for the given row (or for any row if None).'''
+        if row is None:
+            return sorted(name for name in self._columns.keys() if np.any(self._is_set[name][:len(self)]))
+        return sorted(name for name in self._columns.keys() if self._is_set[name][row])
+
+    def get_shared_names(self, rows):
+        '''Returns the sorted names of the properties set for all the given rows.'''
+        return sorted(name for name in self._columns.keys() if np.all(self._is_set[name][rows]))
+
+    def has_value(self, name, row):
+        return name in self._columns and self._is_set[name][row]
+
+    def is_set(self, name, rows):
+        if name not in self._columns:
+            return np.zeros(len(rows), dtype=bool)
+        return self._is_set[name][rows]
+
+    def set_value(self, name, row, value):
+        self._ensure_column(name)
+        self._columns[name][row] = value
+        self._is_set[name][row] = True
+        self._arrays.pop(name, None)
+
+    def set_values(self, name, rows, values):
+        self._ensure_column(name)
+        column = self._columns[name]
+        for row, value in zip(rows, values):
+            column[row] = value
+        self._is_set[name][rows] = True
+        self._arrays.pop(name, None)
+
+    def get_value(self, name, row):
+        return self._columns[name][row]
+
+    def get_values(self, name, rows):
+        '''Returns the values of the given rows stacked in a numpy array. All the rows must be set.'''
+        if name in self._arrays:
+            return self._arrays[name][rows]
+        num_rows = len(self)
+        if np.all(self._is_set[name][:num_rows]):
+            self._arrays[name] = _stack_values(self._columns[name][:num_rows])
+            return self._arrays[name][rows]
+        return _stack_values(self._columns[name][rows])
+
+    def clear_value(self, name, row):
+        if name in self._columns:
+            self._is_set[name][row] = False
+            self._columns[name][row] = None
+            self._arrays.pop(name, None)
+
+    def _ensure_column(self, name):
+        if name not in self._columns:
+            self._columns[name] = np.empty(self._capacity, dtype=object)
+            self._is_set[name] = np.zeros(self._capacity, dtype=bool)
+
+
+class SpikeFeatureTable(IdTable):
+    '''Stores the spike features of a set of units. Each feature is kept as one array with the features of
+    all the stored spikes concatenated along the first axis, and the features of a unit are the slice
+    [starts[row], starts[row] + counts[row]) of that array.
+    '''
+    def __init__(self):
+        IdTable.__init__(self)
+        self._features = {}
+
+    def _grow(self, capacity):
+        for feature in self._features.values():
+            feature.grow(capacity)
+
+    def get_names(self, row):
+        '''Returns the sorted names of the features set for the given row.'''
+        return sorted(name for name, feature in self._features.items() if feature.counts[row] >= 0)
+
+    def get_shared_names(self, rows):
+        '''Returns the sorted names of the features set for all the given rows.'''
+        return sorted(name for name, feature in self._features.items() if np.all(feature.counts[rows] >= 0))
+
+    def has_value(self, name, row):
+        return name in self._features and self._features[name].counts[row] >= 0
+
+    def is_set(self, name, rows):
+        if name not in self._features:
+            return np.zeros(len(rows), dtype=bool)
+        return self._features[name].counts[rows] >= 0
+
+    def set_value(self, name, row, value):
+        value = np.asarray(value)
+        self.set_concatenated_values(name, [row], value, [len(value)])
+
+    def set_values(self, name, rows, values):
+        '''Sets the features of several rows from a list with one array per row.'''
+        values = [np.asarray(value) for value in values]
+        non_empty = [value for value in values if len(value) > 0]
+        if len(non_empty) > 0 and all(value.dtype == non_empty[0].dtype and value.shape[1:] == non_empty[0].shape[1:]
+                                      for value in non_empty[1:]):
+            self.set_concatenated_values(name, rows, np.concatenate(non_empty),
+                                         [len(value) for value in values])
+        else:
+            for row, value in zip(rows, values):
+                self.set_concatenated_values(name, [row], value, [len(value)])
+
+    def set_concatenated_values(self, name, rows, data, counts):
+        '''Sets the features of several rows from one array with the features of the rows concatenated
+        (in the order of rows) along the first axis. counts are the number of spikes of each row.'''
+        rows = np.asarray(rows, dtype='int64')
+        counts = np.asarray(counts, dtype='int64')
+        if name not in self._features:
+            self._features[name] = _SpikeFeature(self._capacity)
+        self._features[name].set(rows, np.asarray(data), counts)
+
+    def get_value(self, name, row):
+        return self._features[name].get(row)
+
+    def get_values(self, name, rows):
+        '''Returns a list with the features of each of the given rows (all the rows must be set).'''
+        feature = self._features[name]
+        return [feature.get(row) for row in rows]
+
+    def get_concatenated_values(self, name, rows):
+        '''Returns the features of the given rows (all the rows must be set) concatenated along the first axis.'''
+        return self._features[name].get_concatenated(np.asarray(rows, dtype='int64'))
+
+    def clear_value(self, name, row):
+        if name in self._features:
+            self._features[name].clear(row)
+
+
+class _SpikeFeature:
+    # one feature of a SpikeFeatureTable
+    def __init__(self, capacity):
+        self.chunks = []  # concatenated into a single array on the first read
+        self.length = 0
+        self.empty = None
+        self.starts = np.zeros(capacity, dtype='int64')
+        self.counts = np.full(capacity, -1, dtype='int64')
+        self.values = None  # per-row arrays, used when the units have features of different dtypes/shapes
+
+    def grow(self, capacity):
+        starts = np.zeros(capacity, dtype='int64')
+        starts[:len(self.starts)] = self.starts
+        counts = np.full(capacity, -1, dtype='int64')
+        counts[:len(self.counts)] = self.counts
+        if self.values is not None:
+            values = np.empty(capacity, dtype=object)
+            values[:len(self.values)] = self.values
+            self.values = values
+        self.starts = starts
+        self.counts = counts
+
+    def data(self):
+        if len(self.chunks) > 1:
+            self.chunks = [np.concatenate(self.chunks)]
+        return self.chunks[0]
+
+    def set(self, rows, data, counts):
+        if self.values is None and len(data) > 0:
+            if self.empty is None:
+                self.empty = data[:0]
+            elif data.dtype != self.empty.dtype or data.shape[1:] != self.empty.shape[1:]:
+                self._split_values()
+        if self.values is not None:
+            offsets = np.concatenate(([0], np.cumsum(counts)))
+            for i, row in enumerate(rows):
+                self.values[row] = data[offsets[i]:offsets[i + 1]]
+            self.counts[rows] = counts
+            return
+        if self.empty is None:
+            # only empty features have been set so far
+            self.empty = data[:0]
+        self.starts[rows] = self.length + np.concatenate(([0], np.cumsum(counts)[:-1]))
+        self.counts[rows] = counts
+        if len(data) > 0:
+            self.chunks.append(data)
+            self.length += len(data)
+            # features that are set again leave unused spikes in the array
+            if self.length > 2 * np.sum(self.counts[self.counts > 0]):
+                self._compact()
+
+    def get(self, row):
+        if self.values is not None:
+            return self.values[row]
+        count = self.counts[row]
+        if count == 0:
+            return self.empty
+        start = self.starts[row]
+        return self.data()[start:start + count]
+
+    def get_concatenated(self, rows):
+        if self.values is not None or len(rows) == 0:
+            return np.concatenate([self.get(row) for row in rows]) if len(rows) > 0 else self.empty
+        starts = self.starts[rows]
+        counts = self.counts[rows]
+        if np.all(starts[1:] == starts[:-1] + counts[:-1]):
+            # the rows are stored one after the other
+            return self.data()[starts[0]:starts[-1] + counts[-1]]
+        return np.concatenate([self.get(row) for row in rows])
+
+    def clear(self, row):
+        self.counts[row] = -1
+        if self.values is not None:
+            self.values[row] = None
+
+    def _compact(self):
+        rows = np.where(self.counts > 0)[0]
+        rows = rows[np.argsort(self.starts[rows], kind='stable')]
+        data = np.concatenate([self.get(row) for row in rows]) if len(rows) > 0 else None
+        self.chunks = []
+        self.length = 0
+        if data is not None:
+            self.set(rows, data, self.counts[rows])
+
+    def _split_values(self):
+        values = np.empty(len(self.counts), dtype=object)
+        for row in np.where(self.counts >= 0)[0]:
+            values[row] = self.get(row)
+        self.values = values
+        self.chunks = []
+        self.length = 0
+
+
+def _stack_values(values):
+    if len(values) == 0:
+        return np.array([])
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        try:
+            array = np.array(list(values))
+        except ValueError:
+            array = None
+    if array is None or array.dtype == object or array.shape[0] != len(values):
+        array = np.empty(len(values), dtype=object)
+        array[:] = values
+    return array
@@ -2,7 +2,10 @@ from abc import ABC, abstractmethod
 import numpy as np
 import copy
 import random
-from .extraction_tools import load_probe_file, save_to_probe_file, write_to_binary_dat_format, get_sub_extractors_by_property
+from .propertytable import PropertyTable
+from .extraction_tools import load_probe_file, save_to_probe_file, write_to_binary_dat_format, \
+    get_sub_extractors_by_property, frames_to_times, times_to_frames, _get_recording_traces
+from pathlib import Path
 
 class RecordingExtractor(ABC):
     '''A class that contains functions for extracting important information
@@ -12,13 +15,21 @@ class RecordingExtractor(ABC):
 
  
     '''
+    # the time of each frame (see set_timestamps), None if the frames are uniformly sampled
+    _timestamps = None
+    # whether get_traces returns scaled traces by default (see the return_scaled argument of get_traces)
+    _default_return_scaled = True
+    # attributes that do not affect the traces, skipped by the fingerprint of the cache (subclasses list their
+    # own runtime state: open files, locks, caches)
+    _fingerprint_skipped_attributes = ['id', '_epochs', '_channel_properties']
+
     def __init__(self):
         self._epochs = {}
-        self._channel_properties = {}
+        self._channel_properties = PropertyTable()
         self.id = random.randint(a=0, b=9223372036854775807)
 
     @abstractmethod
-    def get_traces(self, channel_ids=None, start_frame=None, end_frame=None):
+    def get_traces(self, channel_ids=None, start_frame=None, end_frame=None, return_scaled=True):
         '''This function extracts and returns a trace from the recorded data from the
         given channels ids and the given start and end frame. It will return
         traces from within three ranges:
@@ -44,6 +55,12 @@ class RecordingExtractor(ABC):
         channel_ids: array_like
             A list or 1D array of channel ids (ints) from which each trace will be
             extracted.
+        return_scaled: bool
+            If True, the traces are returned in physical units. If False, the traces are returned unscaled, in
+            the native dtype of the recorded data (see get_traces_raw and get_channel_scaling). The default is
+            True, except for extractors that return their native data by default (e.g. SpikeGLX). Extractors
+            that wrap other recordings take None by default, which returns the default traces of the wrapped
+            recordings. Extractors that do not scale their data ignore it.
 
         Returns
         ----------
@@ -101,37 +118,82 @@ class RecordingExtractor(ABC):
 
     def frame_to_time(self, frame):
         '''This function converts a user-inputted frame index to a time with units of seconds.
+        If timestamps are set (see set_timestamps), the time of a frame is its timestamp (linearly
+        interpolated between frames and extrapolated outside of the recording).
 
         Parameters
         ----------
-        frame: float
-            The frame to be converted to a time.
+        frame: float or array_like
+            The frame (or frames) to be converted to a time.
 
         Returns
         -------
-        time: float
-            The corresponding time in seconds.
+        time: float or numpy.ndarray
+            The corresponding time (or times) in seconds.
         '''
         # Default implementation
+        if self._timestamps is not None:
+            return frames_to_times(frame, self._timestamps)
+        if not np.isscalar(frame):
+            frame = np.asarray(frame)
         return frame / self.get_sampling_frequency()
 
     def time_to_frame(self, time):
         '''This function converts a user-inputted time (in seconds) to a frame index.
+        If timestamps are set (see set_timestamps), the frame is found by binary search in the
+        timestamps (linearly interpolated between frames).
 
         Parameters
         -------
-        time: float
-            The time (in seconds) to be converted to frame index.
+        time: float or array_like
+            The time (or times) in seconds to be converted to frame index.
 
         Returns
         -------
-        frame: float
-            The corresponding frame index.
+        frame: float or numpy.ndarray
+            The corresponding frame index (or indices).
         '''
         # Default implementation
+        if self._timestamps is not None:
+            return times_to_frames(time, self._timestamps)
+        if not np.isscalar(time):
+            time = np.asarray(time)
         return time * self.get_sampling_frequency()
 
-    def get_snippets(self, *, reference_frames, snippet_len, channel_ids=None):
+    def set_timestamps(self, timestamps):
+        '''This function sets the time (in seconds) of each frame of the recording, which is then
+        used by frame_to_time and time_to_frame instead of the sampling frequency (e.g. for acquisition
+        systems with non-uniform sampling).
+
+        Parameters
+        ----------
+        timestamps: array_like or str or Path
+            The non-decreasing times of the frames (num_frames values), or the path to a .npy file
+            containing them, which is memory-mapped. If None, the timestamps are removed.
+        '''
+        if timestamps is None:
+            self._timestamps = None
+            return
+        if isinstance(timestamps, (str, Path)):
+            timestamps = np.load(str(timestamps), mmap_mode='r')
+        elif not isinstance(timestamps, np.memmap):
+            timestamps = np.asarray(timestamps, dtype='float64')
+        if timestamps.ndim != 1 or len(timestamps) != self.get_num_frames():
+            raise ValueError("timestamps must be a 1D array with one value per frame")
+        self._timestamps = timestamps
+
+    def get_timestamps(self):
+        '''This function returns the time (in seconds) of each frame of the recording if timestamps
+        were set, otherwise None.
+
+        Returns
+        -------
+        timestamps: numpy.ndarray
+            The timestamps of the frames (or None).
+        '''
+        return self._timestamps
+
+    def get_snippets(self, *, reference_frames, snippet_len, channel_ids=None, chunk_size=30000):
         '''This function returns data snippets from the given channels that
         are starting on the given frames and are the length of the given snippet
         lengths before and after.
@@ -149,6 +211,10 @@ class RecordingExtractor(ABC):
         channel_ids: array_like
             A list or array of channel ids (ints) from which each trace will be
             extracted.
+        chunk_size: int
+            Maximum number of frames read with a single get_traces call. Snippets
+            falling within the same window of chunk_size frames are extracted
+            from the same read (default 30000).
 
         Returns
         ----------
@@ -159,47 +225,137 @@ class RecordingExtractor(ABC):
             Out-of-bounds cases should be handled by filling in zeros in the snippet.
         '''
         # Default implementation
-        if isinstance(snippet_len, (tuple, list, np.ndarray)):
-            snippet_len_before = snippet_len[0]
-            snippet_len_after = snippet_len[1]
-        else:
-            snippet_len_before = int((snippet_len + 1) / 2)
-            snippet_len_after = snippet_len - snippet_len_before
+        snippet_len_before, snippet_len_after = _get_snippet_len(snippet_len)
 
         if channel_ids is None:
             channel_ids = self.get_channel_ids()
 
+        reference_frames = np.asarray(reference_frames)
         num_snippets = len(reference_frames)
         num_channels = len(channel_ids)
         num_frames = self.get_num_frames()
         snippet_len_total = snippet_len_before + snippet_len_after
-        # snippets = []
         snippets = np.zeros((num_snippets, num_channels, snippet_len_total))
-        #TODO extract all waveforms in a chunk
-        pad_first = False
-        pad_last = False
-        pad_samples_first = 0
-        pad_samples_last = 0
-        snippet_idxs = np.array([], dtype=int)
-        for i in range(num_snippets):
-            snippet_chunk = np.zeros((num_channels, snippet_len_total))
-            if (0 <= reference_frames[i]) and (reference_frames[i] < num_frames):
-                snippet_range = np.array(
-                    [int(reference_frames[i]) - snippet_len_before, int(reference_frames[i]) + snippet_len_after])
-                snippet_buffer = np.array([0, snippet_len_total])
-                # The following handles the out-of-bounds cases
-                if snippet_range[0] < 0:
-                    snippet_buffer[0] -= snippet_range[0]
-                    snippet_range[0] -= snippet_range[0]
-                if snippet_range[1] >= num_frames:
-                    snippet_buffer[1] -= snippet_range[1] - num_frames
-                    snippet_range[1] -= snippet_range[1] - num_frames
-                snippet_chunk[:, snippet_buffer[0]:snippet_buffer[1]] = self.get_traces(channel_ids=channel_ids,
-                                                                                        start_frame=snippet_range[0],
-                                                                                        end_frame=snippet_range[1])
-            snippets[i] = snippet_chunk
+        if num_snippets == 0 or snippet_len_total <= 0:
+            return snippets
+
+        # snippets with a reference frame out of the recording are left to zeros
+        valid_idxs = np.where((0 <= reference_frames) & (reference_frames < num_frames))[0]
+        frames = reference_frames[valid_idxs].astype('int64')
+        order = np.argsort(frames, kind='stable')
+        valid_idxs = valid_idxs[order]
+        snippet_starts = frames[order] - snippet_len_before
+        snippet_ends = snippet_starts + snippet_len_total
+        window_len = max(int(chunk_size), snippet_len_total)
+        offsets = np.arange(snippet_len_total)
+
+        # group sorted snippets in windows of at most window_len frames and read each window once
+        first = 0
+        while first < len(valid_idxs):
+            window_start = max(snippet_starts[first], 0)
+            last = np.searchsorted(snippet_ends, window_start + window_len, side='right')
+            last = max(last, first + 1)
+            window_end = min(snippet_ends[last - 1], num_frames)
+            if window_end > window_start:
+                traces = self.get_traces(channel_ids=channel_ids, start_frame=int(window_start),
+                                         end_frame=int(window_end))
+                frame_idxs = (snippet_starts[first:last] - window_start)[:, np.newaxis] + offsets
+                # the following handles the out-of-bounds cases by zero-padding
+                in_bounds = (frame_idxs >= 0) & (frame_idxs < window_end - window_start)
+                frame_idxs = np.clip(frame_idxs, 0, window_end - window_start - 1)
+                chunk_snippets = np.transpose(traces[:, frame_idxs], (1, 0, 2))
+                snippets[valid_idxs[first:last]] = np.where(in_bounds[:, np.newaxis, :], chunk_snippets, 0)
+            first = last
         return snippets
 
+    def iter_chunks(self, chunk_size=None, chunk_duration=None, chunk_mb=None, margin=0, channel_ids=None,
+                    dtype=None, prefetch=False, return_scaled=None):
+        '''This function iterates over the traces of the recording in consecutive chunks
+        of frames. For each chunk, a tuple (chunk, start_frame, end_frame) is yielded,
+        where chunk contains the traces from start_frame - margin to end_frame + margin.
+        The margins falling outside of the recording are filled with zeros, so that
+        the chunk traces always are chunk[:, margin:margin + end_frame - start_frame].
+        If chunk_size, chunk_duration, and chunk_mb are all None, the whole recording
+        is returned in a single chunk.
+
+        Parameters
+        ----------
+        chunk_size: int
+            The number of frames of each chunk (without margins).
+        chunk_duration: float
+            The duration in seconds of each chunk (used if chunk_size is None).
+        chunk_mb: float
+            The maximum size in MB of each chunk (used if chunk_size and chunk_duration are None).
+        margin: int
+            The number of frames added before and after each chunk.
+        channel_ids: array_like
+            A list or 1D array of channel ids (ints) from which the traces will be extracted.
+        dtype: dtype
+            If not None, the chunks are cast to this dtype.
+        prefetch: bool
+            If True, the next chunk is read in a background thread while the current one
+            is processed.
+        return_scaled: bool or None
+            If True, the scaled traces are returned, if False the raw traces (see get_traces_raw).
+            If None (default), the traces returned by default by get_traces.
+
+        Returns
+        ----------
+        chunks: generator
+            A generator of (chunk, start_frame, end_frame) tuples.
+            Chunk dimensions are: (num_channels x (end_frame - start_frame + 2 * margin))
+        '''
+        if channel_ids is None:
+            channel_ids = self.get_channel_ids()
+        num_frames = self.get_num_frames()
+        margin = int(margin)
+        if chunk_size is None and chunk_duration is not None:
+            chunk_size = int(chunk_duration * self.get_sampling_frequency())
+        if chunk_size is None and chunk_mb is not None:
+            if dtype is not None:
+                itemsize = np.dtype(dtype).itemsize
+            else:
+                itemsize = _get_recording_traces(self, return_scaled, channel_ids=channel_ids, start_frame=0,
+                                                 end_frame=1).dtype.itemsize
+            chunk_size = int(chunk_mb * 1e6 / (itemsize * max(len(channel_ids), 1)))
+        if chunk_size is None:
+            chunk_size = num_frames
+        chunk_size = max(int(chunk_size), 1)
+        chunk_bounds = [(start_frame, min(start_frame + chunk_size, num_frames))
+                        for start_frame in range(0, num_frames, chunk_size)]
+
+        def _read_chunk(start_frame, end_frame):
+            first_frame = max(start_frame - margin, 0)
+            last_frame = min(end_frame + margin, num_frames)
+            traces = _get_recording_traces(self, return_scaled, channel_ids=channel_ids, start_frame=first_frame,
+                                           end_frame=last_frame)
+            if dtype is not None:
+                traces = traces.astype(dtype, copy=False)
+            if margin > 0 and (first_frame != start_frame - margin or last_frame != end_frame + margin):
+                chunk = np.zeros((traces.shape[0], end_frame - start_frame + 2 * margin), dtype=traces.dtype)
+                chunk[:, first_frame - start_frame + margin:last_frame - start_frame + margin] = traces
+                traces = chunk
+            return traces
+
+        if not prefetch:
+            for start_frame, end_frame in chunk_bounds:
+                yield _read_chunk(start_frame, end_frame), start_frame, end_frame
+        else:
+            from concurrent.futures import ThreadPoolExecutor
+            executor = ThreadPoolExecutor(max_workers=1)
+            try:
+                future = None
+                for i, (start_frame, end_frame) in enumerate(chunk_bounds):
+                    if future is None:
+                        future = executor.submit(_read_chunk, start_frame, end_frame)
+                    chunk = future.result()
+                    future = None
+                    if i + 1 < len(chunk_bounds):
+                        future = executor.submit(_read_chunk, *chunk_bounds[i + 1])
+                    yield chunk, start_frame, end_frame
+            finally:
+                executor.shutdown(wait=True)
+
     def set_channel_locations(self, channel_ids, locations):
         '''This function sets the location properties of each specified channel
         id with the corresponding locations of the passed in locations list.
@@ -212,12 +368,14 @@ class RecordingExtractor(ABC):
             A list of corresonding locations (array_like) for the given channel_ids
         '''
         if len(channel_ids) == len(locations):
+            values = []
             for i in range(len(channel_ids)):
                 if isinstance(locations[i],(list,np.ndarray)):
                     location = np.asarray(locations[i])
-                    self.set_channel_property(channel_ids[i], 'location', location.astype(float))
+                    values.append(location.astype(float))
                 else:
                     raise TypeError(str(locations[i]) + " must be an array_like")
+            self.set_channel_properties('location', values, channel_ids=channel_ids)
         else:
             raise ValueError("channel_ids and locations must have same length")
 
@@ -238,10 +396,7 @@ class RecordingExtractor(ABC):
         '''
         if channel_ids is None:
             channel_ids = self.get_channel_ids()
-        locations = []
-        for channel_id in channel_ids:
-            location = self.get_channel_property(channel_id, 'location')
-            locations.append(location)
+        locations = list(self.get_channel_properties('location', channel_ids=channel_ids))
         return locations
 
     def set_channel_groups(self, channel_ids, groups):
@@ -257,10 +412,9 @@ class RecordingExtractor(ABC):
         '''
         if len(channel_ids) == len(groups):
             for i in range(len(channel_ids)):
-                if isinstance(groups[i], (int, np.integer)):
-                    self.set_channel_property(channel_ids[i], 'group', groups[i])
-                else:
+                if not isinstance(groups[i], (int, np.integer)):
                     raise TypeError(str(groups[i]) + " must be an int")
+            self.set_channel_properties('group', groups, channel_ids=channel_ids)
         else:
             raise ValueError("channel_ids and groups must have same length")
 
@@ -281,10 +435,7 @@ class RecordingExtractor(ABC):
         '''
         if channel_ids is None:
             channel_ids = self.get_channel_ids()
-        groups = []
-        for channel_id in channel_ids:
-            group = self.get_channel_property(channel_id, 'group')
-            groups.append(group)
+        groups = self.get_channel_properties('group', channel_ids=channel_ids).tolist()
         return groups
 
     def set_channel_gains(self, channel_ids, gains):
@@ -301,15 +452,13 @@ class RecordingExtractor(ABC):
         '''
         if isinstance(gains, (int, np.integer, float, np.float64)):
             gain = float(gains)
-            for i in range(len(channel_ids)):
-                self.set_channel_property(channel_ids[i], 'gain', gain)
+            self.set_channel_properties('gain', [gain] * len(channel_ids), channel_ids=channel_ids)
         elif isinstance(gains, (list, np.ndarray)):
             if len(channel_ids) == len(gains):
                 for i in range(len(channel_ids)):
-                    if isinstance(gains[i], (int, np.integer, float, np.float64)):
-                        self.set_channel_property(channel_ids[i], 'gain', float(gains[i]))
-                    else:
+                    if not isinstance(gains[i], (int, np.integer, float, np.float64)):
                         raise TypeError("all gains must be floats or ints")
+                self.set_channel_properties('gain', [float(gain) for gain in gains], channel_ids=channel_ids)
             else:
                 raise ValueError("channel_ids and gains must have same length")
         else:
@@ -332,12 +481,57 @@ class RecordingExtractor(ABC):
         '''
         if channel_ids is None:
             channel_ids = self.get_channel_ids()
-        gains = []
-        for channel_id in channel_ids:
-            gain = self.get_channel_property(channel_id, 'gain')
-            gains.append(gain)
+        gains = self.get_channel_properties('gain', channel_ids=channel_ids).tolist()
         return gains
 
+    def get_traces_raw(self, channel_ids=None, start_frame=None, end_frame=None, **kwargs):
+        '''This function returns the traces of the given channels within [start_frame, end_frame) in the native
+        dtype of the recorded data (e.g. int16), without scaling (see get_traces). The traces in physical
+        units are:
+
+            traces = raw_traces * gains[:, np.newaxis] + offsets[:, np.newaxis]
+
+        with the gains and offsets returned by get_channel_scaling. Extractors that do not scale their data
+        return the same traces as get_traces.
+
+        Parameters
+        ----------
+        channel_ids: array_like
+            A list or 1D array of channel ids (ints) from which each trace will be
+            extracted.
+        start_frame: int
+            The starting frame of the trace to be returned (inclusive).
+        end_frame: int
+            The ending frame of the trace to be returned (exclusive).
+
+        Returns
+        ----------
+        raw_traces: numpy.ndarray
+            A 2D array that contains the unscaled traces of each channel.
+        '''
+        return self.get_traces(channel_ids=channel_ids, start_frame=start_frame, end_frame=end_frame,
+                               return_scaled=False, **kwargs)
+
+    def get_channel_scaling(self, channel_ids=None):
+        '''This function returns the gain and offset of each channel specified by channel_ids, which convert
+        the traces returned by get_traces_raw to the traces returned by get_traces (raw * gain + offset).
+
+        Parameters
+        ----------
+        channel_ids: array_like
+            The channel ids (ints) for which the gains and offsets will be returned
+
+        Returns
+        ----------
+        gains: numpy.ndarray
+            The gain of each channel
+        offsets: numpy.ndarray
+            The offset of each channel
+        '''
+        if channel_ids is None:
+            channel_ids = self.get_channel_ids()
+        return np.ones(len(channel_ids)), np.zeros(len(channel_ids))
+
     def set_channel_property(self, channel_id, property_name, value):
         '''This function adds a property dataset to the given channel under the
         property name.
@@ -352,18 +546,11 @@ class RecordingExtractor(ABC):
             The data associated with the given property name. Could be many
             formats as specified by the user.
         '''
-        if isinstance(channel_id, (int, np.integer)):
-            if channel_id in self.get_channel_ids():
-                if channel_id not in self._channel_properties:
-                    self._channel_properties[channel_id] = {}
-                if isinstance(property_name, str):
-                    self._channel_properties[channel_id][property_name] = value
-                else:
-                    raise TypeError(str(property_name) + " must be a string")
-            else:
-                raise ValueError(str(channel_id) + " is not a valid channel_id")
+        row = self._get_channel_row(channel_id)
+        if isinstance(property_name, str):
+            self._channel_properties.set_value(property_name, row, value)
         else:
-            raise TypeError(str(channel_id) + " must be an int")
+            raise TypeError(str(property_name) + " must be a string")
 
     def get_channel_property(self, channel_id, property_name):
         '''This function returns the data stored under the property name from
@@ -382,21 +569,65 @@ class RecordingExtractor(ABC):
             The data associated with the given property name. Could be many
             formats as specified by the user.
         '''
-        if isinstance(channel_id, (int, np.integer)):
-            if channel_id in self.get_channel_ids():
-                if channel_id not in self._channel_properties:
-                    self._channel_properties[channel_id] = {}
-                if isinstance(property_name, str):
-                    if property_name in list(self._channel_properties[channel_id].keys()):
-                        return self._channel_properties[channel_id][property_name]
-                    else:
-                        raise RuntimeError(str(property_name) + " has not been added to channel " + str(channel_id))
-                else:
-                    raise TypeError(str(property_name) + " must be a string")
+        row = self._get_channel_row(channel_id)
+        if isinstance(property_name, str):
+            if self._channel_properties.has_value(property_name, row):
+                return self._channel_properties.get_value(property_name, row)
             else:
-                raise ValueError(str(channel_id) + " is not a valid channel_id")
+                raise RuntimeError(str(property_name) + " has not been added to channel " + str(channel_id))
         else:
-            raise TypeError(str(channel_id) + " must be an int")
+            raise TypeError(str(property_name) + " must be a string")
+
+    def set_channel_properties(self, property_name, values, channel_ids=None):
+        '''This function sets the property values of a set of channels at once.
+
+        Parameters
+        ----------
+        property_name: str
+            A property stored by the RecordingExtractor (location, etc.)
+        values: array_like
+            The values of the property, one for each channel in channel_ids
+        channel_ids: array_like
+            The channel ids (ints) for which the property will be set.
+            If None (default), all channels are set.
+        '''
+        if channel_ids is None:
+            channel_ids = self.get_channel_ids()
+        if not isinstance(property_name, str):
+            raise TypeError(str(property_name) + " must be a string")
+        if len(channel_ids) != len(values):
+            raise ValueError("channel_ids and values must have same length")
+        rows = self._get_channel_rows(channel_ids)
+        self._channel_properties.set_values(property_name, rows, values)
+
+    def get_channel_properties(self, property_name, channel_ids=None):
+        '''This function returns the property values of a set of channels in a
+        numpy array.
+
+        Parameters
+        ----------
+        property_name: str
+            A property stored by the RecordingExtractor (location, etc.)
+        channel_ids: array_like
+            The channel ids (ints) for which the property will be returned.
+            If None (default), the property of all channels is returned.
+
+        Returns
+        ----------
+        values: numpy.ndarray
+            The values of the property stacked along the first dimension (object
+            array if the values cannot be stacked).
+        '''
+        if channel_ids is None:
+            channel_ids = self.get_channel_ids()
+        if not isinstance(property_name, str):
+            raise TypeError(str(property_name) + " must be a string")
+        rows = self._get_channel_rows(channel_ids)
+        is_set = self._channel_properties.is_set(property_name, rows)
+        if not np.all(is_set):
+            missing_channel_id = channel_ids[int(np.where(~is_set)[0][0])]
+            raise RuntimeError(str(property_name) + " has not been added to channel " + str(missing_channel_id))
+        return self._channel_properties.get_values(property_name, rows)
 
     def get_channel_property_names(self, channel_id):
         '''Get a list of property names for a given channel.
@@ -410,16 +641,9 @@ class RecordingExtractor(ABC):
         property_names
             The list of property names
         '''
-        if isinstance(channel_id, (int, np.integer)):
-            if channel_id in self.get_channel_ids():
-                if channel_id not in self._channel_properties:
-                    self._channel_properties[channel_id] = {}
-                property_names = sorted(self._channel_properties[channel_id].keys())
-                return property_names
-            else:
-                raise ValueError(str(channel_id) + " is not a valid channel_id")
-        else:
-            raise TypeError(str(channel_id) + " must be an int")
+        row = self._get_channel_row(channel_id)
+        property_names = self._channel_properties.get_names(row)
+        return property_names
 
     def get_shared_channel_property_names(self, channel_ids=None):
         '''Get the intersection of channel property names for a given set of channels or for all channels if channel_ids is None.
@@ -435,12 +659,8 @@ class RecordingExtractor(ABC):
         '''
         if channel_ids is None:
             channel_ids = self.get_channel_ids()
-        property_names = []
-        curr_property_name_set = set(self.get_channel_property_names(channel_id=channel_ids[0]))
-        for channel_id in channel_ids[1:]:
-            curr_channel_property_name_set = set(self.get_channel_property_names(channel_id=channel_id))
-            curr_property_name_set = curr_property_name_set.intersection(curr_channel_property_name_set)
-        property_names = sorted(list(curr_property_name_set))
+        rows = self._get_channel_rows(channel_ids)
+        property_names = self._channel_properties.get_shared_names(rows)
         return property_names
 
     def copy_channel_properties(self, recording, channel_ids=None):
@@ -456,18 +676,10 @@ class RecordingExtractor(ABC):
         '''
         if channel_ids is None:
             channel_ids = recording.get_channel_ids()
-        if isinstance(channel_ids, int):
-            curr_property_names = recording.get_channel_property_names(channel_id=channel_ids)
-            for curr_property_name in curr_property_names:
-                value = recording.get_channel_property(channel_id=channel_ids, property_name=curr_property_name)
-                self.set_channel_property(channel_id=channel_ids, property_name=curr_property_name, value=value)
-        else:
-            for channel_id in channel_ids:
-                curr_property_names = recording.get_channel_property_names(channel_id=channel_id)
-                for curr_property_name in curr_property_names:
-                    value = recording.get_channel_property(channel_id=channel_id, property_name=curr_property_name)
-                    self.set_channel_property(channel_id=channel_id, property_name=curr_property_name, value=value)
-    
+        if isinstance(channel_ids, (int, np.integer)):
+            channel_ids = [channel_ids]
+        self._copy_channel_properties(recording, list(channel_ids), list(channel_ids))
+
     def clear_channel_property(self, channel_id, property_name):
         '''This function clears the channel property for the given property.
 
@@ -479,8 +691,7 @@ class RecordingExtractor(ABC):
             The name of the property to be cleared.
         '''
         if channel_id in self._channel_properties:
-            if property_name in self._channel_properties[channel_id]:
-                del self._channel_properties[channel_id][property_name]
+            self._channel_properties.clear_value(property_name, self._channel_properties.row(channel_id))
 
     def clear_channels_property(self, *, channel_ids=None, property_name):
         '''This function clears the channels' properties for the given property.
@@ -496,7 +707,40 @@ class RecordingExtractor(ABC):
             channel_ids = self.get_channel_ids()
         for channel_id in channel_ids:
             self.clear_channel_property(channel_id, property_name)
-            
+
+    def _get_channel_row(self, channel_id):
+        if isinstance(channel_id, (int, np.integer)):
+            if channel_id not in self._channel_properties:
+                # the table is synced with the current channel ids only when an id is not found
+                self._channel_properties.sync_ids(self.get_channel_ids())
+                if channel_id not in self._channel_properties:
+                    raise ValueError(str(channel_id) + " is not a valid channel_id")
+            return self._channel_properties.row(channel_id)
+        else:
+            raise TypeError(str(channel_id) + " must be an int")
+
+    def _get_channel_rows(self, channel_ids):
+        try:
+            return self._channel_properties.rows(channel_ids)
+        except KeyError:
+            self._channel_properties.sync_ids(self.get_channel_ids())
+        try:
+            return self._channel_properties.rows(channel_ids)
+        except KeyError as e:
+            raise ValueError(str(e.args[0]) + " is not a valid channel_id")
+
+    def _copy_channel_properties(self, recording, channel_ids, recording_channel_ids):
+        # each property is set in one call for all the channels that have it. The values are read one by one
+        # so that they are copied unchanged (get_channel_properties stacks them in an array)
+        rows = self._get_channel_rows(channel_ids)
+        property_names = [recording.get_channel_property_names(channel_id=recording_channel_id)
+                          for recording_channel_id in recording_channel_ids]
+        for property_name in sorted(set().union(*property_names)):
+            idxs = [i for i, names in enumerate(property_names) if property_name in names]
+            values = [recording.get_channel_property(channel_id=recording_channel_ids[i], property_name=property_name)
+                      for i in idxs]
+            self._channel_properties.set_values(property_name, rows[idxs], values)
+
     def add_epoch(self, epoch_name, start_frame, end_frame):
         '''This function adds an epoch to your recording extractor that tracks
         a certain time period in your recording. It is stored in an internal
@@ -648,7 +892,8 @@ class RecordingExtractor(ABC):
         save_to_probe_file(self, probe_file, grouping_property=grouping_property, radius=radius,
                            graph=graph, geometry=geometry, verbose=verbose)
 
-    def write_to_binary_dat_format(self, save_path, time_axis=0, dtype=None, chunk_size=None):
+    def write_to_binary_dat_format(self, save_path, time_axis=0, dtype=None, chunk_size=None, chunk_mb=500, n_jobs=1,
+                                   return_scaled=None):
         '''Saves the traces of this recording extractor into binary .dat format.
 
         Parameters
@@ -663,8 +908,18 @@ class RecordingExtractor(ABC):
         chunk_size: None or int
             If not None then the copy done by chunk size.
             This avoid to much memory consumption for big files.
+        chunk_mb: None or float
+            If chunk_size is None, the chunk size is computed so that each chunk is at most chunk_mb MB (default 500).
+            If both chunk_size and chunk_mb are None, the traces are copied at once.
+        n_jobs: int
+            Number of processes used to write the file (default 1). If -1, all the available cores are used.
+            The recording extractor must be picklable to use n_jobs > 1.
+        return_scaled: bool or None
+            If True, the scaled traces are written, if False the raw traces (see get_traces_raw).
+            If None (default), the traces returned by default by get_traces are written.
         '''
-        write_to_binary_dat_format(self, save_path=save_path, time_axis=time_axis, dtype=dtype, chunk_size=chunk_size)
+        write_to_binary_dat_format(self, save_path=save_path, time_axis=time_axis, dtype=dtype, chunk_size=chunk_size,
+                                   chunk_mb=chunk_mb, n_jobs=n_jobs, return_scaled=return_scaled)
    
     def get_sub_extractors_by_property(self, property_name, return_property_list=False):
         '''Returns a list of SubRecordingExtractors from this RecordingExtractor based on the given
@@ -714,3 +969,12 @@ class RecordingExtractor(ABC):
         '''
         raise NotImplementedError("The write_recording function is not \
                                   implemented for this extractor")
+
+
+def _get_snippet_len(snippet_len):
+    # the number of frames before and after the reference frame of a snippet
+    if isinstance(snippet_len, (tuple, list, np.ndarray)):
+        return int(snippet_len[0]), int(snippet_len[1])
+    snippet_len_before = int((snippet_len + 1) / 2)
+    return snippet_len_before, snippet_len - snippet_len_before
+
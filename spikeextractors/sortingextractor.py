@@ -2,6 +2,8 @@ from abc import ABC, abstractmethod
 import numpy as np
 import copy
 from .extraction_tools import get_sub_extractors_by_property
+from .propertytable import PropertyTable, SpikeFeatureTable
+from .spikevector import SpikeVector, get_spike_window, merge_spike_streams
 
 
 
@@ -13,10 +15,15 @@ class SortingExtractor(ABC):
 
 
     '''
+    # True if get_unit_spike_train always returns sorted spike trains (so that time windows can be found by
+    # binary search)
+    _sorted_spike_trains = False
+
     def __init__(self):
         self._epochs = {}
-        self._unit_properties = {}
-        self._unit_features = {}
+        self._unit_properties = PropertyTable()
+        self._unit_features = SpikeFeatureTable()
+        self._unit_num_spikes = {}
         self._sampling_frequency = None
         self.id = np.random.randint(low=0, high=9223372036854775807)
 
@@ -83,6 +90,130 @@ class SortingExtractor(ABC):
         '''
         self._sampling_frequency = sampling_frequency
 
+    def frame_to_time(self, frame):
+        '''This function converts a frame index (e.g. a spike frame) to a time with units of seconds.
+
+        Parameters
+        ----------
+        frame: float or array_like
+            The frame (or frames) to be converted to a time.
+
+        Returns
+        -------
+        time: float or numpy.ndarray
+            The corresponding time (or times) in seconds.
+        '''
+        if self.get_sampling_frequency() is None:
+            raise ValueError("the sampling frequency of the sorting extractor is not set")
+        if not np.isscalar(frame):
+            frame = np.asarray(frame)
+        return frame / self.get_sampling_frequency()
+
+    def time_to_frame(self, time):
+        '''This function converts a time (in seconds) to a frame index.
+
+        Parameters
+        ----------
+        time: float or array_like
+            The time (or times) in seconds to be converted to frame index.
+
+        Returns
+        -------
+        frame: float or numpy.ndarray
+            The corresponding frame index (or indices).
+        '''
+        if self.get_sampling_frequency() is None:
+            raise ValueError("the sampling frequency of the sorting extractor is not set")
+        if not np.isscalar(time):
+            time = np.asarray(time)
+        return time * self.get_sampling_frequency()
+
+    def get_spike_trains(self, unit_ids=None, start_frame=None, end_frame=None):
+        '''This function returns the spike trains of a list of units (by default all units) within
+        [start_frame, end_frame).
+
+        Parameters
+        ----------
+        unit_ids: array_like
+            The unit ids for which the spike trains will be returned.
+            If None (default), the spike trains of all units are returned.
+        start_frame: int
+            The frame above which a spike frame is returned  (inclusive).
+        end_frame: int
+            The frame below which a spike frame is returned  (exclusive).
+        Returns
+        ----------
+        spike_trains: list
+            The list of spike trains (numpy.ndarray) of the units.
+        '''
+        if unit_ids is None:
+            unit_ids = self.get_unit_ids()
+        return [self.get_unit_spike_train(unit_id, start_frame=start_frame, end_frame=end_frame)
+                for unit_id in unit_ids]
+
+    def get_all_spikes(self, unit_ids=None, start_frame=None, end_frame=None):
+        '''This function returns the spike frames and the unit ids of all the spikes of a list of units (by
+        default all units) within [start_frame, end_frame), sorted in time.
+
+        Parameters
+        ----------
+        unit_ids: array_like
+            The unit ids for which the spikes will be returned.
+            If None (default), the spikes of all units are returned.
+        start_frame: int
+            The frame above which a spike frame is returned  (inclusive).
+        end_frame: int
+            The frame below which a spike frame is returned  (exclusive).
+        Returns
+        ----------
+        times: numpy.ndarray
+            The spike frames of all the spikes, sorted in time.
+        labels: numpy.ndarray
+            The unit id of each spike.
+        '''
+        if unit_ids is None:
+            unit_ids = self.get_unit_ids()
+        spike_trains = self.get_spike_trains(unit_ids=unit_ids, start_frame=start_frame, end_frame=end_frame)
+        if len(spike_trains) == 0:
+            return np.array([], dtype='int64'), np.array([], dtype='int64')
+        times = np.concatenate([np.asarray(spike_train).ravel() for spike_train in spike_trains])
+        labels = np.repeat(np.array(unit_ids), [len(spike_train) for spike_train in spike_trains])
+        order = np.argsort(times, kind='stable')
+        return times[order], labels[order]
+
+    def iter_spikes(self, unit_ids=None, start_frame=None, end_frame=None, batch_size=10000):
+        '''This function iterates over the spikes of a list of units (by default all units) within
+        [start_frame, end_frame) in time order. The spike train of each unit is read in successive frame
+        windows, sized from the spike rate of the previous window to hold about batch_size spikes (or sliced
+        from the spike vector of the sorting, if it has one), so that only a few batches of each unit are
+        held at a time. The batches of batch_size spikes are merged across units, so that each yielded block
+        contains at most batch_size spikes of each unit.
+
+        Parameters
+        ----------
+        unit_ids: array_like
+            The unit ids for which the spikes will be returned.
+            If None (default), the spikes of all units are returned.
+        start_frame: int
+            The frame above which a spike frame is returned  (inclusive).
+        end_frame: int
+            The frame below which a spike frame is returned  (exclusive).
+        batch_size: int
+            The number of spikes of a unit read at a time
+        Returns
+        ----------
+        spikes: generator
+            The generator of (times, labels) blocks, with the spike frames and the unit ids of the spikes.
+            The spikes are sorted in time within and across the blocks.
+        '''
+        if unit_ids is None:
+            unit_ids = self.get_unit_ids()
+        if batch_size < 1:
+            raise ValueError("batch_size must be a positive integer")
+        streams = [self._iter_unit_spike_batches(unit_id, start_frame, end_frame, batch_size)
+                   for unit_id in unit_ids]
+        return merge_spike_streams(streams)
+
     def set_unit_spike_features(self, unit_id, feature_name, value):
         '''This function adds a unit features data set under the given features
         name to the given unit.
@@ -97,21 +228,47 @@ class SortingExtractor(ABC):
             The data associated with the given feature name. Could be many
             formats as specified by the user.
         '''
-        if isinstance(unit_id, (int, np.integer)):
-            if unit_id in self.get_unit_ids():
-                if unit_id not in self._unit_features.keys():
-                    self._unit_features[unit_id] = {}
-                if isinstance(feature_name, str) and len(value) == len(self.get_unit_spike_train(unit_id)):
-                    self._unit_features[unit_id][feature_name] = np.asarray(value)
-                else:
-                    if not isinstance(feature_name, str):
-                        raise ValueError("feature_name must be a string")
-                    else:
-                        raise ValueError("feature values should have the same length as the spike train")
+        row = self._get_unit_row(unit_id, self._unit_features)
+        if isinstance(feature_name, str):
+            value = np.asarray(value)
+            if len(value) == self._get_unit_num_spikes(unit_id):
+                self._unit_features.set_value(feature_name, row, value)
             else:
-                raise ValueError(str(unit_id) + " is not a valid unit_id")
+                raise ValueError("feature values should have the same length as the spike train")
         else:
-            raise ValueError(str(unit_id) + " must be an int")
+            raise ValueError("feature_name must be a string")
+
+    def set_units_spike_features(self, *, unit_ids=None, feature_name, values):
+        '''Sets the spike features of a list of units
+
+        Parameters
+        ----------
+        unit_ids: list
+            The list of unit ids for which the features will be set
+            Defaults to get_unit_ids()
+        feature_name: str
+            The name of the feature
+        values: list or numpy.ndarray
+            The list with the features of each unit, or a numpy array with the features of
+            all the spikes of the units concatenated (in the order of unit_ids) along the first axis
+        '''
+        if unit_ids is None:
+            unit_ids = self.get_unit_ids()
+        if not isinstance(feature_name, str):
+            raise ValueError("feature_name must be a string")
+        rows = self._get_unit_rows(unit_ids, self._unit_features)
+        num_spikes = [self._get_unit_num_spikes(unit_id) for unit_id in unit_ids]
+        if isinstance(values, np.ndarray) and values.dtype != object:
+            if len(values) != np.sum(num_spikes, dtype='int64'):
+                raise ValueError("feature values should have the same length as the spike trains")
+            self._unit_features.set_concatenated_values(feature_name, rows, values, num_spikes)
+        else:
+            if len(values) != len(unit_ids):
+                raise ValueError("unit_ids and values must have same length")
+            for value, n in zip(values, num_spikes):
+                if len(value) != n:
+                    raise ValueError("feature values should have the same length as the spike train")
+            self._unit_features.set_values(feature_name, rows, values)
 
     def get_unit_spike_features(self, unit_id, feature_name, start_frame=None, end_frame=None):
         '''This function extracts the specified spike features from the specified unit.
@@ -144,27 +301,49 @@ class SortingExtractor(ABC):
             An array containing all the features for each spike in the
             specified unit given the range of start and end frames.
         '''
-        if isinstance(unit_id, (int, np.integer)):
-            if unit_id in self.get_unit_ids():
-                if unit_id not in self._unit_features.keys():
-                    self._unit_features[unit_id] = {}
-                if isinstance(feature_name, str):
-                    if feature_name in self._unit_features[unit_id].keys():
-                        spike_train = self.get_unit_spike_train(unit_id)
-                        if start_frame is None:
-                            start_frame = 0
-                        if end_frame is None:
-                            end_frame = np.inf
-                        spike_indices =  np.where(np.logical_and(spike_train >= start_frame, spike_train < end_frame)) 
-                        return self._unit_features[unit_id][feature_name][spike_indices]
-                    else:
-                        raise ValueError(str(feature_name) + " has not been added to unit " + str(unit_id))
-                else:
-                    raise ValueError(str(feature_name) + " must be a string")
+        row = self._get_unit_row(unit_id, self._unit_features)
+        if isinstance(feature_name, str):
+            if self._unit_features.has_value(feature_name, row):
+                features = self._unit_features.get_value(feature_name, row)
+                if start_frame is None and end_frame is None:
+                    return features
+                return features[self._get_unit_spike_indices(unit_id, start_frame, end_frame)]
             else:
-                raise ValueError(str(unit_id) + " is not a valid unit_id")
+                raise ValueError(str(feature_name) + " has not been added to unit " + str(unit_id))
         else:
-            raise ValueError(str(unit_id) + " must be an int")
+            raise ValueError(str(feature_name) + " must be a string")
+
+    def get_units_spike_features(self, *, unit_ids=None, feature_name, concatenate=False):
+        '''Returns the spike features stored under the feature name for a list of units
+
+        Parameters
+        ----------
+        unit_ids: list
+            The unit ids for which the features will be returned
+            Defaults to get_unit_ids()
+        feature_name: str
+            The name of the feature
+        concatenate: bool
+            If True, the features of all the units are returned concatenated (in the order
+            of unit_ids) along the first axis
+        Returns
+        ----------
+        values
+            The list of features of each unit (or their concatenation)
+        '''
+        if unit_ids is None:
+            unit_ids = self.get_unit_ids()
+        if not isinstance(feature_name, str):
+            raise ValueError(str(feature_name) + " must be a string")
+        rows = self._get_unit_rows(unit_ids, self._unit_features)
+        is_set = self._unit_features.is_set(feature_name, rows)
+        if not np.all(is_set):
+            missing_unit_id = unit_ids[int(np.where(~is_set)[0][0])]
+            raise ValueError(str(feature_name) + " has not been added to unit " + str(missing_unit_id))
+        if concatenate:
+            return self._unit_features.get_concatenated_values(feature_name, rows)
+        else:
+            return self._unit_features.get_values(feature_name, rows)
 
     def clear_unit_spike_features(self, unit_id, feature_name):
         '''This function clears the unit spikes features for the given feature.
@@ -177,8 +356,7 @@ class SortingExtractor(ABC):
             The name of the feature to be cleared.
         '''
         if unit_id in self._unit_features:
-            if feature_name in self._unit_features[unit_id]:
-                del self._unit_features[unit_id][feature_name]
+            self._unit_features.clear_value(feature_name, self._unit_features.row(unit_id))
 
     def clear_units_spike_features(self, *, unit_ids=None, feature_name):
         '''This function clears the units' spikes features for the given feature.
@@ -206,17 +384,10 @@ class SortingExtractor(ABC):
         property_names
             The list of feature names.
         '''
-        if isinstance(unit_id, (int, np.integer)):
-            if unit_id in self.get_unit_ids():
-                if unit_id not in self._unit_features:
-                    self._unit_features[unit_id] = {}
-                feature_names = sorted(self._unit_features[unit_id].keys())
-                return feature_names
-            else:
-                raise ValueError(str(unit_id) + " is not a valid unit_id")
-        else:
-            raise ValueError(str(unit_id) + " must be an int")
-        
+        row = self._get_unit_row(unit_id, self._unit_features)
+        feature_names = self._unit_features.get_names(row)
+        return feature_names
+
     def get_shared_unit_spike_feature_names(self, unit_ids=None):
         '''Get the intersection of unit feature names for a given set of units or for all units if unit_ids is None.
          Parameters
@@ -231,11 +402,8 @@ class SortingExtractor(ABC):
         '''
         if unit_ids is None:
             unit_ids = self.get_unit_ids()
-        curr_feature_name_set = set(self.get_unit_spike_feature_names(unit_id=unit_ids[0]))
-        for unit_id in unit_ids[1:]:
-            curr_unit_feature_name_set = set(self.get_unit_spike_feature_names(unit_id=unit_id))
-            curr_feature_name_set = curr_feature_name_set.intersection(curr_unit_feature_name_set)
-        feature_names = sorted(list(curr_feature_name_set))
+        rows = self._get_unit_rows(unit_ids, self._unit_features)
+        feature_names = self._unit_features.get_shared_names(rows)
         return feature_names
 
     def set_unit_property(self, unit_id, property_name, value):
@@ -252,18 +420,11 @@ class SortingExtractor(ABC):
             The data associated with the given property name. Could be many
             formats as specified by the user.
         '''
-        if isinstance(unit_id, (int, np.integer)):
-            if unit_id in self.get_unit_ids():
-                if unit_id not in self._unit_properties:
-                    self._unit_properties[unit_id] = {}
-                if isinstance(property_name, str):
-                    self._unit_properties[unit_id][property_name] = value
-                else:
-                    raise ValueError(str(property_name) + " must be a string")
-            else:
-                raise ValueError(str(unit_id) + " is not a valid unit_id")
+        row = self._get_unit_row(unit_id, self._unit_properties)
+        if isinstance(property_name, str):
+            self._unit_properties.set_value(property_name, row, value)
         else:
-            raise ValueError(str(unit_id) + " must be an int")
+            raise ValueError(str(property_name) + " must be a string")
 
     def set_units_property(self, *, unit_ids=None, property_name, values):
         '''Sets unit property data for a list of units
@@ -280,8 +441,12 @@ class SortingExtractor(ABC):
         '''
         if unit_ids is None:
             unit_ids = self.get_unit_ids()
-        for i, unit in enumerate(unit_ids):
-            self.set_unit_property(unit_id=unit, property_name=property_name, value=values[i])
+        if not isinstance(property_name, str):
+            raise ValueError(str(property_name) + " must be a string")
+        if len(values) < len(unit_ids):
+            raise ValueError("unit_ids and values must have same length")
+        rows = self._get_unit_rows(unit_ids, self._unit_properties)
+        self._unit_properties.set_values(property_name, rows, values[:len(unit_ids)])
 
     def add_unit_property(self, unit_id, property_name, value):
         '''DEPRECATED! This function adds a unit property data set under the given property
@@ -298,16 +463,7 @@ class SortingExtractor(ABC):
             formats as specified by the user.
         '''
         print('WARNING: add_unit_property is deprecated. Use set_unit_property instead.')
-        if isinstance(unit_id, (int, np.integer)):
-            if unit_id in self.get_unit_ids():
-                if isinstance(property_name, str):
-                    self._unit_properties[unit_id][property_name] = value
-                else:
-                    raise ValueError(str(property_name) + " must be a string")
-            else:
-                raise ValueError(str(unit_id) + " is not a valid unit_id")
-        else:
-            raise ValueError(str(unit_id) + " must be an int")
+        self.set_unit_property(unit_id, property_name, value)
 
     def get_unit_property(self, unit_id, property_name):
         '''This function rerturns the data stored under the property name given
@@ -325,21 +481,14 @@ class SortingExtractor(ABC):
             The data associated with the given property name. Could be many
             formats as specified by the user.
         '''
-        if isinstance(unit_id, (int, np.integer)):
-            if unit_id in self.get_unit_ids():
-                if unit_id not in self._unit_properties:
-                    self._unit_properties[unit_id] = {}
-                if isinstance(property_name, str):
-                    if property_name in list(self._unit_properties[unit_id].keys()):
-                        return self._unit_properties[unit_id][property_name]
-                    else:
-                        raise ValueError(str(property_name) + " has not been added to unit " + str(unit_id))
-                else:
-                    raise ValueError(str(property_name) + " must be a string")
+        row = self._get_unit_row(unit_id, self._unit_properties)
+        if isinstance(property_name, str):
+            if self._unit_properties.has_value(property_name, row):
+                return self._unit_properties.get_value(property_name, row)
             else:
-                raise ValueError(str(unit_id) + " is not a valid unit_id")
+                raise ValueError(str(property_name) + " has not been added to unit " + str(unit_id))
         else:
-            raise ValueError(str(unit_id) + " must be an int")
+            raise ValueError(str(property_name) + " must be a string")
 
     def get_units_property(self, *, unit_ids=None, property_name):
         '''Returns a list of values stored under the property name corresponding
@@ -359,7 +508,14 @@ class SortingExtractor(ABC):
         '''
         if unit_ids is None:
             unit_ids = self.get_unit_ids()
-        values = [self.get_unit_property(unit_id=unit, property_name=property_name) for unit in unit_ids]
+        if not isinstance(property_name, str):
+            raise ValueError(str(property_name) + " must be a string")
+        rows = self._get_unit_rows(unit_ids, self._unit_properties)
+        is_set = self._unit_properties.is_set(property_name, rows)
+        if not np.all(is_set):
+            missing_unit_id = unit_ids[int(np.where(~is_set)[0][0])]
+            raise ValueError(str(property_name) + " has not been added to unit " + str(missing_unit_id))
+        values = [self._unit_properties.get_value(property_name, row) for row in rows]
         return values
 
     def get_unit_property_names(self, unit_id):
@@ -373,17 +529,12 @@ class SortingExtractor(ABC):
         property_names
             The list of property names
         '''
-        if isinstance(unit_id, (int, np.integer)):
-            if unit_id in self.get_unit_ids():
-                if unit_id not in self._unit_properties:
-                    self._unit_properties[unit_id] = {}
-                property_names = sorted(self._unit_properties[unit_id].keys())
-                return property_names
-            else:
-                raise ValueError(str(unit_id) + " is not a valid unit id")
-        else:
+        if not isinstance(unit_id, (int, np.integer)):
             raise TypeError(str(unit_id) + " must be an int")
-        
+        row = self._get_unit_row(unit_id, self._unit_properties)
+        property_names = self._unit_properties.get_names(row)
+        return property_names
+
     def get_shared_unit_property_names(self, unit_ids=None):
         '''Get the intersection of unit property names for a given set of units or for all units if unit_ids is None.
          Parameters
@@ -398,11 +549,8 @@ class SortingExtractor(ABC):
         '''
         if unit_ids is None:
             unit_ids = self.get_unit_ids()
-        curr_property_name_set = set(self.get_unit_property_names(unit_id=unit_ids[0]))
-        for unit_id in unit_ids[1:]:
-            curr_unit_property_name_set = set(self.get_unit_property_names(unit_id=unit_id))
-            curr_property_name_set = curr_property_name_set.intersection(curr_unit_property_name_set)
-        property_names = sorted(list(curr_property_name_set))
+        rows = self._get_unit_rows(unit_ids, self._unit_properties)
+        property_names = self._unit_properties.get_shared_names(rows)
         return property_names
 
     def copy_unit_properties(self, sorting, unit_ids=None):
@@ -418,17 +566,9 @@ class SortingExtractor(ABC):
         '''
         if unit_ids is None:
             unit_ids = sorting.get_unit_ids()
-        if isinstance(unit_ids, int):
-            curr_property_names = sorting.get_unit_property_names(unit_id=unit_ids)
-            for curr_property_name in curr_property_names:
-                value = sorting.get_unit_property(unit_id=unit_ids, property_name=curr_property_name)
-                self.set_unit_property(unit_id=unit_ids, property_name=curr_property_name, value=value)
-        else:
-            for unit_id in unit_ids:
-                curr_property_names = sorting.get_unit_property_names(unit_id=unit_id)
-                for curr_property_name in curr_property_names:
-                    value = sorting.get_unit_property(unit_id=unit_id, property_name=curr_property_name)
-                    self.set_unit_property(unit_id=unit_id, property_name=curr_property_name, value=value)
+        if isinstance(unit_ids, (int, np.integer)):
+            unit_ids = [unit_ids]
+        self._copy_unit_properties(sorting, list(unit_ids), list(unit_ids))
 
     def clear_unit_property(self, unit_id, property_name):
         '''This function clears the unit property for the given property.
@@ -441,8 +581,7 @@ class SortingExtractor(ABC):
             The name of the property to be cleared.
         '''
         if unit_id in self._unit_properties:
-            if property_name in self._unit_properties[unit_id]:
-                del self._unit_properties[unit_id][property_name]
+            self._unit_properties.clear_value(property_name, self._unit_properties.row(unit_id))
 
     def clear_units_property(self, *, unit_ids=None, property_name):
         '''This function clears the units' properties for the given property.
@@ -485,6 +624,109 @@ class SortingExtractor(ABC):
                     value = sorting.get_unit_spike_features(unit_id=unit_id, feature_name=curr_feature_name)
                     self.set_unit_spike_features(unit_id=unit_id, feature_name=curr_feature_name, value=value)
 
+    def _get_unit_row(self, unit_id, table):
+        if isinstance(unit_id, (int, np.integer)):
+            if unit_id not in table:
+                # the table is synced with the current unit ids only when an id is not found
+                table.sync_ids(self.get_unit_ids())
+                if unit_id not in table:
+                    raise ValueError(str(unit_id) + " is not a valid unit_id")
+            return table.row(unit_id)
+        else:
+            raise ValueError(str(unit_id) + " must be an int")
+
+    def _get_unit_rows(self, unit_ids, table):
+        try:
+            return table.rows(unit_ids)
+        except KeyError:
+            table.sync_ids(self.get_unit_ids())
+        try:
+            return table.rows(unit_ids)
+        except KeyError as e:
+            raise ValueError(str(e.args[0]) + " is not a valid unit_id")
+
+    def _copy_unit_properties(self, sorting, unit_ids, sorting_unit_ids):
+        # each property is set in one call for all the units that have it (the values are copied unchanged)
+        rows = self._get_unit_rows(unit_ids, self._unit_properties)
+        property_names = [sorting.get_unit_property_names(unit_id=sorting_unit_id)
+                          for sorting_unit_id in sorting_unit_ids]
+        for property_name in sorted(set().union(*property_names)):
+            idxs = [i for i, names in enumerate(property_names) if property_name in names]
+            values = [sorting.get_unit_property(unit_id=sorting_unit_ids[i], property_name=property_name)
+                      for i in idxs]
+            self._unit_properties.set_values(property_name, rows[idxs], values)
+
+    def _get_unit_spike_indices(self, unit_id, start_frame=None, end_frame=None):
+        # the indices (a slice if the spike trains are sorted) of the spikes of the unit within the window
+        spike_vector = getattr(self, '_spike_vector', None)
+        if isinstance(spike_vector, SpikeVector):
+            return slice(*spike_vector.get_unit_spike_window(unit_id, start_frame, end_frame))
+        spike_train = self.get_unit_spike_train(unit_id)
+        if self._sorted_spike_trains:
+            start, end = get_spike_window(spike_train, start_frame, end_frame)
+            return slice(start, end)
+        if start_frame is None:
+            start_frame = 0
+        if end_frame is None:
+            end_frame = np.inf
+        return np.where(np.logical_and(spike_train >= start_frame, spike_train < end_frame))
+
+    def _iter_unit_spike_batches(self, unit_id, start_frame, end_frame, batch_size):
+        spike_vector = getattr(self, '_spike_vector', None)
+        if isinstance(spike_vector, SpikeVector):
+            # the batches are views of the spike vector
+            windows = [spike_vector.get_unit_spike_train(unit_id, start_frame=start_frame, end_frame=end_frame)]
+        else:
+            windows = self._iter_unit_spike_windows(unit_id, start_frame, end_frame, batch_size)
+        for spike_train in windows:
+            for start in range(0, len(spike_train), batch_size):
+                times = spike_train[start:start + batch_size]
+                yield times, np.full(len(times), unit_id)
+
+    def _iter_unit_spike_windows(self, unit_id, start_frame, end_frame, batch_size):
+        # reads the spike train in successive [frame, frame + window) windows. The window is resized from the
+        # spike rate of the previous window to hold about batch_size spikes, and doubled after an empty window.
+        if end_frame is None:
+            # the windows end after the last spike (the spike train is released before the first window)
+            spike_train = np.asarray(self.get_unit_spike_train(unit_id, start_frame=start_frame)).ravel()
+            if len(spike_train) == 0:
+                return
+            first_frame = min(spike_train.min(), 0)
+            end_frame = spike_train.max() + 1
+            del spike_train
+        else:
+            first_frame = 0
+        # without start_frame, the first window includes all the spikes before its end
+        window_start = start_frame
+        frame = first_frame if start_frame is None else start_frame
+        window = batch_size
+        while frame < end_frame:
+            window_end = min(frame + window, end_frame)
+            spike_train = self._get_sorted_spike_train(unit_id, window_start, window_end)
+            if len(spike_train) > 0:
+                yield spike_train
+                window = max(int(window * min(batch_size / len(spike_train), 2)), 1)
+            else:
+                window *= 2
+            frame = window_start = window_end
+
+    def _get_sorted_spike_train(self, unit_id, start_frame, end_frame):
+        spike_train = np.asarray(self.get_unit_spike_train(unit_id, start_frame=start_frame,
+                                                           end_frame=end_frame)).ravel()
+        if not self._sorted_spike_trains and np.any(spike_train[1:] < spike_train[:-1]):
+            spike_train = np.sort(spike_train, kind='stable')
+        return spike_train
+
+    def _get_unit_num_spikes(self, unit_id):
+        # the spike trains are only loaded to count the spikes of a unit the first time. Extractors whose spike
+        # trains can change override this method to count the spikes of the current trains
+        spike_vector = getattr(self, '_spike_vector', None)
+        if isinstance(spike_vector, SpikeVector):
+            return spike_vector.get_num_spikes(unit_id)
+        if unit_id not in self._unit_num_spikes:
+            self._unit_num_spikes[unit_id] = len(self.get_unit_spike_train(unit_id))
+        return self._unit_num_spikes[unit_id]
+
     def add_epoch(self, epoch_name, start_frame, end_frame):
         '''This function adds an epoch to your sorting extractor that tracks
         a certain time period in your recording. It is stored in an internal
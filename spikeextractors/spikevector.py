@@ -0,0 +1,217 @@
+import numpy as np
+import heapq
+
+
+# Compact representation of all the spikes of a sorting
+
+class SpikeVector:
+    '''Stores the spike times of all the units of a sorting in a single array, grouped by unit (CSR style)
+    and sorted in time within each unit: the spikes of the i-th unit (in sorted unit id order) are
+    times[offsets[i]:offsets[i + 1]]. It is built once, with a single sort, from the flat times/labels arrays
+    that most sorting formats store, so that the spike train of a unit is a slice of the array and all the
+    spikes of the sorting are available in time order without copies.
+
+    Sorting extractors can build a SpikeVector when they are loaded and use it to implement
+    get_unit_spike_train. The spike trains of the SpikeVector are read-only views, so get_unit_spike_train
+    returns a copy of them (callers may modify the returned spike trains in place).
+    '''
+    def __init__(self, times, labels, unit_ids=None):
+        '''
+        Parameters
+        ----------
+        times: array_like
+            The spike times (in frames) of all the spikes
+        labels: array_like
+            The unit id of each spike
+        unit_ids: array_like
+            If not None, only the spikes of these units are stored
+        '''
+        times = np.asarray(times).ravel()
+        labels = np.asarray(labels).ravel()
+        if len(times) != len(labels):
+            raise ValueError("times and labels must have same length")
+        indices = None
+        if unit_ids is not None:
+            keep = np.isin(labels, unit_ids)
+            if not np.all(keep):
+                indices = np.where(keep)[0]
+                times = times[indices]
+                labels = labels[indices]
+        time_sorted = len(times) < 2 or bool(np.all(times[1:] >= times[:-1]))
+        if time_sorted:
+            # a stable sort by label keeps the spikes of each unit in time order
+            order = np.argsort(labels, kind='stable')
+            self._all_times = times.view()
+            self._all_labels = labels.view()
+        else:
+            order = np.lexsort((times, labels))
+            time_order = np.argsort(times, kind='stable')
+            self._all_times = times[time_order]
+            self._all_labels = labels[time_order]
+        sorted_labels = labels[order]
+        self._unit_ids, self._offsets = _get_unit_offsets(sorted_labels)
+        self._unit_index = {unit_id: i for i, unit_id in enumerate(self._unit_ids.tolist())}
+        self._times = times[order]
+        self._order = order if indices is None else indices[order]
+        for array in (self._times, self._all_times, self._all_labels, self._order):
+            array.flags.writeable = False
+
+    @property
+    def unit_ids(self):
+        return self._unit_ids
+
+    @property
+    def times(self):
+        '''The spike times grouped by unit (in sorted unit id order) and sorted in time within each unit.'''
+        return self._times
+
+    @property
+    def offsets(self):
+        '''The start of the spikes of each unit in times (len(unit_ids) + 1 values).'''
+        return self._offsets
+
+    @property
+    def order(self):
+        '''The index of each spike of times in the original times/labels arrays.'''
+        return self._order
+
+    def get_num_spikes(self, unit_id):
+        i = self._unit_index.get(unit_id)
+        if i is None:
+            return 0
+        return int(self._offsets[i + 1] - self._offsets[i])
+
+    def get_unit_spike_train(self, unit_id, start_frame=None, end_frame=None):
+        '''Returns the spike times of a unit (a read-only view), or an empty array if the unit has no spikes.'''
+        start, end = self._get_unit_bounds(unit_id, start_frame, end_frame)
+        return self._times[start:end]
+
+    def get_unit_indices(self, unit_id, start_frame=None, end_frame=None):
+        '''Returns the indices of the spikes of a unit in the original times/labels arrays.'''
+        start, end = self._get_unit_bounds(unit_id, start_frame, end_frame)
+        return self._order[start:end]
+
+    def get_all_spikes(self, unit_ids=None, start_frame=None, end_frame=None):
+        '''Returns the times and labels of the spikes of the given units (by default all units) within
+        [start_frame, end_frame), sorted in time. Without unit_ids, the returned arrays are read-only views
+        (of the original arrays, if the original times were already sorted).'''
+        start, end = get_spike_window(self._all_times, start_frame, end_frame)
+        times = self._all_times[start:end]
+        labels = self._all_labels[start:end]
+        if unit_ids is not None:
+            # no need to filter if all the units with spikes are requested
+            if not np.all(np.isin(self._unit_ids, unit_ids)):
+                mask = np.isin(labels, unit_ids)
+                times = times[mask]
+                labels = labels[mask]
+        return times, labels
+
+    def get_unit_spike_window(self, unit_id, start_frame=None, end_frame=None):
+        '''Returns the (start, end) indices of the spikes of a unit within [start_frame, end_frame) in its
+        spike train.'''
+        i = self._unit_index.get(unit_id)
+        if i is None:
+            return 0, 0
+        return get_spike_window(self._times[self._offsets[i]:self._offsets[i + 1]], start_frame, end_frame)
+
+    def _get_unit_bounds(self, unit_id, start_frame, end_frame):
+        i = self._unit_index.get(unit_id)
+        if i is None:
+            return 0, 0
+        start, end = self.get_unit_spike_window(unit_id, start_frame, end_frame)
+        return self._offsets[i] + start, self._offsets[i] + end
+
+
+def get_spike_window(times, start_frame=None, end_frame=None):
+    '''Returns the (start, end) indices of the spikes within [start_frame, end_frame) of a sorted spike train,
+    found by binary search, so that times[start:end] are the spikes in the window.
+
+    Parameters
+    ----------
+    times: numpy.ndarray
+        The sorted spike train
+    start_frame: int
+        The frame above which a spike is selected (inclusive). If None, the window starts at the first spike.
+    end_frame: int
+        The frame below which a spike is selected (exclusive). If None, the window ends at the last spike.
+
+    Returns
+    -------
+    start: int
+        The index of the first spike in the window
+    end: int
+        The index after the last spike in the window
+    '''
+    start = 0
+    end = len(times)
+    if start_frame is not None:
+        start = int(np.searchsorted(times, start_frame, side='left'))
+    if end_frame is not None:
+        end = int(np.searchsorted(times, end_frame, side='left'))
+    return start, max(start, end)
+
+
+def _get_unit_offsets(sorted_labels):
+    if len(sorted_labels) == 0:
+        return sorted_labels[:0].copy(), np.zeros(1, dtype='int64')
+    boundaries = np.where(sorted_labels[1:] != sorted_labels[:-1])[0] + 1
+    offsets = np.concatenate(([0], boundaries, [len(sorted_labels)])).astype('int64')
+    unit_ids = sorted_labels[offsets[:-1]]
+    return unit_ids, offsets
+
+
+def merge_spike_streams(streams):
+    '''Merges streams of spikes into a single stream sorted in time. Each stream yields (times, labels) blocks,
+    with the times sorted within and across its blocks. The merged stream yields (times, labels) blocks sorted
+    in time; each block contains at most one block of each stream.
+
+    Parameters
+    ----------
+    streams: list
+        The list of iterators of (times, labels) blocks
+
+    Returns
+    -------
+    merged_stream: generator
+        The generator of merged (times, labels) blocks
+    '''
+    buffers = {}
+    # heap of (last time of the buffered block, stream index)
+    heap = []
+    for i, stream in enumerate(streams):
+        _refill_stream_buffer(i, stream, buffers, heap)
+    while len(heap) > 0:
+        threshold = heap[0][0]
+        # all the buffered spikes up to threshold can be emitted, since the following blocks of each
+        # stream start after the end of its buffered block
+        times_list = []
+        labels_list = []
+        for i in list(buffers.keys()):
+            times, labels = buffers[i]
+            n = int(np.searchsorted(times, threshold, side='right'))
+            if n > 0:
+                times_list.append(times[:n])
+                labels_list.append(labels[:n])
+                buffers[i] = (times[n:], labels[n:])
+        # the streams with all their buffered spikes emitted are refilled
+        exhausted = []
+        while len(heap) > 0 and heap[0][0] <= threshold:
+            exhausted.append(heapq.heappop(heap)[1])
+        for i in exhausted:
+            _refill_stream_buffer(i, streams[i], buffers, heap)
+        if len(times_list) == 1:
+            yield times_list[0], labels_list[0]
+        else:
+            times = np.concatenate(times_list)
+            labels = np.concatenate(labels_list)
+            order = np.argsort(times, kind='stable')
+            yield times[order], labels[order]
+
+
+def _refill_stream_buffer(i, stream, buffers, heap):
+    buffers.pop(i, None)
+    for times, labels in stream:
+        if len(times) > 0:
+            buffers[i] = (times, labels)
+            heapq.heappush(heap, (times[-1], i))
+            return
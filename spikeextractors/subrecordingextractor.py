@@ -1,8 +1,13 @@
 from .recordingextractor import RecordingExtractor
+from .propertytable import _stack_values
+from .extraction_tools import _get_recording_traces
 import numpy as np
 
 
 # Encapsulates a sub-dataset
+# Nested sub-recordings are flattened: the traces are read directly from the root recording of the chain,
+# with a single frame offset and a single channel id mapping. The channel properties are read from the parent
+# recording when they are requested, unless they are set or cleared on the sub-recording.
 
 class SubRecordingExtractor(RecordingExtractor):
     def __init__(self, parent_recording, *, channel_ids=None, renamed_channel_ids=None, start_frame=None,
@@ -23,20 +28,52 @@ class SubRecordingExtractor(RecordingExtractor):
         self._original_channel_id_lookup = {}
         for i in range(len(self._channel_ids)):
             self._original_channel_id_lookup[self._renamed_channel_ids[i]] = self._channel_ids[i]
+        # the recording from which the traces are read, with the frame offset and channel ids in it
+        if type(parent_recording) is SubRecordingExtractor:
+            self._root_recording = parent_recording._root_recording
+            self._root_start_frame = parent_recording._root_start_frame + self._start_frame
+            self._root_channel_id_lookup = {
+                channel_id: parent_recording._root_channel_id_lookup[original_channel_id]
+                for channel_id, original_channel_id in self._original_channel_id_lookup.items()}
+        else:
+            self._root_recording = parent_recording
+            self._root_start_frame = self._start_frame
+            self._root_channel_id_lookup = dict(self._original_channel_id_lookup)
+        self._root_channel_ids = [self._root_channel_id_lookup[channel_id] for channel_id in self._renamed_channel_ids]
+        # (channel_id, property_name) of the parent properties cleared on the sub-recording
+        self._cleared_channel_properties = set()
         RecordingExtractor.__init__(self)
-        self.copy_channel_properties(parent_recording, channel_ids=self._renamed_channel_ids)
 
-    def get_traces(self, channel_ids=None, start_frame=None, end_frame=None):
+    @property
+    def _default_return_scaled(self):
+        return self._root_recording._default_return_scaled
+
+    def get_traces(self, channel_ids=None, start_frame=None, end_frame=None, return_scaled=None, **kwargs):
+        root_channel_ids, sf, ef = self._get_root_traces_args(channel_ids, start_frame, end_frame)
+        # extra arguments (e.g. out, return_view) are passed to the root recording
+        return _get_recording_traces(self._root_recording, return_scaled, channel_ids=root_channel_ids,
+                                     start_frame=sf, end_frame=ef, **kwargs)
+
+    def get_traces_raw(self, channel_ids=None, start_frame=None, end_frame=None, **kwargs):
+        root_channel_ids, sf, ef = self._get_root_traces_args(channel_ids, start_frame, end_frame)
+        return self._root_recording.get_traces_raw(channel_ids=root_channel_ids, start_frame=sf, end_frame=ef,
+                                                   **kwargs)
+
+    def get_channel_scaling(self, channel_ids=None):
+        if channel_ids is None:
+            return self._root_recording.get_channel_scaling(channel_ids=self._root_channel_ids)
+        return self._root_recording.get_channel_scaling(channel_ids=self._get_root_channel_ids(channel_ids))
+
+    def _get_root_traces_args(self, channel_ids, start_frame, end_frame):
         if start_frame is None:
             start_frame = 0
         if end_frame is None:
             end_frame = self.get_num_frames()
         if channel_ids is None:
-            channel_ids = self.get_channel_ids()
-        sf = self._start_frame + start_frame
-        ef = self._start_frame + end_frame
-        original_ch_ids = self.get_original_channel_ids(channel_ids)
-        return self._parent_recording.get_traces(channel_ids=original_ch_ids, start_frame=sf, end_frame=ef)
+            root_channel_ids = self._root_channel_ids
+        else:
+            root_channel_ids = self._get_root_channel_ids(channel_ids)
+        return root_channel_ids, self._root_start_frame + start_frame, self._root_start_frame + end_frame
 
     def get_channel_ids(self):
         return self._renamed_channel_ids
@@ -49,53 +86,100 @@ class SubRecordingExtractor(RecordingExtractor):
         return end_frame - self._start_frame
 
     def get_sampling_frequency(self):
-        return self._parent_recording.get_sampling_frequency()
+        return self._root_recording.get_sampling_frequency()
 
     def frame_to_time(self, frame):
-        frame2 = frame + self._start_frame
-        time1 = self._parent_recording.frame_to_time(frame2)
-        time2 = time1 - self._parent_recording.frame_to_time(self._start_frame)
+        frame2 = frame + self._root_start_frame
+        time1 = self._root_recording.frame_to_time(frame2)
+        time2 = time1 - self._root_recording.frame_to_time(self._root_start_frame)
         return time2
 
     def time_to_frame(self, time):
-        time2 = time + self._parent_recording.frame_to_time(self._start_frame)
-        frame1 = self._parent_recording.time_to_frame(time2)
-        frame2 = frame1 - self._start_frame
+        time2 = time + self._root_recording.frame_to_time(self._root_start_frame)
+        frame1 = self._root_recording.time_to_frame(time2)
+        frame2 = frame1 - self._root_start_frame
         return frame2
 
-    def get_snippets(self, *, reference_frames, snippet_len, channel_ids=None):
+    def get_timestamps(self):
+        timestamps = self._root_recording.get_timestamps()
+        if timestamps is None:
+            return None
+        # relative to the first frame, as frame_to_time
+        return timestamps[self._root_start_frame:self._root_start_frame + self.get_num_frames()] - \
+            self._root_recording.frame_to_time(self._root_start_frame)
+
+    def get_snippets(self, *, reference_frames, snippet_len, channel_ids=None, chunk_size=30000):
+        if channel_ids is None:
+            root_channel_ids = self._root_channel_ids
+        else:
+            root_channel_ids = self._get_root_channel_ids(channel_ids)
+        reference_frames_shift = self._root_start_frame + np.array(reference_frames)
+        return self._root_recording.get_snippets(reference_frames=reference_frames_shift, snippet_len=snippet_len,
+                                                 channel_ids=root_channel_ids, chunk_size=chunk_size)
+
+    def get_channel_property(self, channel_id, property_name):
+        if self._is_parent_property(channel_id, property_name):
+            return self._parent_recording.get_channel_property(self.get_original_channel_ids(channel_id),
+                                                               property_name)
+        return RecordingExtractor.get_channel_property(self, channel_id, property_name)
+
+    def get_channel_properties(self, property_name, channel_ids=None):
+        if channel_ids is None:
+            channel_ids = self.get_channel_ids()
+        if not isinstance(property_name, str):
+            raise TypeError(str(property_name) + " must be a string")
+        rows = self._get_channel_rows(channel_ids)
+        is_set = self._channel_properties.is_set(property_name, rows)
+        if np.all(is_set):
+            return self._channel_properties.get_values(property_name, rows)
+        positions = np.where(~is_set)[0].tolist()
+        for i in positions:
+            if (channel_ids[i], property_name) in self._cleared_channel_properties:
+                raise RuntimeError(str(property_name) + " has not been added to channel " + str(channel_ids[i]))
+        parent_values = self._parent_recording.get_channel_properties(
+            property_name, channel_ids=self.get_original_channel_ids([channel_ids[i] for i in positions]))
+        if len(positions) == len(channel_ids):
+            return parent_values
+        values = [self._channel_properties.get_value(property_name, row) if set_value else None
+                  for row, set_value in zip(rows, is_set)]
+        for i, value in zip(positions, parent_values):
+            values[i] = value
+        return _stack_values(values)
+
+    def get_channel_property_names(self, channel_id):
+        property_names = RecordingExtractor.get_channel_property_names(self, channel_id)
+        parent_property_names = self._parent_recording.get_channel_property_names(
+            self.get_original_channel_ids(channel_id))
+        return sorted(set(property_names) | set(name for name in parent_property_names
+                                                if (channel_id, name) not in self._cleared_channel_properties))
+
+    def get_shared_channel_property_names(self, channel_ids=None):
         if channel_ids is None:
             channel_ids = self.get_channel_ids()
-        reference_frames_shift = self._start_frame + np.array(reference_frames)
-        original_ch_ids = []
-        original_ch_ids = self.get_original_channel_ids(channel_ids)
-        return self._parent_recording.get_snippets(reference_frames=reference_frames_shift, snippet_len=snippet_len,
-                                                   channel_ids=original_ch_ids)
+        property_names = None
+        for channel_id in channel_ids:
+            names = self.get_channel_property_names(channel_id)
+            property_names = set(names) if property_names is None else property_names & set(names)
+        return sorted(property_names) if property_names is not None else []
+
+    def clear_channel_property(self, channel_id, property_name):
+        RecordingExtractor.clear_channel_property(self, channel_id, property_name)
+        self._cleared_channel_properties.add((channel_id, property_name))
 
     def copy_channel_properties(self, recording, channel_ids=None):
         if channel_ids is None:
             channel_ids = self.get_channel_ids()
-        if isinstance(channel_ids, int):
-            recording_ch_id = channel_ids
-            if recording is self._parent_recording:
-                recording_ch_id = self.get_original_channel_ids(channel_ids)
-            curr_property_names = recording.get_channel_property_names(channel_id=recording_ch_id)
-            for curr_property_name in curr_property_names:
-                value = recording.get_channel_property(channel_id=recording_ch_id, property_name=curr_property_name)
-                self.set_channel_property(channel_id=channel_ids, property_name=curr_property_name, value=value)
-        else:
-            for channel_id in channel_ids:
-                recording_ch_id = channel_id
-                if recording is self._parent_recording:
-                    recording_ch_id = self.get_original_channel_ids(channel_id)
-                curr_property_names = recording.get_channel_property_names(channel_id=recording_ch_id)
-                for curr_property_name in curr_property_names:
-                    value = recording.get_channel_property(channel_id=recording_ch_id, property_name=curr_property_name)
-                    self.set_channel_property(channel_id=channel_id, property_name=curr_property_name, value=value)
+        if isinstance(channel_ids, (int, np.integer)):
+            channel_ids = [channel_ids]
+        channel_ids = list(channel_ids)
+        recording_channel_ids = channel_ids
+        if recording is self._parent_recording:
+            recording_channel_ids = self.get_original_channel_ids(channel_ids)
+        self._copy_channel_properties(recording, channel_ids, recording_channel_ids)
 
     def get_original_channel_ids(self, channel_ids):
         if isinstance(channel_ids, (int, np.integer)):
-            if channel_ids in self.get_channel_ids():
+            if channel_ids in self._original_channel_id_lookup:
                 original_ch_ids = self._original_channel_id_lookup[channel_ids]
             else:
                 raise ValueError("Non-valid channel_id")
@@ -103,7 +187,7 @@ class SubRecordingExtractor(RecordingExtractor):
             original_ch_ids = []
             for channel_id in channel_ids:
                 if isinstance(channel_id, (int, np.integer)):
-                    if channel_id in self.get_channel_ids():
+                    if channel_id in self._original_channel_id_lookup:
                         original_ch_id = self._original_channel_id_lookup[channel_id]
                         original_ch_ids.append(original_ch_id)
                     else:
@@ -111,3 +195,21 @@ class SubRecordingExtractor(RecordingExtractor):
                 else:
                     raise ValueError("channel_id must be an int")
         return original_ch_ids
+
+    def _get_root_channel_ids(self, channel_ids):
+        # the ids in the root recording of the given channels
+        try:
+            return [self._root_channel_id_lookup[channel_id] for channel_id in channel_ids]
+        except (KeyError, TypeError):
+            # invalid ids raise the errors of get_original_channel_ids
+            self.get_original_channel_ids(channel_ids)
+            raise
+
+    def _is_parent_property(self, channel_id, property_name):
+        # whether the property is read from the parent recording
+        row = self._get_channel_row(channel_id)
+        if self._channel_properties.has_value(property_name, row) or \
+                (channel_id, property_name) in self._cleared_channel_properties:
+            return False
+        return property_name in self._parent_recording.get_channel_property_names(
+            self.get_original_channel_ids(channel_id))
@@ -3,6 +3,8 @@ import numpy as np
 
 
 # Encapsulates a subset of a spike sorted data file
+# The unit properties and spike features are read from the parent sorting when they are requested (and
+# windowed by it), unless they are set or cleared on the subset.
 
 class SubSortingExtractor(SortingExtractor):
 
@@ -24,56 +26,118 @@ class SubSortingExtractor(SortingExtractor):
         self._original_unit_id_lookup = {}
         for i in range(len(self._unit_ids)):
             self._original_unit_id_lookup[self._renamed_unit_ids[i]] = self._unit_ids[i]
-        self.copy_unit_properties(parent_sorting, unit_ids=self._renamed_unit_ids)
-        self.copy_unit_spike_features(parent_sorting, unit_ids=self._renamed_unit_ids, start_frame=start_frame, end_frame=end_frame)
+        # (unit_id, name) of the parent properties and features cleared on the subset
+        self._cleared_unit_properties = set()
+        self._cleared_unit_spike_features = set()
 
     def get_unit_ids(self):
         return list(self._renamed_unit_ids)
 
     def get_unit_spike_train(self, unit_id, start_frame=None, end_frame=None):
-        if start_frame is None:
-            start_frame = 0
-        if end_frame is None:
-            end_frame = np.Inf
-        if (isinstance(unit_id, (int, np.integer))):
-            if (unit_id in self.get_unit_ids()):
-                original_unit_id = self._original_unit_id_lookup[unit_id]
-            else:
-                raise ValueError("Non-valid unit_id")
-        else:
-            raise ValueError("unit_id must be an int")
-        sf = self._start_frame + start_frame
-        ef = self._start_frame + end_frame
-        if sf < self._start_frame:
-            sf = self._start_frame
-        if ef > self._end_frame:
-            ef = self._end_frame
+        original_unit_id = self.get_original_unit_ids(unit_id)
+        sf, ef = self._get_parent_frames(start_frame, end_frame)
         return self._parent_sorting.get_unit_spike_train(unit_id=original_unit_id, start_frame=sf,
                                                          end_frame=ef) - self._start_frame
 
     def get_sampling_frequency(self):
         return self._parent_sorting.get_sampling_frequency()
 
+    def get_unit_property(self, unit_id, property_name):
+        if self._is_parent_property(unit_id, property_name):
+            return self._parent_sorting.get_unit_property(self.get_original_unit_ids(unit_id), property_name)
+        return SortingExtractor.get_unit_property(self, unit_id, property_name)
+
+    def get_units_property(self, *, unit_ids=None, property_name):
+        if unit_ids is None:
+            unit_ids = self.get_unit_ids()
+        if not isinstance(property_name, str):
+            raise ValueError(str(property_name) + " must be a string")
+        rows = self._get_unit_rows(unit_ids, self._unit_properties)
+        is_set = self._unit_properties.is_set(property_name, rows)
+        values = [self._unit_properties.get_value(property_name, row) if set_value else None
+                  for row, set_value in zip(rows, is_set)]
+        positions = np.where(~is_set)[0].tolist()
+        for i in positions:
+            if (unit_ids[i], property_name) in self._cleared_unit_properties:
+                raise ValueError(str(property_name) + " has not been added to unit " + str(unit_ids[i]))
+        if len(positions) > 0:
+            parent_values = self._parent_sorting.get_units_property(
+                unit_ids=self.get_original_unit_ids([unit_ids[i] for i in positions]), property_name=property_name)
+            for i, value in zip(positions, parent_values):
+                values[i] = value
+        return values
+
+    def get_unit_property_names(self, unit_id):
+        property_names = SortingExtractor.get_unit_property_names(self, unit_id)
+        parent_property_names = self._parent_sorting.get_unit_property_names(self.get_original_unit_ids(unit_id))
+        return sorted(set(property_names) | set(name for name in parent_property_names
+                                                if (unit_id, name) not in self._cleared_unit_properties))
+
+    def get_shared_unit_property_names(self, unit_ids=None):
+        if unit_ids is None:
+            unit_ids = self.get_unit_ids()
+        property_names = None
+        for unit_id in unit_ids:
+            names = self.get_unit_property_names(unit_id)
+            property_names = set(names) if property_names is None else property_names & set(names)
+        return sorted(property_names) if property_names is not None else []
+
+    def clear_unit_property(self, unit_id, property_name):
+        SortingExtractor.clear_unit_property(self, unit_id, property_name)
+        self._cleared_unit_properties.add((unit_id, property_name))
+
+    def get_unit_spike_features(self, unit_id, feature_name, start_frame=None, end_frame=None):
+        if self._is_parent_spike_feature(unit_id, feature_name):
+            sf, ef = self._get_parent_frames(start_frame, end_frame)
+            return self._parent_sorting.get_unit_spike_features(self.get_original_unit_ids(unit_id), feature_name,
+                                                                start_frame=sf, end_frame=ef)
+        return SortingExtractor.get_unit_spike_features(self, unit_id, feature_name, start_frame=start_frame,
+                                                        end_frame=end_frame)
+
+    def get_units_spike_features(self, *, unit_ids=None, feature_name, concatenate=False):
+        if unit_ids is None:
+            unit_ids = self.get_unit_ids()
+        if not isinstance(feature_name, str):
+            raise ValueError(str(feature_name) + " must be a string")
+        rows = self._get_unit_rows(unit_ids, self._unit_features)
+        is_set = self._unit_features.is_set(feature_name, rows)
+        if np.all(is_set):
+            return SortingExtractor.get_units_spike_features(self, unit_ids=unit_ids, feature_name=feature_name,
+                                                             concatenate=concatenate)
+        values = [self.get_unit_spike_features(unit_id, feature_name) for unit_id in unit_ids]
+        if concatenate:
+            return np.concatenate(values) if len(values) > 0 else np.array([])
+        return values
+
+    def get_unit_spike_feature_names(self, unit_id):
+        feature_names = SortingExtractor.get_unit_spike_feature_names(self, unit_id)
+        parent_feature_names = self._parent_sorting.get_unit_spike_feature_names(self.get_original_unit_ids(unit_id))
+        return sorted(set(feature_names) | set(name for name in parent_feature_names
+                                               if (unit_id, name) not in self._cleared_unit_spike_features))
+
+    def get_shared_unit_spike_feature_names(self, unit_ids=None):
+        if unit_ids is None:
+            unit_ids = self.get_unit_ids()
+        feature_names = None
+        for unit_id in unit_ids:
+            names = self.get_unit_spike_feature_names(unit_id)
+            feature_names = set(names) if feature_names is None else feature_names & set(names)
+        return sorted(feature_names) if feature_names is not None else []
+
+    def clear_unit_spike_features(self, unit_id, feature_name):
+        SortingExtractor.clear_unit_spike_features(self, unit_id, feature_name)
+        self._cleared_unit_spike_features.add((unit_id, feature_name))
+
     def copy_unit_properties(self, sorting, unit_ids=None):
         if unit_ids is None:
             unit_ids = self.get_unit_ids()
-        if isinstance(unit_ids, int):
-            sorting_unit_id = unit_ids
-            if sorting is self._parent_sorting:
-                sorting_unit_id = self.get_original_unit_ids(unit_ids)
-            curr_property_names = sorting.get_unit_property_names(unit_id=sorting_unit_id)
-            for curr_property_name in curr_property_names:
-                value = sorting.get_unit_property(unit_id=sorting_unit_id, property_name=curr_property_name)
-                self.set_unit_property(unit_id=unit_ids, property_name=curr_property_name, value=value)
-        else:
-            for unit_id in unit_ids:
-                sorting_unit_id = unit_id
-                if sorting is self._parent_sorting:
-                    sorting_unit_id = self.get_original_unit_ids(unit_id)
-                curr_property_names = sorting.get_unit_property_names(unit_id=sorting_unit_id)
-                for curr_property_name in curr_property_names:
-                    value = sorting.get_unit_property(unit_id=sorting_unit_id, property_name=curr_property_name)
-                    self.set_unit_property(unit_id=unit_id, property_name=curr_property_name, value=value)
+        if isinstance(unit_ids, (int, np.integer)):
+            unit_ids = [unit_ids]
+        unit_ids = list(unit_ids)
+        sorting_unit_ids = unit_ids
+        if sorting is self._parent_sorting:
+            sorting_unit_ids = self.get_original_unit_ids(unit_ids)
+        self._copy_unit_properties(sorting, unit_ids, sorting_unit_ids)
 
     def copy_unit_spike_features(self, sorting, unit_ids=None, start_frame=None, end_frame=None):
         if unit_ids is None:
@@ -98,7 +162,7 @@ class SubSortingExtractor(SortingExtractor):
 
     def get_original_unit_ids(self, unit_ids):
         if isinstance(unit_ids, (int, np.integer)):
-            if unit_ids in self.get_unit_ids():
+            if unit_ids in self._original_unit_id_lookup:
                 original_unit_ids = self._original_unit_id_lookup[unit_ids]
             else:
                 raise ValueError("Non-valid unit_id")
@@ -106,7 +170,7 @@ class SubSortingExtractor(SortingExtractor):
             original_unit_ids = []
             for unit_id in unit_ids:
                 if isinstance(unit_id, (int, np.integer)):
-                    if unit_id in self.get_unit_ids():
+                    if unit_id in self._original_unit_id_lookup:
                         original_unit_id = self._original_unit_id_lookup[unit_id]
                         original_unit_ids.append(original_unit_id)
                     else:
@@ -114,3 +178,31 @@ class SubSortingExtractor(SortingExtractor):
                 else:
                     raise ValueError("unit_id must be an int")
         return original_unit_ids
+
+    def _get_parent_frames(self, start_frame=None, end_frame=None):
+        # the window of the parent sorting corresponding to [start_frame, end_frame) (end None if unbounded).
+        # The start is always given, so that the spikes of the parent before its start frame are excluded.
+        sf = self._start_frame
+        ef = self._end_frame
+        if start_frame is not None:
+            sf = max(sf, self._start_frame + start_frame)
+        if end_frame is not None:
+            ef = min(ef, self._start_frame + end_frame)
+        return sf, (ef if ef != float("inf") else None)
+
+    def _is_parent_property(self, unit_id, property_name):
+        # whether the property is read from the parent sorting
+        row = self._get_unit_row(unit_id, self._unit_properties)
+        if self._unit_properties.has_value(property_name, row) or \
+                (unit_id, property_name) in self._cleared_unit_properties:
+            return False
+        return property_name in self._parent_sorting.get_unit_property_names(self.get_original_unit_ids(unit_id))
+
+    def _is_parent_spike_feature(self, unit_id, feature_name):
+        # whether the spike feature is read from the parent sorting
+        row = self._get_unit_row(unit_id, self._unit_features)
+        if self._unit_features.has_value(feature_name, row) or \
+                (unit_id, feature_name) in self._cleared_unit_spike_features:
+            return False
+        return feature_name in self._parent_sorting.get_unit_spike_feature_names(
+            self.get_original_unit_ids(unit_id))
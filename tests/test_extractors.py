@@ -4,6 +4,7 @@ from pathlib import Path
 import unittest
 import tempfile
 import shutil
+import pickle
 import spikeextractors as se
 
 
@@ -31,7 +32,7 @@ class TestExtractors(unittest.TestCase):
         RX3 = se.NumpyRecordingExtractor(timeseries=X, sampling_frequency=sampling_frequency, geom=geom)
         SX = se.NumpySortingExtractor()
         spike_times = [200, 300, 400]
-        train1 = np.sort(np.rint(np.random.uniform(0, num_frames, spike_times[0])).astype(int))
+        train1 = np.sort(np.rint(np.random.uniform(0, num_frames - 1, spike_times[0])).astype(int))
         SX.add_unit(unit_id=1, times=train1)
         SX.add_unit(unit_id=2, times=np.sort(np.random.uniform(0, num_frames, spike_times[1])))
         SX.add_unit(unit_id=3, times=np.sort(np.random.uniform(0, num_frames, spike_times[2])))
@@ -39,7 +40,7 @@ class TestExtractors(unittest.TestCase):
         SX.set_sampling_frequency(sampling_frequency)
         SX2 = se.NumpySortingExtractor()
         spike_times2 = [100, 150, 450]
-        train2 = np.rint(np.random.uniform(0, num_frames, spike_times2[0])).astype(int)
+        train2 = np.rint(np.random.uniform(0, num_frames - 1, spike_times2[0])).astype(int)
         SX2.add_unit(unit_id=3, times=train2)
         SX2.add_unit(unit_id=4, times=np.random.uniform(0, num_frames, spike_times2[1]))
         SX2.add_unit(unit_id=5, times=np.random.uniform(0, num_frames, spike_times2[2]))
@@ -105,6 +106,31 @@ class TestExtractors(unittest.TestCase):
 
         self.assertTrue(np.array_equal(sub_extractor_full.get_unit_spike_features(0, 'dummy'), self.SX3.get_unit_spike_features(0, 'dummy')))
         self.assertTrue(np.array_equal(sub_extractor_partial.get_unit_spike_features(0, 'dummy'), self.SX3.get_unit_spike_features(0, 'dummy', start_frame=20, end_frame=46)))
+        self.assertTrue(np.array_equal(sub_extractor_partial.get_unit_spike_features(0, 'dummy', start_frame=10),
+                                       self.example_info['features3'][3:6]))
+        self.assertTrue(np.array_equal(sub_extractor_partial.get_units_spike_features(feature_name='dummy')[0],
+                                       self.example_info['features3'][1:6]))
+        sub_extractor_partial.set_unit_spike_features(0, 'dummy', np.zeros(5))
+        self.assertTrue(np.array_equal(sub_extractor_partial.get_unit_spike_features(0, 'dummy'), np.zeros(5)))
+        sub_extractor_full.clear_unit_spike_features(0, 'dummy')
+        self.assertEqual(sub_extractor_full.get_unit_spike_feature_names(0), [])
+        self.assertTrue(np.array_equal(self.SX3.get_unit_spike_features(0, 'dummy'), self.example_info['features3']))
+        sub_extractor_renamed = se.SubSortingExtractor(self.SX2, unit_ids=[4, 5], renamed_unit_ids=[0, 1])
+        self.assertEqual(sub_extractor_renamed.get_units_property(property_name='shared_unit_prop'), [1, 2])
+        self.assertEqual(sub_extractor_renamed.get_unit_property_names(0), ['shared_unit_prop', 'stability'])
+        self.assertEqual(sub_extractor_renamed.get_shared_unit_property_names(), ['shared_unit_prop'])
+        sub_extractor_renamed.clear_unit_property(0, 'stability')
+        self.assertRaises(ValueError, sub_extractor_renamed.get_unit_property, 0, 'stability')
+        self.assertEqual(self.SX2.get_unit_property(4, 'stability'), 80)
+        # the spikes of the parent before frame 0 are excluded, with their features
+        SX_negative = se.NumpySortingExtractor()
+        SX_negative.add_unit(unit_id=0, times=np.asarray([-5, -1, 3, 8]))
+        SX_negative.set_unit_spike_features(0, 'dummy', np.asarray([0, 1, 2, 3]))
+        sub_extractor_negative = se.SubSortingExtractor(SX_negative)
+        self.assertTrue(np.array_equal(sub_extractor_negative.get_unit_spike_train(0), [3, 8]))
+        self.assertTrue(np.array_equal(sub_extractor_negative.get_unit_spike_features(0, 'dummy'), [2, 3]))
+        self.assertTrue(np.array_equal(sub_extractor_negative.get_units_spike_features(feature_name='dummy')[0],
+                                       [2, 3]))
 
         self._check_recording_return_types(self.RX)
 
@@ -118,6 +144,186 @@ class TestExtractors(unittest.TestCase):
         del cache_extractor
         assert not Path('cache.dat').is_file()
 
+    def test_bindat_extractor(self):
+        X = self.RX.get_traces()
+        file_path = Path(self.test_dir) / 'uint.dat'
+        (X + 2 ** 15 + 1).astype('uint16').T.tofile(file_path)
+        RX_bin = se.BinDatRecordingExtractor(file_path, sampling_frequency=self.RX.get_sampling_frequency(),
+                                             numchan=self.RX.get_num_channels(), dtype='uint16', gain=0.5)
+        self.assertTrue(np.allclose(RX_bin.get_traces(), X * 0.5))
+        self.assertEqual(RX_bin.get_traces(start_frame=0, end_frame=10).dtype, np.float32)
+        # traces written in a reused buffer
+        out = np.empty((2, 1000), dtype='float32')
+        for start_frame in range(0, self.RX.get_num_frames(), 1000):
+            traces = RX_bin.get_traces(channel_ids=[1, 2], start_frame=start_frame, end_frame=start_frame + 1000,
+                                       out=out)
+            self.assertIs(traces, out)
+            self.assertTrue(np.allclose(out, X[1:3, start_frame:start_frame + 1000] * 0.5))
+        RX_sub = se.SubRecordingExtractor(RX_bin, channel_ids=[3, 1], start_frame=100)
+        RX_sub.get_traces(start_frame=0, end_frame=1000, out=out)
+        self.assertTrue(np.allclose(out, X[[3, 1], 100:1100] * 0.5))
+        # raw traces and scaling
+        raw = RX_bin.get_traces_raw(channel_ids=[1, 2, 3], start_frame=10, end_frame=20)
+        self.assertEqual(raw.dtype, np.uint16)
+        self.assertTrue(np.shares_memory(raw, RX_bin._timeseries))
+        self.assertTrue(np.array_equal(RX_bin.get_traces(channel_ids=[1, 2, 3], start_frame=10, end_frame=20,
+                                                         return_scaled=False), raw))
+        gains, offsets = RX_bin.get_channel_scaling(channel_ids=[1, 2, 3])
+        self.assertTrue(np.allclose(raw * gains[:, np.newaxis] + offsets[:, np.newaxis], X[1:, 10:20] * 0.5))
+        raw_sub = RX_sub.get_traces_raw(start_frame=0, end_frame=10)
+        self.assertEqual(raw_sub.dtype, np.uint16)
+        self.assertTrue(np.array_equal(RX_sub.get_traces(start_frame=0, end_frame=10, return_scaled=False), raw_sub))
+        gains, offsets = RX_sub.get_channel_scaling()
+        self.assertTrue(np.allclose(raw_sub * gains[:, np.newaxis] + offsets[:, np.newaxis], X[[3, 1], 100:110] * 0.5))
+        # extractors without scaling
+        self.assertTrue(np.array_equal(self.RX.get_traces_raw(start_frame=0, end_frame=10), X[:, :10]))
+        gains, offsets = self.RX.get_channel_scaling()
+        self.assertTrue(np.all(gains == 1) and np.all(offsets == 0))
+        self.assertTrue(np.array_equal(self.RX.get_traces(start_frame=0, end_frame=10, return_scaled=False),
+                                       X[:, :10]))
+        # return_scaled, raw traces and scaling are forwarded by the wrapping extractors
+        RX_wrappers = [se.concatenate_recordings_by_time([RX_bin, RX_bin]),
+                       se.concatenate_recordings_by_channel([RX_bin, self.RX]),
+                       se.ChunkCacheRecordingExtractor(RX_bin, block_size=1000),
+                       se.CacheRecordingExtractor(RX_bin)]
+        for RX_wrapper in RX_wrappers:
+            channel_ids = RX_wrapper.get_channel_ids()[-6:]
+            raw = RX_wrapper.get_traces(channel_ids=channel_ids, start_frame=10, end_frame=1500, return_scaled=False)
+            self.assertTrue(np.array_equal(RX_wrapper.get_traces_raw(channel_ids=channel_ids, start_frame=10,
+                                                                     end_frame=1500), raw))
+            gains, offsets = RX_wrapper.get_channel_scaling(channel_ids=channel_ids)
+            self.assertTrue(np.allclose(raw * gains[:, np.newaxis] + offsets[:, np.newaxis],
+                                        RX_wrapper.get_traces(channel_ids=channel_ids, start_frame=10,
+                                                              end_frame=1500)))
+        self.assertEqual(RX_wrappers[0].get_traces_raw(start_frame=0, end_frame=10).dtype, np.uint16)
+        del RX_wrappers, RX_wrapper
+        # views of the file
+        file_path = Path(self.test_dir) / 'int.dat'
+        X.astype('int16').T.tofile(file_path)
+        RX_bin = se.BinDatRecordingExtractor(file_path, sampling_frequency=self.RX.get_sampling_frequency(),
+                                             numchan=self.RX.get_num_channels(), dtype='int16')
+        view = RX_bin.get_traces(channel_ids=[0, 1], start_frame=10, end_frame=20, return_view=True)
+        self.assertTrue(np.shares_memory(view, RX_bin._timeseries))
+        self.assertTrue(np.array_equal(view, X[:2, 10:20]))
+        self.assertFalse(np.shares_memory(RX_bin.get_traces(channel_ids=[0, 1]), RX_bin._timeseries))
+        # the memmap is not pickled and the file is written in parallel from the pickled extractor
+        self.assertTrue(len(pickle.dumps(RX_bin)) < X.astype('int16').nbytes // 10)
+        RX_bin_pickled = pickle.loads(pickle.dumps(RX_bin))
+        self.assertTrue(np.array_equal(RX_bin_pickled.get_traces(), X))
+        save_path = Path(self.test_dir) / 'int_parallel.dat'
+        RX_bin.write_to_binary_dat_format(save_path, dtype='int16', chunk_size=999, n_jobs=2)
+        RX_parallel = se.BinDatRecordingExtractor(save_path, sampling_frequency=self.RX.get_sampling_frequency(),
+                                                  numchan=self.RX.get_num_channels(), dtype='int16')
+        self.assertTrue(np.array_equal(RX_parallel.get_traces(), X))
+        del view, RX_bin, RX_sub, RX_bin_pickled, RX_parallel
+
+    def test_lazy_cache_extractor(self):
+        cache_extractor = se.CacheRecordingExtractor(self.RX, lazy=True, chunk_size=1000)
+        self.assertTrue(np.array_equal(cache_extractor.get_traces(channel_ids=[1, 2], start_frame=1500, end_frame=2500),
+                                       self.RX.get_traces(channel_ids=[1, 2], start_frame=1500, end_frame=2500)))
+        self._check_recording_return_types(cache_extractor)
+        self._check_recordings_equal(self.RX, cache_extractor)
+        # pickled copies (e.g. sent to worker processes) do not remove the cache file
+        cache_pickled = pickle.loads(pickle.dumps(cache_extractor))
+        self._check_recordings_equal(self.RX, cache_pickled)
+        del cache_pickled
+        self.assertTrue(Path(cache_extractor.get_filename()).is_file())
+        del cache_extractor
+
+        cache_extractor = se.CacheRecordingExtractor(self.RX, lazy=True, warm=True, chunk_size=1000)
+        self._check_recordings_equal(self.RX, cache_extractor)
+        save_path = Path(self.test_dir) / 'lazy_cache.dat'
+        cache_extractor.save_to_file(save_path)
+        data = np.memmap(str(save_path), dtype=cache_extractor.get_traces(end_frame=1).dtype, mode='r').reshape(
+            (-1, self.RX.get_num_channels())).T
+        self.assertTrue(np.array_equal(data, self.RX.get_traces()))
+        del data
+
+        # recordings without frames cannot be memory-mapped
+        RX_empty = se.NumpyRecordingExtractor(np.zeros((4, 0)), sampling_frequency=30000)
+        for lazy in [True, False]:
+            cache_extractor = se.CacheRecordingExtractor(RX_empty, lazy=lazy)
+            self.assertEqual(cache_extractor.get_num_frames(), 0)
+            self.assertEqual(cache_extractor.get_traces(channel_ids=[1, 2]).shape, (2, 0))
+            self.assertEqual(pickle.loads(pickle.dumps(cache_extractor)).get_traces().shape, (4, 0))
+            del cache_extractor
+
+    def test_persistent_cache_extractor(self):
+        cache_folder = Path(self.test_dir) / 'cache'
+        cache_extractor = se.CacheRecordingExtractor(self.RX, cache_folder=cache_folder)
+        self._check_recordings_equal(self.RX, cache_extractor)
+        cache_file = Path(cache_extractor.get_filename())
+        self.assertEqual(cache_file.parent, cache_folder)
+        mtime = cache_file.stat().st_mtime_ns
+        del cache_extractor
+        self.assertTrue(cache_file.is_file())
+
+        # same recording: the cached file is reused
+        cache_extractor = se.CacheRecordingExtractor(self.RX2, cache_folder=cache_folder)
+        self.assertEqual(Path(cache_extractor.get_filename()), cache_file)
+        self._check_recordings_equal(self.RX, cache_extractor)
+        del cache_extractor
+
+        # different recording: a new file is written and the least recently used one is evicted
+        RX_sub = se.SubRecordingExtractor(self.RX, channel_ids=[0, 1])
+        cache_extractor = se.CacheRecordingExtractor(RX_sub, cache_folder=cache_folder, cache_max_mb=0.2)
+        self.assertNotEqual(Path(cache_extractor.get_filename()), cache_file)
+        self._check_recordings_equal(RX_sub, cache_extractor)
+        self.assertFalse(cache_file.is_file())
+        self.assertEqual(len(list(cache_folder.glob('*.dat'))), 1)
+
+        # the blocks and statistics of a chunk cache do not change the fingerprint
+        from spikeextractors.cacherecordingextractor import get_recording_fingerprint
+        chunk_cache = se.ChunkCacheRecordingExtractor(self.RX, block_size=1000)
+        fingerprint = get_recording_fingerprint(chunk_cache)
+        chunk_cache.get_traces(start_frame=0, end_frame=2500)
+        self.assertEqual(get_recording_fingerprint(chunk_cache), fingerprint)
+        self.assertEqual(get_recording_fingerprint(se.ChunkCacheRecordingExtractor(self.RX2, block_size=1000)),
+                         fingerprint)
+        self.assertNotEqual(get_recording_fingerprint(se.ChunkCacheRecordingExtractor(self.RX, block_size=500)),
+                            fingerprint)
+
+    def test_chunk_cache_extractor(self):
+        cache_extractor = se.ChunkCacheRecordingExtractor(self.RX, block_size=1000)
+        self._check_recording_return_types(cache_extractor)
+        self._check_recordings_equal(self.RX, cache_extractor)
+        self.assertTrue(np.array_equal(cache_extractor.get_traces(channel_ids=[3, 1], start_frame=950, end_frame=2050),
+                                       self.RX.get_traces(channel_ids=[3, 1], start_frame=950, end_frame=2050)))
+        stats = cache_extractor.get_cache_stats()
+        self.assertTrue(stats['hits'] > 0)
+        self.assertEqual(stats['num_blocks'], 10)
+        # the returned traces are copies of the cached blocks
+        traces = cache_extractor.get_traces(start_frame=1000, end_frame=2000)
+        traces[:] = 0
+        self.assertTrue(np.array_equal(cache_extractor.get_traces(start_frame=1000, end_frame=2000),
+                                       self.RX.get_traces(start_frame=1000, end_frame=2000)))
+        self.assertEqual(cache_extractor.get_traces(channel_ids=[], start_frame=0, end_frame=10).shape, (0, 10))
+        # negative start frames are clamped to 0
+        self.assertTrue(np.array_equal(cache_extractor.get_traces(start_frame=-10, end_frame=20),
+                                       self.RX.get_traces(start_frame=0, end_frame=20)))
+        # traces written in a reused buffer, and views of the cached blocks
+        out = np.empty((2, 1100), dtype=self.RX.get_traces(start_frame=0, end_frame=1).dtype)
+        traces = cache_extractor.get_traces(channel_ids=[3, 1], start_frame=950, end_frame=2050, out=out)
+        self.assertIs(traces, out)
+        self.assertTrue(np.array_equal(out, self.RX.get_traces(channel_ids=[3, 1], start_frame=950, end_frame=2050)))
+        self.assertRaises(ValueError, cache_extractor.get_traces, channel_ids=[3, 1], start_frame=0, end_frame=10,
+                          out=out)
+        view = cache_extractor.get_traces(channel_ids=[1, 2], start_frame=1010, end_frame=1020, return_view=True)
+        self.assertFalse(view.flags.writeable)
+        self.assertTrue(np.shares_memory(view, cache_extractor._blocks[(None, 1, True)]))
+        self.assertTrue(np.array_equal(view, self.RX.get_traces(channel_ids=[1, 2], start_frame=1010, end_frame=1020)))
+        self.assertFalse(np.shares_memory(cache_extractor.get_traces(channel_ids=[2, 1], start_frame=1010,
+                                                                     end_frame=1020, return_view=True),
+                                          cache_extractor._blocks[(None, 1, True)]))
+
+        self.RX.set_channel_groups(self.RX.get_channel_ids(), [0, 0, 1, 1])
+        cache_extractor = se.ChunkCacheRecordingExtractor(self.RX, block_size=1000, cache_mb=0.02,
+                                                          grouping_property='group')
+        self._check_recordings_equal(self.RX, cache_extractor)
+        stats = cache_extractor.get_cache_stats()
+        self.assertTrue(stats['evictions'] > 0)
+        self.assertTrue(stats['nbytes'] <= 0.02 * 1e6)
+
     def test_mda_extractor(self):
         path1 = self.test_dir + '/mda'
         path2 = path1 + '/firings_true.mda'
@@ -127,8 +333,44 @@ class TestExtractors(unittest.TestCase):
         SX_mda = se.MdaSortingExtractor(path2)
         self._check_recording_return_types(RX_mda)
         self._check_recordings_equal(self.RX, RX_mda)
+        # channel-sliced reads and snippets from the memory-mapped file
+        X = self.RX.get_traces()
+        self.assertTrue(np.allclose(RX_mda.get_traces(channel_ids=[3, 1], start_frame=5, end_frame=50),
+                                    X[[3, 1], 5:50]))
+        view = RX_mda.get_traces(channel_ids=[1, 2], start_frame=5, end_frame=50, return_view=True)
+        self.assertTrue(np.shares_memory(view, RX_mda._timeseries))
+        self.assertTrue(np.allclose(view, X[1:3, 5:50]))
+        N = RX_mda.get_num_frames()
+        reference_frames = [N - 1, 5, -1, 3000, 40, 3000]
+        for channel_ids in [None, [2, 3], [3, 0]]:
+            snippets = RX_mda.get_snippets(reference_frames=reference_frames, snippet_len=(10, 12),
+                                           channel_ids=channel_ids, chunk_size=50)
+            expected = self.RX.get_snippets(reference_frames=reference_frames, snippet_len=(10, 12),
+                                            channel_ids=channel_ids)
+            self.assertTrue(np.allclose(snippets, expected))
+        RX_mda_pickled = pickle.loads(pickle.dumps(RX_mda))
+        self.assertTrue(np.allclose(RX_mda_pickled.get_traces(start_frame=0, end_frame=10), X[:, :10]))
+        del view, RX_mda, RX_mda_pickled
+        # chunked and parallel writes
+        for n_jobs in [1, 2]:
+            path3 = self.test_dir + '/mda_chunks_' + str(n_jobs)
+            se.MdaRecordingExtractor.write_recording(self.RX, path3, chunk_size=999, n_jobs=n_jobs)
+            RX_mda = se.MdaRecordingExtractor(path3)
+            self.assertEqual(RX_mda.get_traces(start_frame=0, end_frame=2).dtype, np.float32)
+            self._check_recordings_equal(self.RX, RX_mda)
+            del RX_mda
         self._check_sorting_return_types(SX_mda)
         self._check_sortings_equal(self.SX, SX_mda)
+        # max_channel of each unit
+        unit_ids = self.SX.get_unit_ids()
+        self.SX.set_units_property(unit_ids=unit_ids, property_name='max_channel',
+                                   values=[i % self.RX.get_num_channels() for i in range(len(unit_ids))])
+        path4 = path1 + '/firings_max_channels.mda'
+        se.MdaSortingExtractor.write_sorting(self.SX, path4, write_primary_channels=True)
+        SX_mda = se.MdaSortingExtractor(path4)
+        self.assertEqual(SX_mda.get_units_property(unit_ids=unit_ids, property_name='max_channel'),
+                         self.SX.get_units_property(unit_ids=unit_ids, property_name='max_channel'))
+        del SX_mda
 
     def _check_recording_return_types(self, RX):
         channel_ids = RX.get_channel_ids()
@@ -142,12 +384,193 @@ class TestExtractors(unittest.TestCase):
         for channel_id in channel_ids:
             self.assertTrue((type(channel_id) == int) or (type(channel_id) == np.int64))
 
+    def test_mcsh5_extractor(self):
+        import h5py
+        path1 = self.test_dir + '/raw.h5'
+        X = self.RX.get_traces().astype('int32')
+        num_channels, num_frames = X.shape
+        info = np.zeros(num_channels, dtype=[('ChannelID', 'int32'), ('Label', 'S8'), ('Unit', 'S4'),
+                                             ('Exponent', 'int32'), ('ConversionFactor', 'int64'),
+                                             ('Tick', 'int64')])
+        info['ChannelID'] = [10, 11, 12, 13]
+        info['Label'] = [b'A', b'B', b'C', b'D']
+        info['Unit'] = b'V'
+        info['Exponent'] = -9
+        info['ConversionFactor'] = 100
+        info['Tick'] = 50
+        with h5py.File(path1, 'w') as f:
+            stream = f.create_group('/Data/Recording_0/AnalogStream/Stream_0')
+            stream.create_dataset('ChannelData', data=X)
+            stream.create_dataset('ChannelDataTimeStamps', data=np.array([[0, 0, num_frames - 1]]))
+            stream.create_dataset('InfoChannel', data=info)
+        RX_mcs = se.MCSH5RecordingExtractor(path1)
+        self.assertEqual(RX_mcs.get_sampling_frequency(), 20000)
+        self.assertEqual(RX_mcs.get_num_frames(), num_frames)
+        self.assertTrue(np.allclose(RX_mcs.get_traces(), X * 1e-7))
+        self.assertTrue(np.allclose(RX_mcs.get_traces(channel_ids=[13, 11, 13], start_frame=100, end_frame=200),
+                                    X[[3, 1, 3], 100:200] * 1e-7))
+        self.assertTrue(np.allclose(RX_mcs.get_traces(channel_ids=12, start_frame=100, end_frame=200),
+                                    X[2, 100:200] * 1e-7))
+        raw = RX_mcs.get_traces_raw(channel_ids=[11, 12], start_frame=5, end_frame=10)
+        self.assertTrue(np.array_equal(raw, X[1:3, 5:10]))
+        gains, offsets = RX_mcs.get_channel_scaling(channel_ids=[11, 12])
+        self.assertTrue(np.allclose(gains, 1e-7) and np.all(offsets == 0))
+        # the file is opened again in the worker processes
+        RX_mcs.write_to_binary_dat_format(Path(self.test_dir) / 'mcs_serial.dat', dtype='float32')
+        RX_mcs.write_to_binary_dat_format(Path(self.test_dir) / 'mcs_parallel.dat', dtype='float32', chunk_size=999,
+                                          n_jobs=2)
+        self.assertEqual((Path(self.test_dir) / 'mcs_serial.dat').read_bytes(),
+                         (Path(self.test_dir) / 'mcs_parallel.dat').read_bytes())
+        del RX_mcs
+        # several acquisition blocks (time stamps in us, with a gap between the blocks)
+        path2 = self.test_dir + '/raw_blocks.h5'
+        blocks = np.array([[0, 0, 5999], [1000000, 6000, num_frames - 1]])
+        with h5py.File(path2, 'w') as f:
+            stream = f.create_group('/Data/Recording_0/AnalogStream/Stream_0')
+            stream.create_dataset('ChannelData', data=X)
+            stream.create_dataset('ChannelDataTimeStamps', data=blocks)
+            stream.create_dataset('InfoChannel', data=info)
+        RX_mcs = se.MCSH5RecordingExtractor(path2)
+        self.assertEqual(RX_mcs.get_sampling_frequency(), 20000)
+        self.assertTrue(np.allclose(RX_mcs.frame_to_time([0, 5999, 6000, num_frames - 1]),
+                                    [0, 5999 * 50e-6, 1, 1 + (num_frames - 6001) * 50e-6]))
+        self.assertTrue(np.allclose(RX_mcs.get_traces(start_frame=5990, end_frame=6010), X[:, 5990:6010] * 1e-7))
+        del RX_mcs
+        # the times are relative to the first frame, with one or several blocks
+        for blocks in [np.array([[5000, 0, num_frames - 1]]),
+                       np.array([[5000, 0, 5999], [1005000, 6000, num_frames - 1]])]:
+            with h5py.File(path2, 'w') as f:
+                stream = f.create_group('/Data/Recording_0/AnalogStream/Stream_0')
+                stream.create_dataset('ChannelData', data=X)
+                stream.create_dataset('ChannelDataTimeStamps', data=blocks)
+                stream.create_dataset('InfoChannel', data=info)
+            RX_mcs = se.MCSH5RecordingExtractor(path2)
+            self.assertTrue(np.allclose(RX_mcs.frame_to_time([0, 5999]), [0, 5999 * 50e-6]))
+            if len(blocks) > 1:
+                self.assertTrue(np.allclose(RX_mcs.frame_to_time(6000), 1))
+                self.assertTrue(np.allclose(RX_mcs.time_to_frame(1), 6000))
+            del RX_mcs
+        # blocks that do not cover all the frames
+        path3 = self.test_dir + '/raw_missing_blocks.h5'
+        with h5py.File(path3, 'w') as f:
+            stream = f.create_group('/Data/Recording_0/AnalogStream/Stream_0')
+            stream.create_dataset('ChannelData', data=X)
+            stream.create_dataset('ChannelDataTimeStamps',
+                                  data=np.array([[0, 0, 5999], [1000000, 7000, num_frames - 1]]))
+            stream.create_dataset('InfoChannel', data=info)
+        self.assertRaises(ValueError, se.MCSH5RecordingExtractor, path3)
+
     def test_biocam_extractor(self):
         path1 = self.test_dir + '/raw.brw'
         se.BiocamRecordingExtractor.write_recording(self.RX, path1)
         RX_biocam = se.BiocamRecordingExtractor(path1)
         self._check_recording_return_types(RX_biocam)
         self._check_recordings_equal(self.RX, RX_biocam)
+        # the file is opened again in the worker processes
+        save_path = Path(self.test_dir) / 'biocam.dat'
+        RX_biocam.write_to_binary_dat_format(save_path, dtype='float32', chunk_size=999, n_jobs=2)
+        data = np.memmap(str(save_path), dtype='float32', mode='r').reshape((-1, self.RX.get_num_channels())).T
+        self.assertTrue(np.array_equal(data, self.RX.get_traces()))
+        del data
+        RX_biocam.write_to_binary_dat_format(Path(self.test_dir) / 'biocam_serial.dat', dtype='float32')
+        self.assertEqual(save_path.read_bytes(), (Path(self.test_dir) / 'biocam_serial.dat').read_bytes())
+        # channel subsets read from cached blocks
+        X = self.RX.get_traces()
+        RX_biocam = se.BiocamRecordingExtractor(path1, block_size=300, cache_mb=0.01)
+        for start_frame, end_frame in [(0, 10), (250, 1250), (9990, 10000)]:
+            self.assertTrue(np.array_equal(RX_biocam.get_traces(channel_ids=[3, 1], start_frame=start_frame,
+                                                                end_frame=end_frame), X[[3, 1], start_frame:end_frame]))
+        self.assertEqual(RX_biocam.get_traces(channel_ids=[3, 1], start_frame=5, end_frame=5).shape, (2, 0))
+        self.assertRaises(ValueError, RX_biocam.get_traces, channel_ids=[4])
+        del RX_biocam
+        # chunked and compressed writer with the source dtype, and inverted signal
+        path2 = self.test_dir + '/raw_int16.brw'
+        RX_int16 = se.NumpyRecordingExtractor(timeseries=X.astype('int16') + 2048,
+                                              sampling_frequency=self.RX.get_sampling_frequency(),
+                                              geom=np.array(self.RX.get_channel_locations()))
+        se.BiocamRecordingExtractor.write_recording(RX_int16, path2, chunk_size=999, compression='gzip')
+        RX_biocam = se.BiocamRecordingExtractor(path2)
+        self.assertEqual(RX_biocam.get_traces(start_frame=0, end_frame=10).dtype, np.int16)
+        self._check_recordings_equal(RX_int16, RX_biocam)
+        del RX_biocam
+        import h5py
+        with h5py.File(path2, 'r+') as f:
+            f['3BRecInfo/3BRecVars/SignalInversion'][0] = -1
+        RX_biocam = se.BiocamRecordingExtractor(path2)
+        self.assertTrue(np.array_equal(RX_biocam.get_traces(), 4096 - RX_int16.get_traces()))
+        self.assertTrue(np.array_equal(RX_biocam.get_traces(channel_ids=[2], start_frame=0, end_frame=2000),
+                                       4096 - RX_int16.get_traces(channel_ids=[2], start_frame=0, end_frame=2000)))
+        del RX_biocam
+        # the 100 format stores a (frames x channels) dataset, read as a hyperslab of the channels
+        path3 = self.test_dir + '/raw_100.brw'
+        se.BiocamRecordingExtractor.write_recording(RX_int16, path3)
+        X_int16 = RX_int16.get_traces()
+        with h5py.File(path3, 'r+') as f:
+            del f['3BData/Raw']
+            f.create_dataset('3BData/Raw', data=X_int16.T)
+            f['3BData'].attrs['Version'] = 100
+        RX_biocam = se.BiocamRecordingExtractor(path3)
+        self._check_recordings_equal(RX_int16, RX_biocam)
+        for channel_ids in [[1, 2], [3, 1], [0, 2, 3], [2, 2]]:
+            self.assertTrue(np.array_equal(RX_biocam.get_traces(channel_ids=channel_ids, start_frame=100,
+                                                                end_frame=1100), X_int16[channel_ids, 100:1100]))
+        self.assertEqual(RX_biocam.get_traces(channel_ids=[3, 1], start_frame=5, end_frame=5).shape, (2, 0))
+        del RX_biocam
+        # recordings without frames
+        path4 = self.test_dir + '/raw_empty.brw'
+        RX_empty = se.NumpyRecordingExtractor(timeseries=np.zeros((4, 0)),
+                                              sampling_frequency=self.RX.get_sampling_frequency(),
+                                              geom=np.array(self.RX.get_channel_locations()))
+        se.BiocamRecordingExtractor.write_recording(RX_empty, path4)
+        RX_biocam = se.BiocamRecordingExtractor(path4)
+        self.assertEqual(RX_biocam.get_num_frames(), 0)
+        self.assertEqual(RX_biocam.get_traces(channel_ids=[3, 1]).shape, (2, 0))
+        del RX_biocam
+
+    def test_spikeglx_extractor(self):
+        X = self.RX.get_traces().astype('int16')
+        num_channels = X.shape[0]
+        bin_file = Path(self.test_dir) / 'raw_g0_t0.imec0.ap.bin'
+        X.T.tofile(str(bin_file))
+        imro = '(0,' + str(num_channels) + ')' + ''.join('(' + str(ch) + ' 0 0 500 250)' for ch in range(num_channels))
+        meta = ['typeThis=imec', 'imSampRate=' + str(self.RX.get_sampling_frequency()), 'imAiRangeMax=0.6',
+                'nSavedChans=' + str(num_channels), 'snsApLfSy=' + str(num_channels) + ',0,0',
+                'snsSaveChanSubset=all', 'fileSizeBytes=' + str(X.nbytes), '~imroTbl=' + imro]
+        bin_file.with_suffix('.meta').write_text('\n'.join(meta) + '\n')
+        RX_sglx = se.SpikeGLXRecordingExtractor(bin_file)
+        # the int16 data is returned by default, and the gains (in uV) are a channel property
+        traces = RX_sglx.get_traces()
+        self.assertEqual(traces.dtype, np.int16)
+        self.assertTrue(np.array_equal(traces, X))
+        self.assertTrue(np.shares_memory(RX_sglx.get_traces_raw(channel_ids=[1, 2]), RX_sglx._timeseries))
+        gains = np.array(RX_sglx.get_channel_gains())
+        self.assertTrue(np.allclose(gains, 0.6 / 512 / 500 * 1e6))
+        self.assertTrue(np.allclose(RX_sglx.get_channel_scaling()[0], gains))
+        scaled = RX_sglx.get_traces(channel_ids=[3, 1], start_frame=10, end_frame=20, return_scaled=True)
+        self.assertEqual(scaled.dtype, np.float32)
+        self.assertTrue(np.allclose(scaled, X[[3, 1], 10:20] * gains[0]))
+        # the wrapping extractors and the writers keep the default of the recording
+        RX_wrappers = [se.SubRecordingExtractor(RX_sglx, channel_ids=[3, 1]),
+                       se.concatenate_recordings_by_time([RX_sglx, RX_sglx]),
+                       se.concatenate_recordings_by_channel([RX_sglx, RX_sglx]),
+                       se.ChunkCacheRecordingExtractor(RX_sglx, block_size=1000),
+                       se.CacheRecordingExtractor(RX_sglx)]
+        for RX_wrapper in RX_wrappers:
+            self.assertEqual(RX_wrapper.get_traces(start_frame=0, end_frame=10).dtype, np.int16)
+            self.assertEqual(RX_wrapper.get_traces(start_frame=0, end_frame=10, return_scaled=True).dtype,
+                             np.float32)
+        save_path = Path(self.test_dir) / 'spikeglx.dat'
+        RX_sglx.write_to_binary_dat_format(save_path)
+        self.assertEqual(save_path.stat().st_size, X.nbytes)
+        del RX_wrappers, RX_wrapper
+        # the cache file holds the int16 data, and the raw and scaled traces are read from it
+        RX_cache = se.CacheRecordingExtractor(RX_sglx)
+        self.assertEqual(RX_cache._timeseries.dtype, np.int16)
+        self.assertTrue(np.shares_memory(RX_cache.get_traces_raw(channel_ids=[1, 2]), RX_cache._timeseries))
+        self.assertTrue(np.allclose(RX_cache.get_traces(channel_ids=[3, 1], start_frame=10, end_frame=20,
+                                                        return_scaled=True), scaled))
+        self.assertTrue(np.allclose(RX_cache.get_channel_scaling(channel_ids=[3, 1])[0], gains[[3, 1]]))
+        del RX_cache, RX_sglx
 
     def test_mearec_extractors(self):
         path1 = self.test_dir + '/raw.h5'
@@ -191,6 +614,30 @@ class TestExtractors(unittest.TestCase):
         self._check_sorting_return_types(SX_ks)
         self._check_sortings_equal(self.SX, SX_ks)
 
+    def test_phy_extractor(self):
+        path1 = self.test_dir + '/phy'
+        se.PhySortingExtractor.write_sorting(self.SX, path1)
+        SX_phy = se.PhySortingExtractor(path1)
+        self._check_sorting_return_types(SX_phy)
+        self._check_sortings_equal(self.SX, SX_phy)
+        # the excluded units are not loaded, and the features follow the spikes of each unit
+        (Path(path1) / 'cluster_group.tsv').write_text('cluster_id\tgroup\n1\tgood\n2\tnoise\n3\tgood\n')
+        amplitudes = np.arange(sum(len(st) for st in self.SX.get_spike_trains()))
+        spike_times = np.load(Path(path1) / 'spike_times.npy').ravel()
+        np.save(Path(path1) / 'amplitudes.npy', amplitudes[:, np.newaxis])
+        SX_phy = se.PhySortingExtractor(path1, exclude_cluster_groups=['noise'])
+        self.assertEqual(SX_phy.get_unit_ids(), [1, 3])
+        spike_clusters = np.load(Path(path1) / 'spike_clusters.npy').ravel()
+        for unit_id in [1, 3]:
+            spike_train = SX_phy.get_unit_spike_train(unit_id)
+            self.assertTrue(np.array_equal(spike_train, np.rint(self.SX.get_unit_spike_train(unit_id))))
+            self.assertTrue(np.array_equal(SX_phy.get_unit_spike_features(unit_id, 'amplitudes').ravel(),
+                                           amplitudes[spike_clusters == unit_id]))
+            self.assertTrue(np.array_equal(spike_times[spike_clusters == unit_id], spike_train))
+        times, labels = SX_phy.get_all_spikes()
+        self.assertTrue(np.all(np.diff(times) >= 0))
+        self.assertEqual(set(labels.tolist()), {1, 3})
+
     def test_klusta_extractor(self):
         path1 = self.test_dir + '/firings_true.kwik'
         se.KlustaSortingExtractor.write_sorting(self.SX, path1)
@@ -213,6 +660,20 @@ class TestExtractors(unittest.TestCase):
         RX_sub = RX_multi.get_epoch('C')
         self._check_recordings_equal(self.RX, RX_sub)
         self.assertEqual(4, len(RX_sub.get_channel_ids()))
+        N = self.RX.get_num_frames()
+        traces = np.concatenate([self.RX.get_traces()] * 3, axis=1)
+        self.assertTrue(np.array_equal(RX_multi.get_traces(channel_ids=[2, 0], start_frame=N - 10, end_frame=2 * N + 5),
+                                       traces[[2, 0], N - 10:2 * N + 5]))
+        snippets = RX_multi.get_snippets(reference_frames=[5, N - 2, N + 100, 3 * N - 1, 3 * N], snippet_len=(10, 10))
+        self.assertTrue(np.array_equal(snippets[0][:, 5:], traces[:, :15]) and np.all(snippets[0][:, :5] == 0))
+        self.assertTrue(np.array_equal(snippets[1], traces[:, N - 12:N + 8]))
+        self.assertTrue(np.array_equal(snippets[2], traces[:, N + 90:N + 110]))
+        self.assertTrue(np.array_equal(snippets[3][:, :11], traces[:, 3 * N - 11:]) and np.all(snippets[3][:, 11:] == 0))
+        self.assertTrue(np.all(snippets[4] == 0))
+        frames = np.array([0, N - 1, N, 2 * N + 7])
+        times = RX_multi.frame_to_time(frames)
+        self.assertTrue(np.allclose(times, [RX_multi.frame_to_time(frame) for frame in frames]))
+        self.assertTrue(np.allclose(RX_multi.time_to_frame(times), frames))
 
         RX_multi = se.MultiRecordingChannelExtractor(
             recordings=[self.RX, self.RX2, self.RX3],
@@ -223,6 +684,29 @@ class TestExtractors(unittest.TestCase):
         self._check_recordings_equal(self.RX2, RX_sub)
         self.assertEqual([2, 2, 2, 2], RX_sub.get_channel_groups())
         self.assertEqual(12, len(RX_multi.get_channel_ids()))
+        traces = np.concatenate([self.RX.get_traces(), self.RX2.get_traces(), self.RX3.get_traces()])
+        self.assertTrue(np.array_equal(RX_multi.get_traces(start_frame=10, end_frame=100), traces[:, 10:100]))
+        RX_multi_threads = se.concatenate_recordings_by_channel([self.RX, self.RX2, self.RX3], n_jobs=2)
+        self.assertTrue(np.array_equal(RX_multi_threads.get_traces(channel_ids=[9, 0, 5, 1], end_frame=100),
+                                       traces[[9, 0, 5, 1], :100]))
+        # nested sub-recordings
+        RX_sub1 = se.SubRecordingExtractor(self.RX, channel_ids=[1, 2, 3], renamed_channel_ids=[10, 20, 30],
+                                           start_frame=100, end_frame=5000)
+        RX_sub2 = se.SubRecordingExtractor(RX_sub1, channel_ids=[30, 10], renamed_channel_ids=[0, 1], start_frame=50)
+        self.assertTrue(RX_sub2._root_recording is self.RX)
+        self.assertEqual(RX_sub2.get_num_frames(), 4850)
+        self.assertTrue(np.array_equal(RX_sub2.get_traces(), self.RX.get_traces(channel_ids=[3, 1], start_frame=150,
+                                                                               end_frame=5000)))
+        self.assertTrue(np.array_equal(RX_sub2.get_traces(channel_ids=[1], start_frame=10, end_frame=20),
+                                       self.RX.get_traces(channel_ids=[1], start_frame=160, end_frame=170)))
+        self.assertEqual(RX_sub2.frame_to_time(0), 0)
+        self.assertEqual(RX_sub2.get_channel_property(1, 'shared_channel_prop'), 1)
+        RX_sub1.set_channel_property(30, 'shared_channel_prop', 5)
+        self.assertEqual(RX_sub2.get_channel_properties('shared_channel_prop').tolist(), [5, 1])
+        RX_sub2.clear_channel_property(0, 'shared_channel_prop')
+        self.assertNotIn('shared_channel_prop', RX_sub2.get_shared_channel_property_names())
+        self.assertEqual(RX_sub1.get_channel_property(30, 'shared_channel_prop'), 5)
+        self.assertRaises(ValueError, RX_sub2.get_traces, channel_ids=[2])
 
     def test_multi_sub_sorting_extractor(self):
         N = self.RX.get_num_frames()
@@ -240,6 +724,51 @@ class TestExtractors(unittest.TestCase):
         )
         SX_sub1 = se.SubSortingExtractor(parent_sorting=SX_multi, start_frame=0, end_frame=N)
         self._check_sortings_equal(SX_multi, SX_sub1)
+        # windowed and bulk access
+        unit_ids = SX_multi.get_unit_ids()
+        num_units = len(self.SX.get_unit_ids())
+        train = SX_multi.get_unit_spike_train(num_units, start_frame=100, end_frame=N // 2)
+        train2 = self.SX2.get_unit_spike_train(self.SX2.get_unit_ids()[0], start_frame=100, end_frame=N // 2)
+        self.assertTrue(np.array_equal(train, train2))
+        spike_trains = SX_multi.get_spike_trains(unit_ids=unit_ids[::-1], start_frame=100, end_frame=N // 2, n_jobs=2)
+        for unit_id, spike_train in zip(unit_ids[::-1], spike_trains):
+            self.assertTrue(np.array_equal(spike_train, SX_multi.get_unit_spike_train(unit_id, 100, N // 2)))
+        times, labels = SX_multi.get_all_spikes(start_frame=100, end_frame=N // 2, n_jobs=2)
+        self.assertTrue(np.all(np.diff(times) >= 0))
+        for unit_id in unit_ids:
+            self.assertTrue(np.array_equal(np.sort(times[labels == unit_id]),
+                                           np.sort(SX_multi.get_unit_spike_train(unit_id, 100, N // 2))))
+        self.assertRaises(ValueError, SX_multi.get_unit_spike_train, len(unit_ids))
+
+    def test_iter_spikes_windows(self):
+        from unittest import mock
+        SX = se.NumpySortingExtractor()
+        for unit_id in range(4):
+            SX.add_unit(unit_id=unit_id, times=np.sort(np.random.randint(0, 1000000, 2000)))
+        times_all, labels_all = SX.get_all_spikes()
+        for start_frame, end_frame in [(None, None), (1000, None), (None, 500000), (1000, 500000)]:
+            with mock.patch.object(SX, 'get_unit_spike_train', wraps=SX.get_unit_spike_train) as get_train:
+                blocks = list(SX.iter_spikes(start_frame=start_frame, end_frame=end_frame, batch_size=50))
+                # the spike trains are read in bounded windows, except a first read of the last spike of
+                # each unit when there is no end_frame
+                unbounded_calls = [call for call in get_train.call_args_list if call[1].get('end_frame') is None]
+                self.assertEqual(len(unbounded_calls), 4 if end_frame is None else 0)
+            bounded_calls = [call for call in get_train.call_args_list if call[1].get('end_frame') is not None]
+            self.assertTrue(len(bounded_calls) >= 4 * 1000 // (4 * 50))
+            for call in bounded_calls:
+                window_train = SX.get_unit_spike_train(call[0][0], start_frame=call[1]['start_frame'],
+                                                       end_frame=call[1]['end_frame'])
+                self.assertTrue(len(window_train) <= 4 * 50)
+            times = np.concatenate([block_times for block_times, _ in blocks])
+            labels = np.concatenate([block_labels for _, block_labels in blocks])
+            mask = np.ones(len(times_all), dtype=bool)
+            if start_frame is not None:
+                mask &= times_all >= start_frame
+            if end_frame is not None:
+                mask &= times_all < end_frame
+            self.assertTrue(np.array_equal(times, times_all[mask]))
+            for unit_id in range(4):
+                self.assertTrue(np.array_equal(times[labels == unit_id], times_all[mask & (labels_all == unit_id)]))
 
     def test_nwb_extractor(self):
         path1 = self.test_dir + '/test.nwb'
@@ -334,6 +863,22 @@ class TestExtractors(unittest.TestCase):
             # print(train1)
             # print(train2)
             self.assertTrue(np.array_equal(train1, train2))
+        # get_all_spikes
+        times1, labels1 = SX1.get_all_spikes()
+        times2, labels2 = SX2.get_all_spikes()
+        self.assertTrue(np.all(np.diff(times1) >= 0) and np.all(np.diff(times2) >= 0))
+        self.assertTrue(np.array_equal(times1, times2))
+        for id in ids1:
+            self.assertTrue(np.array_equal(np.sort(times1[labels1 == id]), np.sort(SX1.get_unit_spike_train(id))))
+            self.assertTrue(np.array_equal(np.sort(times2[labels2 == id]), np.sort(SX2.get_unit_spike_train(id))))
+        # iter_spikes
+        blocks = list(SX1.iter_spikes(batch_size=3))
+        self.assertTrue(all(len(block_times) <= 3 * K for block_times, _ in blocks))
+        times = np.concatenate([block_times for block_times, _ in blocks])
+        labels = np.concatenate([block_labels for _, block_labels in blocks])
+        self.assertTrue(np.array_equal(times, times1))
+        for id in ids1:
+            self.assertTrue(np.array_equal(np.sort(times[labels == id]), np.sort(SX1.get_unit_spike_train(id))))
 
 
 if __name__ == '__main__':
@@ -1,32 +1,42 @@
 import unittest
+import tempfile
+import shutil
+from pathlib import Path
 import numpy as np
 import spikeextractors as se
 
 
 class TestNpzSortingExtractors(unittest.TestCase):
     def setUp(self):
-        pass
+        self.test_dir = tempfile.mkdtemp()
 
     def tearDown(self):
-        pass
+        shutil.rmtree(self.test_dir)
 
     def test_write_then_read(self):
 
 
         recording, sorting_gt = se.example_datasets.toy_example(num_channels=4, duration=10, seed=0)
 
-        se.NpzSortingExtractor.write_sorting(sorting_gt, 'test_NpzSortingExtractors.npz')
+        file_path = Path(self.test_dir) / 'test_NpzSortingExtractors.npz'
+        se.NpzSortingExtractor.write_sorting(sorting_gt, file_path)
 
-        npz = np.load('test_NpzSortingExtractors.npz')
-        sorting_npz = se.NpzSortingExtractor('test_NpzSortingExtractors.npz')
+        npz = np.load(file_path)
+        sorting_npz = se.NpzSortingExtractor(file_path)
         units_ids = npz['unit_ids']
         self.assertEqual(list(units_ids), list(sorting_gt.get_unit_ids()))
         self.assertEqual(list(sorting_npz.get_unit_ids()), list(sorting_gt.get_unit_ids()))
         self.assertEqual(sorting_npz.get_sampling_frequency(), 30000.0)
+        # the returned spike trains are writable copies
+        unit_id = sorting_npz.get_unit_ids()[0]
+        train = sorting_npz.get_unit_spike_train(unit_id)
+        train += 10
+        train.sort()
+        self.assertTrue(np.array_equal(sorting_npz.get_unit_spike_train(unit_id) + 10, train))
 
     def test_empty_write(self):
         sorting_empty = se.NumpySortingExtractor()
-        se.NpzSortingExtractor.write_sorting(sorting_empty, 'test_NpzSortingExtractors_empty.npz')
+        se.NpzSortingExtractor.write_sorting(sorting_empty, Path(self.test_dir) / 'test_NpzSortingExtractors_empty.npz')
 
 
 if __name__ == '__main__':
@@ -37,14 +37,77 @@ class TestNumpyExtractors(unittest.TestCase):
         self.assertTrue(np.allclose(self.RX.get_traces(), self._X))
         self.assertTrue(
             np.allclose(self.RX.get_traces(channel_ids=[0, 3], start_frame=0, end_frame=12), self._X[[0, 3], 0:12]))
+        # get_traces - output buffer and views
+        out = np.empty((2, 100))
+        traces = self.RX.get_traces(channel_ids=[1, 2], start_frame=100, end_frame=200, out=out)
+        self.assertIs(traces, out)
+        self.assertTrue(np.allclose(out, self._X[1:3, 100:200]))
+        self.RX.get_traces(channel_ids=[3, 0], start_frame=0, end_frame=100, out=out)
+        self.assertTrue(np.allclose(out, self._X[[3, 0], :100]))
+        self.assertRaises(ValueError, self.RX.get_traces, channel_ids=[0], start_frame=0, end_frame=100, out=out)
+        self.assertTrue(np.shares_memory(self.RX.get_traces(channel_ids=[1, 2, 3], return_view=True), self._X))
+        self.assertFalse(np.shares_memory(self.RX.get_traces(channel_ids=[1, 2, 3]), self._X))
+        self.assertFalse(np.shares_memory(self.RX.get_traces(channel_ids=[2, 1], return_view=True), self._X))
         # get_channel_property - location
         self.assertTrue(np.allclose(np.array(self.RX.get_channel_property(1, 'location')), self._geom[1, :]))
+        # get_channel_properties / set_channel_properties
+        self.assertTrue(np.allclose(self.RX.get_channel_properties('location'), self._geom))
+        self.RX.set_channel_properties('quality', [0.5, 1.5], channel_ids=[3, 1])
+        self.assertEqual(self.RX.get_channel_property(1, 'quality'), 1.5)
+        self.assertTrue(np.allclose(self.RX.get_channel_properties('quality', channel_ids=[1, 3]), [1.5, 0.5]))
+        self.assertEqual(self.RX.get_shared_channel_property_names([1, 3]), ['location', 'quality'])
+        self.assertRaises(RuntimeError, self.RX.get_channel_properties, 'quality')
+        self.assertRaises(ValueError, self.RX.set_channel_properties, 'quality', [1.0], channel_ids=[0, 2])
+        # the channel ids are only read again when an unknown id is looked up
+        RX = se.NumpyRecordingExtractor(timeseries=self._X, sampling_frequency=self._sampling_frequency)
+        RX.set_channel_property(3, 'quality', 1.0)
+        num_calls = []
+        get_channel_ids = RX.get_channel_ids
+        RX.get_channel_ids = lambda: num_calls.append(1) or get_channel_ids()
+        for channel_id in range(4):
+            RX.set_channel_property(channel_id, 'gain', [float(channel_id)])
+        RX.set_channel_properties('quality', [2.0, 3.0], channel_ids=[0, 1])
+        self.assertEqual(len(num_calls), 0)
+        self.assertRaises(ValueError, RX.get_channel_property, 4, 'quality')
+        self.assertRaises(ValueError, RX.set_channel_properties, 'quality', [1.0], channel_ids=[4])
+        self.assertEqual(len(num_calls), 2)
+        # copy_channel_properties keeps the values unchanged
+        RX_sub = se.SubRecordingExtractor(RX, channel_ids=[1, 3])
+        RX_sub.copy_channel_properties(RX)
+        self.assertEqual(RX_sub.get_channel_property(3, 'gain'), [3.0])
+        self.assertEqual(RX_sub.get_channel_property(1, 'quality'), 3.0)
+        RX_copy = se.NumpyRecordingExtractor(timeseries=self._X, sampling_frequency=self._sampling_frequency)
+        RX_copy.copy_channel_properties(RX, channel_ids=[2, 3])
+        self.assertEqual(RX_copy.get_channel_property_names(2), ['gain'])
+        self.assertEqual(RX_copy.get_channel_property_names(3), ['gain', 'quality'])
+        self.assertEqual(RX_copy.get_channel_property(2, 'gain'), [2.0])
         # time_to_frame / frame_to_time
         self.assertEqual(self.RX.time_to_frame(12), 12 * self.RX.get_sampling_frequency())
         self.assertEqual(self.RX.frame_to_time(12), 12 / self.RX.get_sampling_frequency())
+        self.assertTrue(np.allclose(self.RX.frame_to_time([12, 24]), np.array([12, 24]) / self._sampling_frequency))
+        # time_to_frame / frame_to_time - timestamps
+        N = self._X.shape[1]
+        timestamps = np.sort(np.arange(N) / self._sampling_frequency + np.random.uniform(0, 1e-5, N))
+        self.RX.set_timestamps(timestamps)
+        self.assertEqual(self.RX.frame_to_time(12), timestamps[12])
+        self.assertTrue(np.allclose(self.RX.frame_to_time(np.arange(N)), timestamps))
+        self.assertTrue(np.allclose(self.RX.time_to_frame(timestamps[[5, 100, N - 1]]), [5, 100, N - 1]))
+        self.assertRaises(ValueError, self.RX.set_timestamps, timestamps[1:])
+        self.RX.set_timestamps(None)
         # get_snippets
         snippets = self.RX.get_snippets(reference_frames=[0, 30, 50], snippet_len=20)
         self.assertTrue(np.allclose(snippets[1], self._X[:, 20:40]))
+        # get_snippets - zero-padding at the edges and chunked reads
+        N = self._X.shape[1]
+        snippets = self.RX.get_snippets(reference_frames=[N - 1, 5, -1, 3000, 40], snippet_len=(10, 10),
+                                        chunk_size=50)
+        self.assertTrue(np.allclose(snippets[0][:, :11], self._X[:, N - 11:]))
+        self.assertTrue(np.allclose(snippets[0][:, 11:], 0))
+        self.assertTrue(np.allclose(snippets[1][:, 5:], self._X[:, :15]))
+        self.assertTrue(np.allclose(snippets[1][:, :5], 0))
+        self.assertTrue(np.allclose(snippets[2], 0))
+        self.assertTrue(np.allclose(snippets[3], self._X[:, 2990:3010]))
+        self.assertTrue(np.allclose(snippets[4], self._X[:, 30:50]))
 
     def test_sorting_extractor(self):
         unit_ids = [1, 2, 3]
@@ -53,6 +116,53 @@ class TestNumpyExtractors(unittest.TestCase):
         # get_unit_spike_train
         st = self.SX.get_unit_spike_train(unit_id=1)
         self.assertTrue(np.allclose(st, self._train1))
+        # set_units_spike_features / get_units_spike_features
+        num_spikes = [len(self.SX.get_unit_spike_train(u)) for u in unit_ids]
+        amplitudes = np.random.normal(0, 1, (np.sum(num_spikes), 3))
+        self.SX.set_units_spike_features(feature_name='amplitudes', values=amplitudes)
+        self.assertTrue(np.allclose(self.SX.get_unit_spike_features(2, 'amplitudes'),
+                                    amplitudes[num_spikes[0]:num_spikes[0] + num_spikes[1]]))
+        self.assertTrue(np.allclose(self.SX.get_units_spike_features(feature_name='amplitudes', concatenate=True),
+                                    amplitudes))
+        self.SX.set_unit_spike_features(1, 'amplitudes', np.zeros((num_spikes[0], 3)))
+        self.assertTrue(np.allclose(self.SX.get_units_spike_features(feature_name='amplitudes')[0], 0))
+        self.assertTrue(np.allclose(self.SX.get_units_spike_features(feature_name='amplitudes')[2],
+                                    amplitudes[num_spikes[0] + num_spikes[1]:]))
+        self.assertEqual(self.SX.get_shared_unit_spike_feature_names(), ['amplitudes'])
+        self.assertRaises(ValueError, self.SX.set_units_spike_features, feature_name='amplitudes',
+                          values=amplitudes[1:])
+        # set_units_property / get_units_property
+        self.SX.set_units_property(property_name='quality', values=['good', 'mua', 'good'])
+        self.assertEqual(self.SX.get_units_property(unit_ids=[3, 1], property_name='quality'), ['good', 'good'])
+        self.assertEqual(self.SX.get_unit_property_names(2), ['quality'])
+        # the feature lengths are checked against the current spike trains
+        self.SX.add_unit(unit_id=1, times=self._train1[:10])
+        self.assertRaises(ValueError, self.SX.set_unit_spike_features, 1, 'amplitudes', np.zeros((num_spikes[0], 3)))
+        self.SX.set_unit_spike_features(1, 'amplitudes', np.zeros((10, 3)))
+        self.assertRaises(ValueError, self.SX.get_unit_property, 4, 'quality')
+        self.assertRaises(ValueError, self.SX.set_units_spike_features, unit_ids=[4], feature_name='amplitudes',
+                          values=[np.zeros((num_spikes[2], 3))])
+        # the unit ids are only read again for unknown ids, and the spike trains are loaded once to count the spikes
+        SX_sub = se.SubSortingExtractor(self.SX, unit_ids=[2, 3])
+        num_calls = {'get_unit_ids': 0, 'get_unit_spike_train': 0}
+        for name in num_calls.keys():
+            def counted(*args, method=getattr(SX_sub, name), name=name, **kwargs):
+                num_calls[name] += 1
+                return method(*args, **kwargs)
+            setattr(SX_sub, name, counted)
+        SX_sub.set_unit_property(2, 'quality', 'good')
+        for _ in range(3):
+            SX_sub.set_unit_spike_features(3, 'amplitudes', np.zeros((num_spikes[2], 3)))
+            SX_sub.set_units_spike_features(unit_ids=[2, 3], feature_name='depth',
+                                            values=[np.zeros(num_spikes[1]), np.zeros(num_spikes[2])])
+        self.assertEqual(num_calls, {'get_unit_ids': 2, 'get_unit_spike_train': 2})
+        # copy_unit_properties keeps the values unchanged
+        SX_sub.copy_unit_properties(self.SX)
+        self.assertEqual(SX_sub.get_unit_property(3, 'quality'), 'good')
+        # time_to_frame / frame_to_time
+        self.SX.set_sampling_frequency(self._sampling_frequency)
+        self.assertTrue(np.allclose(self.SX.frame_to_time(self._train1), self._train1 / self._sampling_frequency))
+        self.assertEqual(self.SX.time_to_frame(2), 2 * self._sampling_frequency)
 
 
 if __name__ == '__main__':
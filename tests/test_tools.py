@@ -41,12 +41,12 @@ class TestTools(unittest.TestCase):
         for i in RX.get_channel_ids():
             channel_groups.append(i // n_group)
         RX.set_channel_groups(RX.get_channel_ids(), channel_groups)
-        RX.save_to_probe_file('tests/probe_test_no_groups.prb')
-        RX.save_to_probe_file('tests/probe_test_groups.prb', grouping_property='group')
+        RX.save_to_probe_file(Path(self.test_dir) / 'probe_test_no_groups.prb')
+        RX.save_to_probe_file(Path(self.test_dir) / 'probe_test_groups.prb', grouping_property='group')
 
         # load
-        RX_loaded_no_groups = se.load_probe_file(RX, 'tests/probe_test_no_groups.prb')
-        RX_loaded_groups = se.load_probe_file(RX, 'tests/probe_test_groups.prb')
+        RX_loaded_no_groups = se.load_probe_file(RX, Path(self.test_dir) / 'probe_test_no_groups.prb')
+        RX_loaded_groups = se.load_probe_file(RX, Path(self.test_dir) / 'probe_test_groups.prb')
 
         assert len(np.unique(RX_loaded_no_groups.get_channel_groups())) == 1
         assert len(np.unique(RX_loaded_groups.get_channel_groups())) == RX.get_num_channels() // n_group
@@ -56,26 +56,121 @@ class TestTools(unittest.TestCase):
         nb_chan = self.RX.get_num_channels()
 
         # time_axis=0 chunk_size=None
-        self.RX.write_to_binary_dat_format(self.test_dir + 'rec.dat', time_axis=0, dtype='float32', chunk_size=None)
-        data = np.memmap(open(self.test_dir + 'rec.dat'), dtype='float32', mode='r', shape=(nb_sample, nb_chan)).T
+        self.RX.write_to_binary_dat_format(self.test_dir + '/rec.dat', time_axis=0, dtype='float32', chunk_size=None)
+        data = np.memmap(open(self.test_dir + '/rec.dat'), dtype='float32', mode='r', shape=(nb_sample, nb_chan)).T
         assert np.allclose(data, self.RX.get_traces())
         del(data) # this close the file
 
         # time_axis=1 chunk_size=None
-        self.RX.write_to_binary_dat_format(self.test_dir + 'rec.dat', time_axis=1, dtype='float32', chunk_size=None)
-        data = np.memmap(open(self.test_dir + 'rec.dat'), dtype='float32', mode='r', shape=(nb_chan, nb_sample))
+        self.RX.write_to_binary_dat_format(self.test_dir + '/rec.dat', time_axis=1, dtype='float32', chunk_size=None)
+        data = np.memmap(open(self.test_dir + '/rec.dat'), dtype='float32', mode='r', shape=(nb_chan, nb_sample))
         assert np.allclose(data, self.RX.get_traces())
         del(data) # this close the file
 
         # time_axis=0 chunk_size=99
-        self.RX.write_to_binary_dat_format(self.test_dir + 'rec.dat', time_axis=0, dtype='float32', chunk_size=99)
-        data = np.memmap(open(self.test_dir + 'rec.dat'), dtype='float32', mode='r', shape=(nb_sample, nb_chan)).T
+        self.RX.write_to_binary_dat_format(self.test_dir + '/rec.dat', time_axis=0, dtype='float32', chunk_size=99)
+        data = np.memmap(open(self.test_dir + '/rec.dat'), dtype='float32', mode='r', shape=(nb_sample, nb_chan)).T
         assert np.allclose(data, self.RX.get_traces())
         del(data) # this close the file
 
-        # time_axis=1 chunk_size=99 do not work
-        with self.assertRaises(Exception) as context:
-            self.RX.write_to_binary_dat_format(self.test_dir + 'rec.dat', time_axis=1, dtype='float32', chunk_size=99)
+        # time_axis=1 chunk_size=99
+        self.RX.write_to_binary_dat_format(self.test_dir + '/rec.dat', time_axis=1, dtype='float32', chunk_size=99)
+        data = np.memmap(open(self.test_dir + '/rec.dat'), dtype='float32', mode='r', shape=(nb_chan, nb_sample))
+        assert np.allclose(data, self.RX.get_traces())
+        del(data) # this close the file
+
+        # time_axis=0 and time_axis=1 with n_jobs=2
+        for time_axis in [0, 1]:
+            self.RX.write_to_binary_dat_format(self.test_dir + '/rec.dat', time_axis=time_axis, dtype='float32',
+                                               chunk_size=999, n_jobs=2)
+            if time_axis == 0:
+                data = np.memmap(open(self.test_dir + '/rec.dat'), dtype='float32', mode='r',
+                                 shape=(nb_sample, nb_chan)).T
+            else:
+                data = np.memmap(open(self.test_dir + '/rec.dat'), dtype='float32', mode='r',
+                                 shape=(nb_chan, nb_sample))
+            assert np.allclose(data, self.RX.get_traces())
+            del(data) # this close the file
+
+    def test_iter_chunks(self):
+        nb_sample = self.RX.get_num_frames()
+        margin = 10
+        for prefetch in [False, True]:
+            frames = []
+            for chunk, start_frame, end_frame in self.RX.iter_chunks(chunk_size=999, margin=margin, channel_ids=[1, 5],
+                                                                     dtype='float32', prefetch=prefetch):
+                assert chunk.dtype == np.dtype('float32')
+                assert chunk.shape == (2, end_frame - start_frame + 2 * margin)
+                assert np.allclose(chunk[:, margin:-margin], self._X[[1, 5], start_frame:end_frame])
+                if start_frame == 0:
+                    assert np.all(chunk[:, :margin] == 0)
+                else:
+                    assert np.allclose(chunk[:, :margin], self._X[[1, 5], start_frame - margin:start_frame])
+                if end_frame == nb_sample:
+                    assert np.all(chunk[:, -margin:] == 0)
+                frames.append((start_frame, end_frame))
+            assert frames[0][0] == 0 and frames[-1][1] == nb_sample
+            assert all(f1[1] == f2[0] for f1, f2 in zip(frames[:-1], frames[1:]))
+        chunks = list(self.RX.iter_chunks(chunk_duration=0.1))
+        assert len(chunks) == 4 and chunks[0][2] == 3000
+
+    def test_spike_vector(self):
+        from spikeextractors.spikevector import SpikeVector, get_spike_window
+        times = np.random.randint(0, 10000, 500)
+        labels = np.random.randint(0, 5, 500)
+        for sorted_times in [False, True]:
+            if sorted_times:
+                order = np.argsort(times)
+                times, labels = times[order], labels[order]
+            sv = SpikeVector(times, labels)
+            assert list(sv.unit_ids) == list(np.unique(labels))
+            for unit_id in sv.unit_ids:
+                assert np.array_equal(sv.get_unit_spike_train(unit_id), np.sort(times[labels == unit_id]))
+                st = sv.get_unit_spike_train(unit_id, start_frame=2000, end_frame=8000)
+                unit_times = np.sort(times[labels == unit_id])
+                assert np.array_equal(st, unit_times[(unit_times >= 2000) & (unit_times < 8000)])
+                assert np.array_equal(times[sv.get_unit_indices(unit_id)], unit_times)
+            all_times, all_labels = sv.get_all_spikes()
+            assert np.all(np.diff(all_times) >= 0) and len(all_labels) == len(labels)
+            if sorted_times:
+                assert np.shares_memory(all_times, times)
+            assert len(sv.get_unit_spike_train(10)) == 0
+        sorted_times = np.sort(times)
+        start, end = get_spike_window(sorted_times, start_frame=2000, end_frame=8000)
+        assert np.array_equal(sorted_times[start:end], sorted_times[(sorted_times >= 2000) & (sorted_times < 8000)])
+        assert get_spike_window(sorted_times) == (0, len(times))
+        start, end = get_spike_window(sorted_times, start_frame=8000, end_frame=2000)
+        assert start == end
+        sv = SpikeVector(times, labels, unit_ids=[1, 3])
+        assert list(sv.unit_ids) == [1, 3] and sv.get_num_spikes(0) == 0
+        assert sv.get_num_spikes(3) == np.sum(labels == 3)
+
+    def test_timestamps(self):
+        N = self.RX.get_num_frames()
+        timestamps = np.cumsum(np.random.uniform(0.5, 1.5, N)) / self._sampling_frequency
+        timestamps_file = Path(self.test_dir) / 'timestamps.npy'
+        np.save(timestamps_file, timestamps)
+        self.RX.set_timestamps(timestamps_file)
+        assert isinstance(self.RX.get_timestamps(), np.memmap)
+        frames = np.array([0, 10.5, N - 1])
+        times = self.RX.frame_to_time(frames)
+        assert np.allclose(times, [timestamps[0], (timestamps[10] + timestamps[11]) / 2, timestamps[-1]])
+        assert np.allclose(self.RX.time_to_frame(times), frames)
+        RX_sub = se.SubRecordingExtractor(self.RX, start_frame=100)
+        assert np.allclose(RX_sub.get_timestamps(), timestamps[100:] - timestamps[100])
+
+    def test_merge_spike_streams(self):
+        from spikeextractors.spikevector import merge_spike_streams
+        # duplicated spike times across the blocks of a stream
+        streams = [iter([(np.array([1, 5, 5]), np.array([0, 0, 0])), (np.array([5]), np.array([0]))]),
+                   iter([(np.array([2, 5]), np.array([1, 1])), (np.array([], dtype=int), np.array([], dtype=int)),
+                         (np.array([7, 9]), np.array([1, 1]))]),
+                   iter([])]
+        blocks = list(merge_spike_streams(streams))
+        times = np.concatenate([block_times for block_times, _ in blocks])
+        labels = np.concatenate([block_labels for _, block_labels in blocks])
+        assert np.array_equal(times, [1, 2, 5, 5, 5, 5, 7, 9])
+        assert np.array_equal(labels, [0, 1, 0, 0, 1, 0, 1, 1])
 
 
 if __name__ == '__main__':